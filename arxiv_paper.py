@@ -0,0 +1,110 @@
+import re
+
+from cache import ArXivPaper, PaperSection
+from text_processing import count_tokens, split_text
+
+# 要約に使う優先度。小さいほど先に予算を割り当てる
+_PRIORITY_INTRODUCTION = 0
+_PRIORITY_CONCLUSION = 1
+_PRIORITY_BODY = 2
+
+_INTRODUCTION_PATTERN = re.compile(r"introduction|はじめに|序論", re.IGNORECASE)
+_CONCLUSION_PATTERN = re.compile(
+    r"conclu|summary|discussion|outlook|future work|まとめ|結論|おわりに", re.IGNORECASE
+)
+# 要約には不要なので読まないセクション
+_SKIP_PATTERN = re.compile(
+    r"references|bibliography|acknowledg|参考文献|謝辞", re.IGNORECASE
+)
+# 予算の残りがこれより少なければ、途中で切ったセクションは入れない
+_MIN_PARTIAL_TOKENS = 200
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def parse_ar5iv(html: str, arxiv_id: str, version: str | None = None) -> ArXivPaper:
+    """ar5iv (LaTeXML) が生成した HTML から、タイトル・アブストラクト・セクションを取り出す"""
+    from lxml import html as lxml_html
+
+    document = lxml_html.document_fromstring(html.encode())
+    # 数式は MathML のままだと読めないので、LaTeX の表記に置き換える
+    for math in document.iter("math"):
+        alttext = math.get("alttext", "")
+        for child in list(math):
+            math.remove(child)
+        math.text = f" {alttext} "
+
+    title = _text(
+        next(iter(document.xpath(f"//h1[{_has_class('ltx_title_document')}]")), None)
+    )
+    abstract = " ".join(
+        _text(p) for p in document.xpath(f"//div[{_has_class('ltx_abstract')}]//p")
+    )
+
+    sections = []
+    for section in document.xpath(
+        f"//section[{_has_class('ltx_section')} or {_has_class('ltx_appendix')}"
+        f" or {_has_class('ltx_bibliography')}]"
+    ):
+        classes = section.get("class", "").split()
+        kind = "section"
+        for name in ("appendix", "bibliography"):
+            if f"ltx_{name}" in classes:
+                kind = name
+        heading = section.find("h2")
+        lines = []
+        for element in section.iter("h3", "h4", "p", "figcaption"):
+            text = _text(element)
+            if not text:
+                continue
+            if element.tag in ("h3", "h4"):
+                text = "#" * int(element.tag[1]) + " " + text
+            lines.append(text)
+        sections.append(PaperSection(_text(heading), "\n".join(lines), kind))
+    return ArXivPaper(arxiv_id, version, title, abstract, sections)
+
+
+def _text(element) -> str:
+    if element is None:
+        return ""
+    return " ".join(element.text_content().split())
+
+
+def paper_to_text(paper: ArXivPaper, max_tokens: int) -> str:
+    """要約に渡すテキストを max_tokens 以内で組み立てる
+
+    アブストラクト → 序論 → 結論 → その他の本文の順に予算を割り当て、収まらないものは途中で切る。
+    参考文献・謝辞・付録は入れない。出力は論文の中での順番に並べる。
+    """
+    header = f"# {paper.title}\n\n## Abstract\n{paper.abstract}"
+    budget = max_tokens - count_tokens(header)
+
+    candidates = [
+        (i, section)
+        for i, section in enumerate(paper.sections)
+        if section.kind == "section"
+        and section.text
+        and not _SKIP_PATTERN.search(section.title)
+    ]
+    selected: dict[int, str] = {}
+    for i, section in sorted(candidates, key=lambda c: (_priority(c[1]), c[0])):
+        block = f"## {section.title}\n{section.text}"
+        tokens = count_tokens(block)
+        if tokens <= budget:
+            selected[i] = block
+            budget -= tokens
+        elif budget >= _MIN_PARTIAL_TOKENS:
+            # 段落・行・文の境界で、残りの予算に収まる先頭部分だけを使う
+            selected[i] = split_text(block, budget)[0]
+            budget = 0
+    return "\n\n".join([header] + [selected[i] for i in sorted(selected)])
+
+
+def _priority(section: PaperSection) -> int:
+    if _INTRODUCTION_PATTERN.search(section.title):
+        return _PRIORITY_INTRODUCTION
+    if _CONCLUSION_PATTERN.search(section.title):
+        return _PRIORITY_CONCLUSION
+    return _PRIORITY_BODY
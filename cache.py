@@ -0,0 +1,481 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+from url_normalizer import normalize_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".cache"
+
+
+class SQLiteCache:
+    """ローカルの SQLite に保存するキャッシュの共通部分
+
+    サブクラスはテーブル名 table、主キーの列名 key_column、列の定義 columns を決める。
+    どのテーブルにも accessed_at 列を持たせ、最も長く使われていないものから捨てるのに使う。
+    接続はスレッドをまたいで使うので、読み書きは self._lock を取ってから行う。
+    """
+
+    table: str
+    key_column = "key"
+    columns: str
+
+    def __init__(self, path: str) -> None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ({self.columns})"
+            )
+
+    def _touch(self, key: str, now: float) -> None:
+        self._conn.execute(
+            f"UPDATE {self.table} SET accessed_at = ? WHERE {self.key_column} = ?",
+            (now, key),
+        )
+
+    def _delete(self, key: str) -> None:
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE {self.key_column} = ?", (key,)
+        )
+
+    def _evict_lru(self, max_entries: int) -> None:
+        """max_entries 件を超えた分を、最も長く使われていないものから捨てる"""
+        self._conn.execute(
+            f"""
+            DELETE FROM {self.table} WHERE {self.key_column} IN (
+                SELECT {self.key_column} FROM {self.table}
+                ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_entries,),
+        )
+
+
+class SummaryCache(SQLiteCache):
+    """要約結果をローカルの SQLite に保存するキャッシュ
+
+    キーは正規化した URL と、プロンプトのハッシュ、モデル名から作る。
+    ttl_seconds を過ぎたものは読まない。max_entries を超えたら最も長く使われていないものから捨てる。
+    """
+
+    table = "summaries"
+    columns = """
+        key TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        summary TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    """
+
+    def __init__(
+        self,
+        path: str = os.path.join(DEFAULT_CACHE_DIR, "summary.sqlite3"),
+        ttl_seconds: float = 7 * 24 * 60 * 60,
+        max_entries: int = 1000,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        super().__init__(path)
+
+    @staticmethod
+    def make_key(url: str, prompt: str, model_name: str) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+        raw = "\n".join([normalize_url(url).key, prompt_hash, model_name])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT summary, created_at FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._delete(key)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._touch(key, now)
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, url: str, summary: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)",
+                (key, url, summary, now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute(
+            "DELETE FROM summaries WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        self._evict_lru(self.max_entries)
+
+    def stats(self) -> str:
+        return f"hits: {self.hits}, misses: {self.misses}"
+
+
+class CachedContent(NamedTuple):
+    body: str
+    text: str
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+
+class ContentCache(SQLiteCache):
+    """HTTPClient が取得したページの本文と、そこから抽出したテキストを保存するキャッシュ
+
+    fresh_seconds 以内に取得したものは再検証せずにそのまま使う。それより古いものは
+    ETag / Last-Modified を使って条件付きリクエストで再検証する。
+    保存しているデータの合計が max_bytes を超えたら、最も長く使われていないものから捨てる。
+    """
+
+    table = "contents"
+    key_column = "url"
+    columns = """
+        url TEXT PRIMARY KEY,
+        body TEXT NOT NULL,
+        text TEXT NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        size INTEGER NOT NULL,
+        fetched_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    """
+
+    def __init__(
+        self,
+        path: str = os.path.join(DEFAULT_CACHE_DIR, "content.sqlite3"),
+        max_bytes: int = 200 * 1024 * 1024,
+        fresh_seconds: float = 10 * 60,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        super().__init__(path)
+
+    def get(self, url: str) -> CachedContent | None:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT body, text, etag, last_modified, fetched_at "
+                "FROM contents WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(url, time.time())
+            return CachedContent(*row)
+
+    def is_fresh(self, content: CachedContent) -> bool:
+        return time.time() - content.fetched_at <= self.fresh_seconds
+
+    def revalidated(self, url: str) -> None:
+        """304 が返ってきたときに、取得時刻を更新する"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE contents SET fetched_at = ? WHERE url = ?", (time.time(), url)
+            )
+
+    def set(
+        self,
+        url: str,
+        body: str,
+        text: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        now = time.time()
+        size = len(body.encode()) + len(text.encode())
+        if size > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO contents VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, body, text, etag, last_modified, size, now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM contents"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT url, size FROM contents ORDER BY accessed_at ASC"
+        ).fetchall()
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._delete(url)
+            total -= size
+
+
+class Transcript(NamedTuple):
+    text: str
+    # "captions" (YouTube の字幕) か "whisper"
+    source: str
+    # ISO 639-1 の言語コード ("ja")。normalize_language でそろえる
+    language: str | None
+
+
+# Whisper は判定した言語を英語の名前 ("japanese") で返す。字幕の言語コードにそろえるための対応表
+_WHISPER_LANGUAGE_CODES = {
+    "afrikaans": "af",
+    "albanian": "sq",
+    "amharic": "am",
+    "arabic": "ar",
+    "armenian": "hy",
+    "assamese": "as",
+    "azerbaijani": "az",
+    "bashkir": "ba",
+    "basque": "eu",
+    "belarusian": "be",
+    "bengali": "bn",
+    "bosnian": "bs",
+    "breton": "br",
+    "bulgarian": "bg",
+    "cantonese": "yue",
+    "catalan": "ca",
+    "chinese": "zh",
+    "croatian": "hr",
+    "czech": "cs",
+    "danish": "da",
+    "dutch": "nl",
+    "english": "en",
+    "estonian": "et",
+    "faroese": "fo",
+    "finnish": "fi",
+    "french": "fr",
+    "galician": "gl",
+    "georgian": "ka",
+    "german": "de",
+    "greek": "el",
+    "gujarati": "gu",
+    "haitian creole": "ht",
+    "hausa": "ha",
+    "hawaiian": "haw",
+    "hebrew": "he",
+    "hindi": "hi",
+    "hungarian": "hu",
+    "icelandic": "is",
+    "indonesian": "id",
+    "italian": "it",
+    "japanese": "ja",
+    "javanese": "jv",
+    "kannada": "kn",
+    "kazakh": "kk",
+    "khmer": "km",
+    "korean": "ko",
+    "lao": "lo",
+    "latin": "la",
+    "latvian": "lv",
+    "lingala": "ln",
+    "lithuanian": "lt",
+    "luxembourgish": "lb",
+    "macedonian": "mk",
+    "malagasy": "mg",
+    "malay": "ms",
+    "malayalam": "ml",
+    "maltese": "mt",
+    "maori": "mi",
+    "marathi": "mr",
+    "mongolian": "mn",
+    "myanmar": "my",
+    "nepali": "ne",
+    "norwegian": "no",
+    "nynorsk": "nn",
+    "occitan": "oc",
+    "pashto": "ps",
+    "persian": "fa",
+    "polish": "pl",
+    "portuguese": "pt",
+    "punjabi": "pa",
+    "romanian": "ro",
+    "russian": "ru",
+    "sanskrit": "sa",
+    "serbian": "sr",
+    "shona": "sn",
+    "sindhi": "sd",
+    "sinhala": "si",
+    "slovak": "sk",
+    "slovenian": "sl",
+    "somali": "so",
+    "spanish": "es",
+    "sundanese": "su",
+    "swahili": "sw",
+    "swedish": "sv",
+    "tagalog": "tl",
+    "tajik": "tg",
+    "tamil": "ta",
+    "tatar": "tt",
+    "telugu": "te",
+    "thai": "th",
+    "tibetan": "bo",
+    "turkish": "tr",
+    "turkmen": "tk",
+    "ukrainian": "uk",
+    "urdu": "ur",
+    "uzbek": "uz",
+    "vietnamese": "vi",
+    "welsh": "cy",
+    "yiddish": "yi",
+    "yoruba": "yo",
+}
+
+
+def normalize_language(language: str | None) -> str | None:
+    """言語を ISO 639-1 のコード ("ja") にそろえる
+
+    Whisper が返す英語の名前 ("japanese") や、字幕の地域つきのコード ("en-US"、"zh-Hans") も受け付ける。
+    """
+    if not language or not language.strip():
+        return None
+    language = language.strip().lower()
+    if language in _WHISPER_LANGUAGE_CODES:
+        return _WHISPER_LANGUAGE_CODES[language]
+    return re.split(r"[-_]", language)[0]
+
+
+class TranscriptCache(SQLiteCache):
+    """YouTube の文字起こしを動画 ID ごとに保存するキャッシュ
+
+    文字起こしは動画が同じなら変わらないので有効期限は設けない。
+    max_entries を超えたら最も長く使われていないものから捨てる。
+    """
+
+    table = "transcripts"
+    key_column = "video_id"
+    columns = """
+        video_id TEXT PRIMARY KEY,
+        text TEXT NOT NULL,
+        source TEXT NOT NULL,
+        language TEXT,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    """
+
+    def __init__(
+        self,
+        path: str = os.path.join(DEFAULT_CACHE_DIR, "transcript.sqlite3"),
+        max_entries: int = 5000,
+    ) -> None:
+        self.max_entries = max_entries
+        super().__init__(path)
+
+    def get(self, video_id: str) -> Transcript | None:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT text, source, language FROM transcripts WHERE video_id = ?",
+                (video_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(video_id, time.time())
+            # 以前は Whisper の結果を "japanese" のような名前で保存していたので、読むときにもそろえる
+            text, source, language = row
+            return Transcript(text, source, normalize_language(language))
+
+    def set(self, video_id: str, transcript: Transcript) -> None:
+        now = time.time()
+        transcript = transcript._replace(
+            language=normalize_language(transcript.language)
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, *transcript, now, now),
+            )
+            self._evict_lru(self.max_entries)
+
+
+class PaperSection(NamedTuple):
+    title: str
+    text: str
+    # "section" (本文)、"appendix"、"bibliography" のいずれか
+    kind: str = "section"
+
+
+class ArXivPaper(NamedTuple):
+    arxiv_id: str
+    version: str | None
+    title: str
+    abstract: str
+    sections: list[PaperSection]
+
+
+class PaperCache(SQLiteCache):
+    """解析した arXiv の論文を ID と版ごとに保存するキャッシュ
+
+    版を指定した論文の内容は変わらないので有効期限は設けない。版を指定しない URL の論文は
+    新しい版が出ると変わるので、latest_ttl_seconds を過ぎたら読まずに取得し直させる。
+    max_entries を超えたら最も長く使われていないものから捨てる。
+    """
+
+    table = "papers"
+    columns = """
+        key TEXT PRIMARY KEY,
+        paper TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    """
+
+    def __init__(
+        self,
+        path: str = os.path.join(DEFAULT_CACHE_DIR, "paper.sqlite3"),
+        max_entries: int = 2000,
+        latest_ttl_seconds: float = 24 * 60 * 60,
+    ) -> None:
+        self.max_entries = max_entries
+        self.latest_ttl_seconds = latest_ttl_seconds
+        super().__init__(path)
+
+    @staticmethod
+    def make_key(arxiv_id: str, version: str | None) -> str:
+        return f"{arxiv_id}{version or ''}"
+
+    def get(self, arxiv_id: str, version: str | None) -> ArXivPaper | None:
+        now = time.time()
+        key = self.make_key(arxiv_id, version)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT paper, created_at FROM papers WHERE key = ?", (key,)
+            ).fetchone()
+            if (
+                row is not None
+                and version is None
+                and now - row[1] > self.latest_ttl_seconds
+            ):
+                self._delete(key)
+                row = None
+            if row is None:
+                return None
+            self._touch(key, now)
+        data = json.loads(row[0])
+        data["sections"] = [PaperSection(*section) for section in data["sections"]]
+        return ArXivPaper(**data)
+
+    def set(self, paper: ArXivPaper) -> None:
+        now = time.time()
+        key = self.make_key(paper.arxiv_id, paper.version)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO papers VALUES (?, ?, ?, ?)",
+                (key, json.dumps(paper._asdict(), ensure_ascii=False), now, now),
+            )
+            self._evict_lru(self.max_entries)
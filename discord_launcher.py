@@ -2,11 +2,22 @@ import asyncio
 import logging
 import os
 import sys
+import threading
+from typing import TYPE_CHECKING
 
 import discord
 from dotenv import load_dotenv
 
-from executor import ExecutorBuilder
+from job_runner import JobQueueFullError, JobRunner
+from message_formatter import split_message
+from method_type import MethodType
+from streaming_reply import StreamingReply
+from url_normalizer import normalize_url
+
+if TYPE_CHECKING:
+    from executor import Executor, SimpleExecutor
+    from http_transport import HTTPTransport
+    from summarizer import SummarizerBuilder
 
 
 # https://github.com/Rapptz/discord.py/discussions/9726#discussioncomment-8416217
@@ -36,13 +47,166 @@ DISCORD_ALLOWED_CHANNEL_ID_LIST: list[int] = [
 logger.info(f"Monitoring discord ids: {DISCORD_ALLOWED_CHANNEL_ID_LIST}")
 DISCORD_BOT_TOKEN: str = os.getenv("DISCORD_BOT_TOKEN")
 
-executor = ExecutorBuilder.build()
-simple_executor = ExecutorBuilder.build_simple()
+# Summarizer や Executor はメッセージごとに作らず、プロセス全体で使い回す。
+# LLM のクライアントなどの読み込みに時間がかかるので、import 時には作らずに最初に使うときに作る。
+# キャッシュのファイルや HTTP の接続も、同じく SummarizerBuilder と一緒に作る。
+# 動画や PDF の処理に使うライブラリは、SummarizerBuilder がその種類の URL を初めて要約するときに読み込む
+_summarizer_builder: "SummarizerBuilder | None" = None
+_http_transport: "HTTPTransport | None" = None
+_executor: "Executor | None" = None
+_simple_executor: "SimpleExecutor | None" = None
+_build_lock = threading.RLock()
+
+
+def get_summarizer_builder() -> "SummarizerBuilder":
+    global _summarizer_builder, _http_transport
+    with _build_lock:
+        if _summarizer_builder is None:
+            from cache import ContentCache, PaperCache, SummaryCache, TranscriptCache
+            from http_transport import HTTPTransport
+            from summarizer import HTTPClient, SummarizerBuilder, TextSummarizer
+
+            # 接続はジョブをまたいで使い回す。応答しないサイトで要約処理が止まらないように、1 回の取得にかける時間を制限する
+            _http_transport = HTTPTransport(
+                connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+                read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "15")),
+                deadline=float(os.getenv("HTTP_DEADLINE", "45")),
+                max_retries=int(os.getenv("HTTP_MAX_RETRIES", "2")),
+            )
+            # 2000 文字を超えた要約は複数のメッセージに分けて送るので、要約時には文字数を削らない
+            _summarizer_builder = SummarizerBuilder(
+                text_summarizer=TextSummarizer(enforce_length=False),
+                # 取得したページもキャッシュして、再要約のときに取得と解析をやり直さない
+                http_client=HTTPClient(
+                    content_cache=ContentCache(
+                        path=os.getenv("CONTENT_CACHE_PATH", ".cache/content.sqlite3"),
+                        max_bytes=int(
+                            os.getenv("CONTENT_CACHE_MAX_BYTES", str(200 * 1024 * 1024))
+                        ),
+                    ),
+                    transport=_http_transport,
+                ),
+                # 同じ URL の要約はキャッシュから返す
+                summary_cache=SummaryCache(
+                    path=os.getenv("SUMMARY_CACHE_PATH", ".cache/summary.sqlite3"),
+                    ttl_seconds=float(
+                        os.getenv("SUMMARY_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60))
+                    ),
+                    max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1000")),
+                ),
+                # YouTube の文字起こしは動画 ID ごとに保存して、再要約のときにダウンロードと文字起こしをやり直さない
+                transcript_cache=TranscriptCache(
+                    path=os.getenv(
+                        "TRANSCRIPT_CACHE_PATH", ".cache/transcript.sqlite3"
+                    ),
+                ),
+                # 解析した arXiv の論文は ID と版ごとに保存して、再要約のときに取得と解析をやり直さない
+                paper_cache=PaperCache(
+                    path=os.getenv("PAPER_CACHE_PATH", ".cache/paper.sqlite3"),
+                    latest_ttl_seconds=float(
+                        os.getenv("PAPER_CACHE_LATEST_TTL_SECONDS", str(24 * 60 * 60))
+                    ),
+                ),
+            )
+        return _summarizer_builder
+
+
+def get_executor() -> "Executor":
+    """投稿に含まれる URL を要約する Executor"""
+    global _executor
+    with _build_lock:
+        if _executor is None:
+            from executor import ExecutorBuilder
+
+            _executor = ExecutorBuilder.build(get_summarizer_builder())
+        return _executor
+
+
+def get_simple_executor() -> "SimpleExecutor":
+    """メンションされた投稿の本文を要約する Executor"""
+    global _simple_executor
+    with _build_lock:
+        if _simple_executor is None:
+            from executor import ExecutorBuilder
+
+            _simple_executor = ExecutorBuilder.build_simple(get_summarizer_builder())
+        return _simple_executor
+
+
+# 要約処理はイベントループをブロックしないように JobRunner 経由で動かす。同時実行数やキューの深さは環境変数で調整できる
+SUMMARIZER_MAX_WORKERS = int(os.getenv("SUMMARIZER_MAX_WORKERS", "4"))
+SUMMARIZER_MAX_CONCURRENCY = (
+    int(os.getenv("SUMMARIZER_MAX_CONCURRENCY", "0")) or SUMMARIZER_MAX_WORKERS
+)
+job_runner = JobRunner(
+    max_workers=SUMMARIZER_MAX_WORKERS,
+    max_concurrency=SUMMARIZER_MAX_CONCURRENCY,
+    max_queue_size=int(os.getenv("SUMMARIZER_MAX_QUEUE_SIZE", "20")),
+    # ふだんは 1 つのチャンネルしか使わないので、既定では全体の上限まで同じチャンネルのジョブを並行に動かす。
+    # 1 にすると、長い動画の要約が終わるまで後から投稿されたリンクは待たされる
+    channel_concurrency=int(os.getenv("SUMMARIZER_CHANNEL_CONCURRENCY", "0"))
+    or SUMMARIZER_MAX_CONCURRENCY,
+)
+
+
+# 要約を書きながら返信を編集していく。編集の間隔 (秒) は Discord のレート制限を超えないようにする
+STREAMING_ENABLED = os.getenv("SUMMARIZER_STREAMING", "true").lower() == "true"
+STREAM_EDIT_INTERVAL = float(os.getenv("SUMMARIZER_STREAM_EDIT_INTERVAL", "1.5"))
+
+
+def attachment_urls(message: discord.Message) -> list[str]:
+    """要約できる添付ファイル (PDF / PPTX) の URL を返す"""
+    return [
+        attachment.url
+        for attachment in message.attachments
+        if normalize_url(attachment.url).method in (MethodType.PDF, MethodType.PPTX)
+    ]
+
+
+async def reply_in_pieces(message: discord.Message, text: str) -> None:
+    """text を Discord の文字数制限に収まるように分割し、前のメッセージへの返信としてつなげて送る"""
+    for piece in split_message(text):
+        message = await message.reply(piece)
+
+
+async def summarize_and_reply(
+    message: discord.Message,
+    summary_executor: "Executor | SimpleExecutor",
+    content: str,
+) -> None:
+    """要約して返信する。ストリーミングが有効なら、書いている途中から返信に表示する"""
+    if STREAMING_ENABLED:
+        # URL が複数あれば URL ごとに返信する。同じチャンネルで並行して編集するので、その分だけ間隔をあける
+        streams = await summary_executor.astreams(content)
+        interval = STREAM_EDIT_INTERVAL * max(len(streams), 1)
+        results = await asyncio.gather(
+            *(
+                StreamingReply(message, min_interval=interval).consume(stream)
+                for stream in streams
+            ),
+            return_exceptions=True,
+        )
+        # 失敗した URL の返信はエラーに書き換わっているので、ここではログだけ残す
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error occurred: {result}")
+        replied = any(isinstance(result, str) and result for result in results)
+    else:
+        result_text = await summary_executor.aexecute(content)
+        if result_text:
+            await reply_in_pieces(message, result_text)
+        replied = bool(result_text)
+    if replied:
+        logger.info("Replied message.")
 
 
 @client.event
 async def on_ready():
     logger.info(f"Logged in as {client.user}")
+    # 最初の投稿を待たせないように、ログインしたら裏で Executor を作っておく
+    await asyncio.to_thread(get_simple_executor)
+    await asyncio.to_thread(get_executor)
+    logger.info("Executors are ready")
 
 
 @client.event
@@ -52,15 +216,28 @@ async def on_message(message):
 
     logger.info(f"Received message: {message.clean_content}")
 
+    # 添付ファイルは URL を本文に足して、URL と同じように要約する
+    documents = attachment_urls(message)
+
     # メンションされたらOKを返す
     if client.user in message.mentions:
         try:
-            result_text = simple_executor.execute(message.clean_content)
-            if result_text:
-                await message.reply(result_text)
-                logger.info("Replied message.")
+            await job_runner.submit(
+                message.channel.id,
+                summarize_and_reply,
+                message,
+                await asyncio.to_thread(
+                    get_executor if documents else get_simple_executor
+                ),
+                "\n".join([message.clean_content, *documents]),
+            )
         except discord.errors.ConnectionClosed:
             pass
+        except JobQueueFullError as e:
+            logger.warning(f"Job rejected: {e}")
+            await message.reply(
+                "混雑しているため処理できませんでした。少し時間をおいて再投稿してください。"
+            )
         except Exception as e:
             logger.error(f"Error occurred: {e}")
             await message.reply(f"Error occurred. Details:\n{e.args}")
@@ -68,20 +245,35 @@ async def on_message(message):
     # 投稿を勝手に拾う
     elif message.channel.id in DISCORD_ALLOWED_CHANNEL_ID_LIST:
         try:
-            result_text = executor.execute(message.clean_content)
-            if result_text:
-                await message.reply(result_text)
-                logger.info("Replied message.")
+            await job_runner.submit(
+                message.channel.id,
+                summarize_and_reply,
+                message,
+                await asyncio.to_thread(get_executor),
+                "\n".join([message.clean_content, *documents]),
+            )
         except discord.errors.ConnectionClosed:
             pass
+        except JobQueueFullError as e:
+            logger.warning(f"Job rejected: {e}")
+            await message.reply(
+                "混雑しているため処理できませんでした。少し時間をおいて再投稿してください。"
+            )
         except Exception as e:
             logger.error(f"Error occurred: {e}")
             await message.reply(f"Error occurred. Details:\n{e.args}")
 
 
 async def main():
-    async with client:
-        await client.start(DISCORD_BOT_TOKEN)
+    try:
+        async with client:
+            await client.start(DISCORD_BOT_TOKEN)
+    finally:
+        job_runner.shutdown()
+        # 一度も要約していなければ、接続は作られていない
+        if _http_transport is not None:
+            await _http_transport.aclose()
+
 
 if __name__ == "__main__":
     try:
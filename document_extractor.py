@@ -0,0 +1,151 @@
+import io
+import logging
+import queue
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+from text_processing import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentExtractor(ABC):
+    """PDF やスライドなどのファイルから、ページごとのテキストを取り出す
+
+    ファイルは bytes のまま受け取り、作業ディレクトリには書き出さない。
+    ページの解析は max_workers 個まで開いたドキュメントで並行して行い、先読みするページ数を
+    max_workers の数倍に抑えるので、ページ数が多くてもテキストを全部は持たない。
+    """
+
+    # ページの見出しに使う名前
+    page_label = "Page"
+
+    def __init__(self, max_workers: int = 4) -> None:
+        self.max_workers = max_workers
+
+    @abstractmethod
+    def open(self, data: bytes) -> Any:
+        """data を解析してドキュメントを返す。返したものは 1 つのスレッドの中でだけ使う"""
+
+    @abstractmethod
+    def page_count(self, document: Any) -> int:
+        pass
+
+    @abstractmethod
+    def page_text(self, document: Any, index: int) -> str:
+        pass
+
+    def iter_pages(self, data: bytes) -> Iterator[str]:
+        """ページのテキストを先頭から順に返す。途中でやめると、先読み中のページは捨てる"""
+        document = self.open(data)
+        count = self.page_count(document)
+        if self.max_workers <= 1:
+            for index in range(count):
+                yield self.page_text(document, index)
+            return
+
+        # ドキュメントはスレッドセーフではないので、空いているものを借りて使い、なければ開く。
+        # 開くのは高々 max_workers 個まで
+        documents: queue.SimpleQueue = queue.SimpleQueue()
+        documents.put(document)
+
+        def extract(index: int) -> str:
+            try:
+                document = documents.get_nowait()
+            except queue.Empty:
+                document = self.open(data)
+            try:
+                return self.page_text(document, index)
+            finally:
+                documents.put(document)
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending: deque[Future] = deque()
+        next_index = 0
+        try:
+            while next_index < count or pending:
+                while next_index < count and len(pending) < self.max_workers * 2:
+                    pending.append(pool.submit(extract, next_index))
+                    next_index += 1
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def extract(self, data: bytes, max_tokens: int | None = None) -> str:
+        """ページごとに見出しをつけてつなげる。max_tokens を超えたら残りのページは読まない"""
+        blocks = []
+        tokens = 0
+        for index, text in enumerate(self.iter_pages(data), start=1):
+            if not text.strip():
+                continue
+            block = f"## {self.page_label} {index}\n{text.strip()}"
+            blocks.append(block)
+            tokens += count_tokens(block)
+            if max_tokens is not None and tokens >= max_tokens:
+                logger.info(f"Stopped reading at {self.page_label.lower()} {index}")
+                break
+        return "\n\n".join(blocks)
+
+
+class PDFExtractor(DocumentExtractor):
+    """pypdf でページごとのテキストを取り出す。pypdf は PDF を要約するときに読み込む"""
+
+    def open(self, data: bytes) -> Any:
+        from pypdf import PdfReader
+
+        return PdfReader(io.BytesIO(data))
+
+    def page_count(self, document: Any) -> int:
+        return len(document.pages)
+
+    def page_text(self, document: Any, index: int) -> str:
+        return document.pages[index].extract_text() or ""
+
+
+class PPTXExtractor(DocumentExtractor):
+    """python-pptx でスライドごとのテキストを取り出す。表は行ごとに、ノートは末尾につける"""
+
+    page_label = "Slide"
+
+    def open(self, data: bytes) -> Any:
+        from pptx import Presentation
+
+        return Presentation(io.BytesIO(data))
+
+    def page_count(self, document: Any) -> int:
+        return len(document.slides)
+
+    def page_text(self, document: Any, index: int) -> str:
+        slide = document.slides[index]
+        lines = []
+        for shape in slide.shapes:
+            lines.extend(self._shape_lines(shape))
+        if slide.has_notes_slide:
+            notes = slide.notes_slide.notes_text_frame
+            if notes is not None and notes.text.strip():
+                lines.append(f"Notes: {' '.join(notes.text.split())}")
+        return "\n".join(lines)
+
+    def _shape_lines(self, shape) -> list[str]:
+        from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            # グループの中の図形も読む
+            return [line for child in shape.shapes for line in self._shape_lines(child)]
+        if shape.has_table:
+            return [
+                " | ".join(" ".join(cell.text.split()) for cell in row.cells)
+                for row in shape.table.rows
+            ]
+        if shape.has_text_frame:
+            return [
+                " ".join(paragraph.text.split())
+                for paragraph in shape.text_frame.paragraphs
+                if paragraph.text.strip()
+            ]
+        return []
@@ -1,36 +1,169 @@
+import asyncio
 import logging
+from collections.abc import AsyncIterator
+from concurrent.futures import Future, ThreadPoolExecutor
 
+from job_runner import SingleFlight
 from router import Dispatcher, URLExtractor
 from summarizer import SummarizerBuilder, TextSummarizer
+from url_normalizer import CanonicalURL, normalize_url
 
 logger = logging.getLogger(__name__)
 
 
 class Executor:
+    """コメントに含まれる URL をそれぞれ要約する
+
+    URL が複数ある場合は 1 つずつパイプラインを作って並行に動かす。1 メッセージあたりの
+    同時実行数は max_concurrency_per_message で制限する。
+    """
+
     def __init__(
         self,
         builder: SummarizerBuilder,
         url_extractor: URLExtractor,
         dispatcher: Dispatcher,
+        single_flight: SingleFlight | None = None,
+        max_concurrency_per_message: int = 3,
     ) -> None:
         self.builder = builder
         self.url_extractor = url_extractor
         self.dispatcher = dispatcher
+        # 同じ URL の要約が実行中なら、その結果を待って使う
+        self.single_flight = single_flight or SingleFlight()
+        self.max_concurrency_per_message = max_concurrency_per_message
 
     def execute(self, comment: str) -> str | None:
-        extracted_url = self.url_extractor.extract(comment)
-        if extracted_url is None:
-            logger.info("No URL extracted")
+        urls = self._canonical_urls(self.url_extractor.extract(comment))
+        if not urls:
+            return None
+        with ThreadPoolExecutor(max_workers=self.max_concurrency_per_message) as pool:
+            futures = [
+                pool.submit(self.single_flight.do, url.key, self._summarize, url.url)
+                for url in urls
+            ]
+            results = [self._result(future) for future in futures]
+        return self._combine(urls, results)
+
+    async def aexecute(self, comment: str) -> str | None:
+        urls = self._canonical_urls(await self.url_extractor.aextract(comment))
+        if not urls:
             return None
+        semaphore = asyncio.Semaphore(self.max_concurrency_per_message)
+
+        async def run(url: CanonicalURL) -> str:
+            async with semaphore:
+                return await self.single_flight.ado(url.key, self._asummarize, url.url)
+
+        results = await asyncio.gather(
+            *(run(url) for url in urls), return_exceptions=True
+        )
+        return self._combine(urls, results)
+
+    async def astreams(self, comment: str) -> list[AsyncIterator[str]]:
+        """URL ごとに、要約をその時点までの全文として順に返すイテレータを返す。URL がなければ空リスト
 
-        category = self.dispatcher.dispatch(extracted_url)
+        各イテレータは、まず空文字を 1 回返してから要約を始める。
+        同じ URL の要約が実行中の場合は、それが完了したときに結果だけを返す。
+        """
+        urls = self._canonical_urls(await self.url_extractor.aextract(comment))
+        semaphore = asyncio.Semaphore(self.max_concurrency_per_message)
+        return [self._astream(url, semaphore) for url in urls]
+
+    def _canonical_urls(self, urls: list[str]) -> list[CanonicalURL]:
+        # 表記ゆれを揃えてから振り分け・要約する。キャッシュも同じ URL で引かれる
+        canonical_urls = {}
+        for url in urls:
+            canonical = normalize_url(url)
+            canonical_urls.setdefault(canonical.key, canonical)
+        return list(canonical_urls.values())
+
+    def _result(self, future: Future) -> str | BaseException:
+        try:
+            return future.result()
+        except Exception as e:
+            return e
+
+    def _combine(
+        self, urls: list[CanonicalURL], results: list[str | BaseException]
+    ) -> str:
+        """URL が 1 つならその要約を、複数なら URL ごとの要約をつなげて返す"""
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if len(errors) == len(results):
+            raise errors[0]
+        if len(results) == 1:
+            return results[0]
+        sections = []
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to summarize {url.url}: {result}")
+                result = f"要約できませんでした: {result}"
+            sections.append(f"{url.url}\n{result}")
+        return "\n\n".join(sections)
+
+    def _summarize(self, url: str) -> str:
+        category = self.dispatcher.dispatch(url)
         logger.info(f"Category: {category}")
 
         summarizer = self.builder.build_summarizer(category)
-        summarized_text = summarizer.summarize(extracted_url)
+        summarized_text = summarizer.summarize(url)
         logger.info(f"Summarized text: {summarized_text}")
         return summarized_text
 
+    async def _asummarize(self, url: str) -> str:
+        category = await self.dispatcher.adispatch(url)
+        logger.info(f"Category: {category}")
+
+        summarizer = self.builder.build_summarizer(category)
+        summarized_text = await summarizer.asummarize(url)
+        logger.info(f"Summarized text: {summarized_text}")
+        return summarized_text
+
+    async def _astream(
+        self, url: CanonicalURL, semaphore: asyncio.Semaphore
+    ) -> AsyncIterator[str]:
+        yield ""
+        async with semaphore:
+            # 途中経過は自分が実行した場合にだけ queue に流れてくる
+            updates: asyncio.Queue[str] = asyncio.Queue()
+
+            async def stream(url: str) -> str | None:
+                summary = None
+                async for summary in self._astream_summary(url):
+                    updates.put_nowait(summary)
+                return summary
+
+            task = asyncio.ensure_future(
+                self.single_flight.ado(url.key, stream, url.url)
+            )
+            last = None
+            try:
+                while not task.done():
+                    update = asyncio.ensure_future(updates.get())
+                    await asyncio.wait(
+                        {update, task}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if update.done():
+                        last = update.result()
+                        yield last
+                    else:
+                        update.cancel()
+                while not updates.empty():
+                    last = updates.get_nowait()
+                    yield last
+                if (summary := task.result()) is not None and summary != last:
+                    yield summary
+            finally:
+                task.cancel()
+
+    async def _astream_summary(self, url: str) -> AsyncIterator[str]:
+        category = await self.dispatcher.adispatch(url)
+        logger.info(f"Category: {category}")
+
+        summarizer = self.builder.build_summarizer(category)
+        async for summary in summarizer.astream(url):
+            yield summary
+
 
 class SimpleExecutor:
     def __init__(self, summerizer: TextSummarizer) -> None:
@@ -39,12 +172,25 @@ class SimpleExecutor:
     def execute(self, text: str) -> str:
         return self.summerizer.summarize(text)
 
+    async def aexecute(self, text: str) -> str:
+        return await self.summerizer.asummarize(text)
+
+    async def astreams(self, text: str) -> list[AsyncIterator[str]]:
+        return [self._astream(text)]
+
+    async def _astream(self, text: str) -> AsyncIterator[str]:
+        yield ""
+        async for summary in self.summerizer.astream(text):
+            yield summary
+
 
 class ExecutorBuilder:
     @staticmethod
-    def build() -> Executor:
-        return Executor(SummarizerBuilder(), URLExtractor(), Dispatcher())
+    def build(builder: SummarizerBuilder | None = None) -> Executor:
+        return Executor(builder or SummarizerBuilder(), URLExtractor(), Dispatcher())
 
     @staticmethod
-    def build_simple() -> SimpleExecutor:
-        return SimpleExecutor(TextSummarizer())
+    def build_simple(builder: SummarizerBuilder | None = None) -> SimpleExecutor:
+        if builder is None:
+            return SimpleExecutor(TextSummarizer())
+        return SimpleExecutor(builder.text_summarizer)
@@ -1,10 +1,10 @@
 # %%
 # PPT の文字起こし
-from summarizer import PPTSummarizer, TextSummarizer
+from summarizer import HTTPClient, PPTXSummarizer, TextSummarizer
 
 ppt_filepath = "data/sample.pptx"
 text_summarizer = TextSummarizer()
-ppt_summarizer = PPTSummarizer(text_summarizer)
+ppt_summarizer = PPTXSummarizer(text_summarizer, HTTPClient(), allow_local_files=True)
 result = ppt_summarizer.summarize(ppt_filepath)
 print(result)
 
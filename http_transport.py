@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# ブラウザと同じような User-Agent にしないと、本文を返さないサイトがある
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
+}
+
+# リトライすれば成功しうるステータスコードと例外
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RETRYABLE_ERRORS = (
+    httpx.TimeoutException,
+    httpx.NetworkError,
+    httpx.RemoteProtocolError,
+)
+# Cloudflare のチャレンジページに含まれる文字列
+_CLOUDFLARE_CHALLENGE_MARKERS = ("cf-chl", "challenge-platform", "Just a moment")
+
+
+def is_cloudflare_challenge(response: Any) -> bool:
+    """Cloudflare の JavaScript チャレンジで止められたレスポンスかどうか"""
+    if response.status_code not in (403, 429, 503):
+        return False
+    if response.headers.get("cf-mitigated") == "challenge":
+        return True
+    return "cloudflare" in response.headers.get("Server", "").lower() and any(
+        marker in response.text for marker in _CLOUDFLARE_CHALLENGE_MARKERS
+    )
+
+
+class HTTPTransport:
+    """接続を使い回しながら、タイムアウトとリトライつきで GET する
+
+    httpx のクライアントをプロセス全体で共有し、ホストごとの接続をキープアライブで再利用する。
+    1 回の GET は、リトライや本文の受信を含めて deadline 秒以内に終わらせる。
+    接続の確立は connect_timeout 秒、受信が read_timeout 秒止まったら失敗とみなし、
+    リトライできるエラーなら jitter を入れた指数バックオフで max_retries 回までやり直す。
+    Cloudflare のチャレンジで止められたホストだけは cloudscraper で取得し直し、以降もそうする。
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 15.0,
+        deadline: float = 45.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 5.0,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        headers: dict[str, str] | None = None,
+        cloudflare_fallback: bool = True,
+        transport: httpx.BaseTransport | None = None,
+        async_transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.cloudflare_fallback = cloudflare_fallback
+        # テストでは httpx.MockTransport を渡す
+        self._transport = transport
+        self._async_transport = async_transport
+        self._client: httpx.Client | None = None
+        # AsyncClient はイベントループをまたいで使えないので、ループごとに 1 つ持つ
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        # cloudscraper のセッションはスレッドセーフではないので、スレッドごとに 1 つ持って使い回す
+        self._local = threading.local()
+        self._challenged_hosts: set[str] = set()
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    headers=self.headers,
+                    limits=self.limits,
+                    follow_redirects=True,
+                    transport=self._transport,
+                )
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._async_clients:
+                self._async_clients[loop] = httpx.AsyncClient(
+                    headers=self.headers,
+                    limits=self.limits,
+                    follow_redirects=True,
+                    transport=self._async_transport,
+                )
+            return self._async_clients[loop]
+
+    def get(
+        self, url: str, headers: dict | None = None, max_bytes: int | None = None
+    ) -> Any:
+        """url を GET してレスポンスを返す。本文が max_bytes を超えたら ValueError"""
+        host = self._host(url)
+        if host in self._challenged_hosts:
+            return self._get_with_cloudscraper(url, headers, max_bytes)
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            error = response = None
+            try:
+                response = self._send(url, headers, max_bytes, deadline)
+            except _RETRYABLE_ERRORS as e:
+                error = e
+            delay = self._retry_delay(url, attempt, deadline, response, error)
+            if delay is None:
+                break
+            time.sleep(delay)
+        if error is not None:
+            raise error
+        if self._challenged(host, response):
+            return self._get_with_cloudscraper(url, headers, max_bytes)
+        return response
+
+    async def aget(
+        self, url: str, headers: dict | None = None, max_bytes: int | None = None
+    ) -> Any:
+        """get の非同期版。cloudscraper を使う場合だけスレッドに逃がす"""
+        host = self._host(url)
+        if host in self._challenged_hosts:
+            return await asyncio.to_thread(
+                self._get_with_cloudscraper, url, headers, max_bytes
+            )
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            error = response = None
+            try:
+                response = await self._asend(url, headers, max_bytes, deadline)
+            except _RETRYABLE_ERRORS as e:
+                error = e
+            delay = self._retry_delay(url, attempt, deadline, response, error)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        if self._challenged(host, response):
+            return await asyncio.to_thread(
+                self._get_with_cloudscraper, url, headers, max_bytes
+            )
+        return response
+
+    def close(self) -> None:
+        """同期のクライアントを閉じる。AsyncClient も閉じるには aclose を使う"""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        """同期のクライアントと、イベントループごとの AsyncClient の接続をすべて閉じる"""
+        self.close()
+        current = asyncio.get_running_loop()
+        with self._lock:
+            clients = list(self._async_clients.items())
+            self._async_clients.clear()
+        for loop, client in clients:
+            if loop is current:
+                await client.aclose()
+            elif loop.is_running():
+                # AsyncClient は作られたループでしか閉じられない
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+                )
+            # 止まったループの接続はもう使われないので、参照を手放すだけにする
+
+    def _send(
+        self, url: str, headers: dict | None, max_bytes: int | None, deadline: float
+    ) -> httpx.Response:
+        with self.client.stream(
+            "GET", url, headers=headers, timeout=self._timeout(deadline)
+        ) as response:
+            self._check_length(url, response, max_bytes)
+            chunks = []
+            size = 0
+            for chunk in response.iter_bytes():
+                size = self._receive(url, chunks, chunk, size, max_bytes, deadline)
+        return self._buffered(response, chunks)
+
+    async def _asend(
+        self, url: str, headers: dict | None, max_bytes: int | None, deadline: float
+    ) -> httpx.Response:
+        async with self.async_client.stream(
+            "GET", url, headers=headers, timeout=self._timeout(deadline)
+        ) as response:
+            self._check_length(url, response, max_bytes)
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                size = self._receive(url, chunks, chunk, size, max_bytes, deadline)
+        return self._buffered(response, chunks)
+
+    def _timeout(self, deadline: float) -> httpx.Timeout:
+        remaining = max(deadline - time.monotonic(), 0.001)
+        return httpx.Timeout(
+            min(self.read_timeout, remaining),
+            connect=min(self.connect_timeout, remaining),
+        )
+
+    def _check_length(self, url: str, response: Any, max_bytes: int | None) -> None:
+        length = int(response.headers.get("Content-Length") or 0)
+        if max_bytes is not None and length > max_bytes:
+            raise ValueError(f"File is too large (> {max_bytes} bytes): {url}")
+
+    def _receive(
+        self,
+        url: str,
+        chunks: list[bytes],
+        chunk: bytes,
+        size: int,
+        max_bytes: int | None,
+        deadline: float,
+    ) -> int:
+        # read_timeout は 1 回の受信ごとの制限なので、少しずつ送ってくるサーバーは deadline で切る
+        if time.monotonic() > deadline:
+            raise httpx.ReadTimeout(f"Deadline exceeded: {url}")
+        chunks.append(chunk)
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            raise ValueError(f"File is too large (> {max_bytes} bytes): {url}")
+        return size
+
+    def _buffered(
+        self, response: httpx.Response, chunks: list[bytes]
+    ) -> httpx.Response:
+        # 展開済みの本文を持つレスポンスにする。接続はこの時点でプールに返っている
+        content = b"".join(chunks)
+        headers = response.headers.copy()
+        headers.pop("Content-Encoding", None)
+        headers["Content-Length"] = str(len(content))
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=content,
+            request=response.request,
+        )
+
+    def _retry_delay(
+        self,
+        url: str,
+        attempt: int,
+        deadline: float,
+        response: Any,
+        error: Exception | None,
+    ) -> float | None:
+        """get と aget で共通のリトライの判断。リトライするなら待つ秒数を、しないなら None を返す"""
+        if error is None and not self._should_retry(response):
+            return None
+        delay = self._backoff(attempt, response)
+        if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+            return None
+        logger.info(f"Retry in {delay:.2f}s: {url} ({error or response})")
+        return delay
+
+    def _should_retry(self, response: Any) -> bool:
+        return response.status_code in _RETRYABLE_STATUS and not (
+            is_cloudflare_challenge(response)
+        )
+
+    def _backoff(self, attempt: int, response: Any = None) -> float:
+        """full jitter の指数バックオフ。Retry-After があればそれに従う"""
+        retry_after = response.headers.get("Retry-After") if response else None
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _host(self, url: str) -> str:
+        return (urlsplit(url).hostname or "").lower()
+
+    def _challenged(self, host: str, response: Any) -> bool:
+        """チャレンジで止められていたら、ホストを覚えて True を返す"""
+        if not (self.cloudflare_fallback and is_cloudflare_challenge(response)):
+            return False
+        logger.info(f"Cloudflare challenge detected. Use cloudscraper for {host}")
+        with self._lock:
+            self._challenged_hosts.add(host)
+        return True
+
+    def _get_with_cloudscraper(
+        self, url: str, headers: dict | None, max_bytes: int | None
+    ) -> Any:
+        import cloudscraper
+
+        if not hasattr(self._local, "scraper"):
+            self._local.scraper = cloudscraper.create_scraper()
+        # チャレンジを解くのに時間がかかるので、本文はまとめて受け取る
+        response = self._local.scraper.get(
+            url, headers=headers, timeout=(self.connect_timeout, self.read_timeout)
+        )
+        if max_bytes is not None and len(response.content) > max_bytes:
+            raise ValueError(f"File is too large (> {max_bytes} bytes): {url}")
+        return response
@@ -0,0 +1,190 @@
+import asyncio
+import functools
+import logging
+import threading
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFullError(Exception):
+    """チャンネルのキューが上限に達しているときに送出される"""
+
+
+@dataclass
+class _Job:
+    func: Callable[..., Any]
+    args: tuple
+    future: asyncio.Future = field(repr=False)
+
+
+class JobRunner:
+    """要約パイプラインを Discord のイベントループの外で実行するための実行層
+
+    - ジョブはチャンネルごとのキューに積まれ、投稿順に取り出される。同じチャンネルのジョブは
+      channel_concurrency 個まで並行に処理される (既定の 1 なら 1 つずつ順に処理される)
+    - 全チャンネル合計の同時実行数は max_concurrency で制限される
+    - 同期関数は max_workers 個のスレッドプールで実行されるので、イベントループはブロックされない
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_concurrency: int | None = None,
+        max_queue_size: int = 20,
+        channel_concurrency: int = 1,
+    ) -> None:
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency or max_workers
+        self.max_queue_size = max_queue_size
+        self.channel_concurrency = channel_concurrency
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="summarizer"
+        )
+        # Semaphore はイベントループに紐づくので、最初の submit 時に作る
+        self._semaphore: asyncio.Semaphore | None = None
+        self._queues: dict[int, asyncio.Queue[_Job]] = {}
+        self._workers: dict[int, set[asyncio.Task]] = {}
+        self._running = 0
+
+    def queue_depth(self, channel_id: int | None = None) -> int:
+        """待ち状態のジョブ数を返す。channel_id を省略すると全チャンネルの合計"""
+        if channel_id is not None:
+            queue = self._queues.get(channel_id)
+            return queue.qsize() if queue else 0
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    @property
+    def running(self) -> int:
+        """実行中のジョブ数"""
+        return self._running
+
+    async def submit(self, channel_id: int, func: Callable[..., Any], *args) -> Any:
+        """ジョブをチャンネルのキューに積み、完了したらその結果を返す"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        queue = self._queues.setdefault(
+            channel_id, asyncio.Queue(maxsize=self.max_queue_size)
+        )
+        future = asyncio.get_running_loop().create_future()
+        try:
+            queue.put_nowait(_Job(func, args, future))
+        except asyncio.QueueFull:
+            raise JobQueueFullError(
+                f"Too many pending jobs in channel {channel_id} ({queue.qsize()})"
+            )
+        logger.info(
+            f"Queued job for channel {channel_id} "
+            f"(channel depth: {self.queue_depth(channel_id)}, "
+            f"total depth: {self.queue_depth()}, running: {self._running})"
+        )
+        self._ensure_workers(channel_id)
+        return await future
+
+    def _ensure_workers(self, channel_id: int) -> None:
+        workers = self._workers.setdefault(channel_id, set())
+        if len(workers) >= self.channel_concurrency:
+            return
+        workers.add(asyncio.create_task(self._work(channel_id)))
+
+    async def _work(self, channel_id: int) -> None:
+        # キューが空になったらワーカーは終了する。次の submit で再び作られる
+        try:
+            await self._drain(channel_id)
+        finally:
+            # done callback を待つと、その間に来た submit が終わりかけのワーカーを数えてしまうので、
+            # キューが空だと確認したのと同じステップで外す
+            self._workers[channel_id].discard(asyncio.current_task())
+
+    async def _drain(self, channel_id: int) -> None:
+        queue = self._queues[channel_id]
+        while not queue.empty():
+            job = queue.get_nowait()
+            if job.future.cancelled():
+                continue
+            async with self._semaphore:
+                self._running += 1
+                try:
+                    result = await self._run(job)
+                except Exception as e:
+                    if not job.future.cancelled():
+                        job.future.set_exception(e)
+                else:
+                    if not job.future.cancelled():
+                        job.future.set_result(result)
+                finally:
+                    self._running -= 1
+
+    async def _run(self, job: _Job) -> Any:
+        if asyncio.iscoroutinefunction(job.func):
+            return await job.func(*job.args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool, functools.partial(job.func, *job.args)
+        )
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class SingleFlight:
+    """同じキーの処理が実行中なら、新しく始めずにその結果を待つ
+
+    同じリンクが複数のチャンネルにほぼ同時に投稿されたときに、取得・文字起こし・要約を
+    1 回で済ませるために使う。結果は共有するだけで、完了後には保持しない。
+    """
+
+    def __init__(self) -> None:
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._futures: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        """実行中のキーの数"""
+        with self._lock:
+            return len(self._tasks) + len(self._futures)
+
+    def do(self, key: str, func: Callable[..., Any], *args) -> Any:
+        """同期版。後から来た呼び出しは先に始まった呼び出しの完了を待つ"""
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = Future()
+        if not leader:
+            logger.info(f"Join in-flight job: {key}")
+            return future.result()
+
+        try:
+            result = func(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._futures[key]
+
+    async def ado(self, key: str, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """非同期版。処理は Task として走らせるので、最初の呼び出し元がキャンセルされても
+        後から来た呼び出し元には結果が届く"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args))
+            self._tasks[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+        else:
+            logger.info(f"Join in-flight job: {key}")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        self._tasks.pop(key, None)
+        # 待っている呼び出し元がすべてキャンセルされていても、例外の警告が出ないようにする
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,121 @@
+import re
+
+# Discord の 1 メッセージの文字数上限
+MESSAGE_LIMIT = 2000
+
+_HEADING_PATTERN = re.compile(r"^#{1,6}\s")
+_BULLET_PATTERN = re.compile(r"^\s*([-*+]|\d+\.)\s")
+_FENCE_PATTERN = re.compile(r"^\s*(```|~~~)")
+
+# 分割する位置の優先度。大きいほど優先する
+_PRIORITY_HEADING = 3
+_PRIORITY_PARAGRAPH = 2
+_PRIORITY_BULLET = 1
+_PRIORITY_LINE = 0
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Discord に送れるように、Markdown の境界で text を limit 文字以内に分割する
+
+    見出し → 段落 → bullet → 行 の順に優先して区切る。
+    コードブロックの途中で区切る場合は、いったん閉じて次のメッセージで開き直す。
+    """
+    if len(text) <= limit:
+        return [text]
+
+    lines = _split_long_lines(text.splitlines(), limit // 2)
+    priorities, fences = _analyze(lines)
+
+    messages: list[str] = []
+    start = 0
+    while start < len(lines):
+        prefix = [fences[start]] if fences[start] else []
+        end = _find_end(lines, priorities, fences, start, prefix, limit)
+        suffix = [_closing(fences[end])] if end < len(lines) and fences[end] else []
+        message = "\n".join(prefix + lines[start:end] + suffix).strip("\n")
+        if message.strip():
+            messages.append(message)
+        start = end
+    return messages
+
+
+def _split_long_lines(lines: list[str], max_length: int) -> list[str]:
+    """1 行だけで長すぎるものは、文の境界か文字数で複数行に分ける
+
+    分けた行は改行なしでつなげるべきものだが、Discord 上では改行が入っても読めるので許容する。
+    """
+    result: list[str] = []
+    for line in lines:
+        while len(line) > max_length:
+            head = line[:max_length]
+            boundary = max(head.rfind("。"), head.rfind(". "), head.rfind(" "))
+            cut = boundary + 1 if boundary > max_length // 2 else max_length
+            result.append(line[:cut].rstrip())
+            line = line[cut:].lstrip()
+        result.append(line)
+    return result
+
+
+def _analyze(lines: list[str]) -> tuple[list[int], list[str | None]]:
+    """各行の直前で区切るときの優先度と、その位置で開いているコードブロックの開始行を返す"""
+    priorities: list[int] = []
+    fences: list[str | None] = []
+    fence: str | None = None
+    for i, line in enumerate(lines):
+        fences.append(fence)
+        if fence is not None:
+            priorities.append(_PRIORITY_LINE)
+        elif _HEADING_PATTERN.match(line):
+            priorities.append(_PRIORITY_HEADING)
+        elif i > 0 and not lines[i - 1].strip() and line.strip():
+            priorities.append(_PRIORITY_PARAGRAPH)
+        elif _BULLET_PATTERN.match(line):
+            priorities.append(_PRIORITY_BULLET)
+        else:
+            priorities.append(_PRIORITY_LINE)
+        if _FENCE_PATTERN.match(line):
+            fence = None if fence is not None else line.strip()
+    fences.append(fence)
+    return priorities, fences
+
+
+def _closing(fence: str) -> str:
+    return fence[:3]
+
+
+def _find_end(
+    lines: list[str],
+    priorities: list[int],
+    fences: list[str | None],
+    start: int,
+    prefix: list[str],
+    limit: int,
+) -> int:
+    """lines[start:end] が 1 メッセージに収まる範囲で、最もよい区切り位置 end を返す"""
+    length = sum(len(line) + 1 for line in prefix)
+    candidates: list[int] = []
+    end = start
+    while end < len(lines):
+        closing = len(_closing(fences[end + 1])) + 1 if fences[end + 1] else 0
+        if end > start and length + len(lines[end]) + closing > limit:
+            break
+        length += len(lines[end]) + 1
+        end += 1
+        candidates.append(end)
+    if end >= len(lines):
+        return end
+
+    # 短くなりすぎない範囲で、優先度の高い境界を選ぶ。同じ優先度なら後ろのもの
+    min_length = limit // 2
+    best = end
+    best_priority = priorities[end]
+    length = sum(len(line) + 1 for line in prefix)
+    for candidate in candidates[:-1]:
+        length += len(lines[candidate - 1]) + 1
+        if length < min_length:
+            continue
+        if priorities[candidate] > best_priority:
+            best, best_priority = candidate, priorities[candidate]
+        elif priorities[candidate] == best_priority and candidate > best:
+            best = candidate
+    return best
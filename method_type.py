@@ -5,4 +5,6 @@ class MethodType(Enum):
     YOUTUBE = "YouTube"
     WEB = "Web"
     ARXIV = "arXiv"
+    PDF = "PDF"
+    PPTX = "PPTX"
     NONE = "None"
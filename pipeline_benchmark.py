@@ -0,0 +1,531 @@
+import argparse
+import asyncio
+import io
+import logging
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import weakref
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, NamedTuple
+from urllib.parse import urlsplit
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from executor import Executor
+from http_transport import HTTPTransport
+from router import Dispatcher, URLExtractor
+from summarizer import (
+    WHISPER_AUDIO_BITRATE_KBPS,
+    ArXivSummarizer,
+    HTTPClient,
+    PPTXSummarizer,
+    SummarizerBuilder,
+    TextSummarizer,
+    WebSummarizer,
+    YouTubeSummarizer,
+)
+from text_processing import count_tokens
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", "html"
+)
+
+# 偽のモデルが返す要約。writer / map / reviser のどれにもこれを返す
+DEFAULT_RESPONSE = "# ベンチマーク用の要約\n\n" + "\n".join(
+    f"- 要点 {i}: 本文の内容を、具体例や数値を含めて高校生にもわかるように説明する。"
+    for i in range(1, 21)
+)
+
+
+class LatencyChatModel(BaseChatModel):
+    """決まった応答を、API と同じような待ち時間と速さで返す偽のチャットモデル
+
+    最初のトークンまでに first_token_latency 秒かかり、prompt_tokens_per_second を指定すると
+    プロンプトを読む時間がそれに足される。以降は tokens_per_second の速さで chunk_chars 文字ずつ返す。
+    トークン数は count_tokens で数える。
+    """
+
+    response: str = DEFAULT_RESPONSE
+    first_token_latency: float = 0.5
+    tokens_per_second: float = 50.0
+    prompt_tokens_per_second: float | None = None
+    chunk_chars: int = 8
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "latency-chat-model"
+
+    def _first_token_seconds(self, messages: list[BaseMessage]) -> float:
+        self.calls += 1
+        seconds = self.first_token_latency
+        if self.prompt_tokens_per_second:
+            prompt = "".join(str(message.content) for message in messages)
+            seconds += count_tokens(prompt) / self.prompt_tokens_per_second
+        return seconds
+
+    def _chunks(self) -> Iterator[tuple[str, float]]:
+        for i in range(0, len(self.response), self.chunk_chars):
+            chunk = self.response[i : i + self.chunk_chars]
+            yield chunk, count_tokens(chunk) / self.tokens_per_second
+
+    def _result(self) -> ChatResult:
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=self.response))]
+        )
+
+    def _generate(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        seconds = self._first_token_seconds(messages)
+        time.sleep(seconds + sum(seconds for _, seconds in self._chunks()))
+        return self._result()
+
+    async def _agenerate(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        seconds = self._first_token_seconds(messages)
+        await asyncio.sleep(seconds + sum(seconds for _, seconds in self._chunks()))
+        return self._result()
+
+    def _stream(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._first_token_seconds(messages))
+        for chunk, seconds in self._chunks():
+            time.sleep(seconds)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+    async def _astream(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._first_token_seconds(messages))
+        for chunk, seconds in self._chunks():
+            await asyncio.sleep(seconds)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+
+class LocalSite:
+    """保存したページを返すローカルの HTTP サーバー
+
+    pages はパスから (本文, Content-Type) への辞書。ホスト名は見ないので、RewriteTransport と
+    組み合わせると、どのサイトの URL もこのサーバーに向けられる。各リクエストは latency 秒待ってから返す。
+    """
+
+    def __init__(
+        self, pages: dict[str, tuple[bytes, str]], latency: float = 0.0
+    ) -> None:
+        self.pages = pages
+        self.latency = latency
+        self.requests = 0
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "LocalSite":
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # キープアライブで接続を使い回せるようにする
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                site.requests += 1
+                time.sleep(site.latency)
+                path = urlsplit(self.path).path
+                body, content_type = site.pages.get(path, (b"Not Found", "text/plain"))
+                self.send_response(200 if path in site.pages else 404)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class RewriteTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """どのホストへのリクエストも、base_url のサーバーに送る httpx のトランスポート"""
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = httpx.URL(base_url)
+        self._transport = httpx.HTTPTransport()
+        # 非同期のコネクションプールはイベントループをまたいで使えないので、ループごとに作る
+        self._async_transports: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _rewrite(self, request: httpx.Request) -> None:
+        request.url = request.url.copy_with(
+            scheme=self.base_url.scheme,
+            host=self.base_url.host,
+            port=self.base_url.port,
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._rewrite(request)
+        return self._transport.handle_request(request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._rewrite(request)
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_transports:
+            self._async_transports[loop] = httpx.AsyncHTTPTransport()
+        return await self._async_transports[loop].handle_async_request(request)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class FakeWhisper:
+    """音声の長さに realtime_factor を掛けた時間だけ待ち、長さに応じた文字起こしを返す
+
+    音声の長さは、Whisper 向けに変換した音声のビットレートとファイルサイズから見積もる。
+    """
+
+    def __init__(self, realtime_factor: float = 0.02, chars_per_second: float = 6.0):
+        self.realtime_factor = realtime_factor
+        self.chars_per_second = chars_per_second
+
+    def _seconds(self, file) -> float:
+        return os.fstat(file.fileno()).st_size / (WHISPER_AUDIO_BITRATE_KBPS * 1000 / 8)
+
+    def _transcription(self, seconds: float) -> SimpleNamespace:
+        sentence = "これは合成した音声の文字起こしです。"
+        count = max(1, int(seconds * self.chars_per_second / len(sentence)))
+        return SimpleNamespace(text=sentence * count, language="japanese")
+
+    def create(self, model: str, file, response_format: str) -> SimpleNamespace:
+        seconds = self._seconds(file)
+        time.sleep(seconds * self.realtime_factor)
+        return self._transcription(seconds)
+
+    async def acreate(self, model: str, file, response_format: str) -> SimpleNamespace:
+        seconds = self._seconds(file)
+        await asyncio.sleep(seconds * self.realtime_factor)
+        return self._transcription(seconds)
+
+
+class OfflineYouTubeSummarizer(YouTubeSummarizer):
+    """字幕がなく、ダウンロードすると audio_file が得られる動画として振る舞う YouTubeSummarizer
+
+    音声の分割は本物の ffmpeg で行い、文字起こしは FakeWhisper に任せる。
+    """
+
+    def __init__(
+        self,
+        text_summarizer: TextSummarizer,
+        audio_file: str,
+        whisper: FakeWhisper,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(text_summarizer, **kwargs)
+        self.audio_file = audio_file
+        self._client = SimpleNamespace(
+            audio=SimpleNamespace(transcriptions=SimpleNamespace(create=whisper.create))
+        )
+        self._async_client = SimpleNamespace(
+            audio=SimpleNamespace(
+                transcriptions=SimpleNamespace(create=whisper.acreate)
+            )
+        )
+
+    def transcribe_with_youtube_transcript_api(self, url: str):
+        raise RuntimeError("No captions in the offline benchmark")
+
+    def _download_audio(self, url: str, workdir: str) -> str:
+        path = os.path.join(workdir, "source" + os.path.splitext(self.audio_file)[1])
+        shutil.copyfile(self.audio_file, path)
+        return path
+
+
+def synthetic_text(tokens: int) -> str:
+    """tokens トークン程度の、重複する行のない文章を作る"""
+    paragraphs = []
+    total = 0
+    i = 0
+    while total < tokens:
+        i += 1
+        paragraph = (
+            f"## 節 {i}\n"
+            f"第 {i} 節では、手法の {i} 番目の工夫について説明する。"
+            f"実験では {i * 7 % 100} 件のデータを使い、精度は {50 + i % 50} % だった。\n"
+            f"This paragraph {i} describes the setup, the baseline and the result in detail."
+        )
+        paragraphs.append(paragraph)
+        total += count_tokens(paragraph)
+    return "\n\n".join(paragraphs)
+
+
+def synthetic_pptx(slides: int) -> bytes:
+    """タイトル・箇条書き・ノートを持つスライドをメモリ上で作る"""
+    from pptx import Presentation
+
+    presentation = Presentation()
+    for i in range(1, slides + 1):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f"スライド {i}"
+        slide.placeholders[1].text = "\n".join(
+            f"ポイント {i}-{j}: 説明の本文" for j in range(1, 6)
+        )
+        slide.notes_slide.notes_text_frame.text = f"スライド {i} のノート"
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    return buffer.getvalue()
+
+
+def synthetic_audio(path: str, seconds: float) -> str:
+    """10 秒ごとに 1 秒の無音が入る、seconds 秒の音声を ffmpeg で作る"""
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            f"aevalsrc='if(between(mod(t,10),6,7),0,sin(2*PI*440*t))':d={seconds}:s=44100",
+            "-ac",
+            "2",
+            path,
+        ],
+        check=True,
+    )
+    return path
+
+
+def site_pages(pptx_slides: int = 40) -> dict[str, tuple[bytes, str]]:
+    """tests/fixtures/html の HTML と、合成したスライドを返すページ"""
+    pages = {}
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+                pages[f"/{name[: -len('.html')]}"] = (
+                    f.read(),
+                    "text/html; charset=utf-8",
+                )
+    # ArXivSummarizer は ar5iv.org/abs/{id} を取得する
+    pages["/abs/2202.12493"] = pages["/ar5iv_paper"]
+    pages["/slides.pptx"] = (
+        synthetic_pptx(pptx_slides),
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    )
+    return pages
+
+
+# 測れる段階。youtube は ffmpeg がなければ飛ばす
+STAGES = ("text", "text (map-reduce)", "web", "arxiv", "pptx", "executor", "youtube")
+
+
+class StageReport(NamedTuple):
+    stage: str
+    runs: int
+    p50: float
+    p95: float
+    # 1 秒あたりに終わった実行の数
+    throughput: float
+    peak_mib: float
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+async def measure_stage(
+    name: str,
+    run: Callable[[int], Awaitable[Any]],
+    runs: int = 5,
+    concurrency: int = 1,
+) -> StageReport:
+    """run(i) を runs 回、concurrency 個ずつ並行に動かして、レイテンシとスループットを測る
+
+    ピークメモリは tracemalloc の負荷で時間が変わらないように、もう 1 回だけ動かして測る。
+    tracemalloc が数えるのは Python のオブジェクトだけで、ffmpeg などの子プロセスは含まない。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def timed(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await run(i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(runs)))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        await run(runs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return StageReport(
+        name,
+        runs,
+        _percentile(latencies, 0.5),
+        _percentile(latencies, 0.95),
+        runs / elapsed,
+        peak / 2**20,
+    )
+
+
+def build_stages(
+    site: LocalSite,
+    model_options: dict[str, Any] | None = None,
+    audio_file: str | None = None,
+    long_text_tokens: int = 60000,
+) -> dict[str, Callable[[int], Awaitable[Any]]]:
+    """要約の各段階を、偽のモデルとローカルのサーバーを使って動かす関数を返す
+
+    各関数は実行ごとの番号を受け取る。同じ URL の要約がまとめられないように、URL に番号をつける。
+    """
+    model_options = model_options or {}
+    text_summarizer = TextSummarizer(
+        LatencyChatModel(**model_options), enforce_length=False
+    )
+    transport = RewriteTransport(site.base_url)
+    http_client = HTTPClient(
+        transport=HTTPTransport(
+            transport=transport, async_transport=transport, max_retries=0
+        )
+    )
+    builder = SummarizerBuilder(
+        text_summarizer=text_summarizer, http_client=http_client
+    )
+    executor = Executor(
+        builder,
+        URLExtractor(model=LatencyChatModel(**{**model_options, "response": "NONE"})),
+        Dispatcher(model=LatencyChatModel(**{**model_options, "response": "Web"})),
+    )
+    web = WebSummarizer(text_summarizer, http_client)
+    arxiv = ArXivSummarizer(text_summarizer, http_client)
+    pptx = PPTXSummarizer(text_summarizer, http_client)
+    short_text = synthetic_text(2000)
+    long_text = synthetic_text(long_text_tokens)
+
+    stages = {
+        "text": lambda i: text_summarizer.asummarize(f"{i}\n{short_text}"),
+        "text (map-reduce)": lambda i: text_summarizer.asummarize(f"{i}\n{long_text}"),
+        "web": lambda i: web.asummarize(f"https://example.com/blog_article?run={i}"),
+        "arxiv": lambda i: arxiv.asummarize("https://arxiv.org/abs/2202.12493"),
+        "pptx": lambda i: pptx.asummarize(
+            f"https://cdn.example.com/slides.pptx?run={i}"
+        ),
+        "executor": lambda i: executor.aexecute(
+            f"https://example.com/blog_article?run={i}\n"
+            f"https://example.com/docs_page?run={i}\n"
+            f"https://cdn.example.com/slides.pptx?run={i}"
+        ),
+    }
+    if audio_file is not None:
+        youtube = OfflineYouTubeSummarizer(text_summarizer, audio_file, FakeWhisper())
+        stages["youtube"] = lambda i: youtube.asummarize(
+            f"https://www.youtube.com/watch?v=bench{i:06d}"
+        )
+    return stages
+
+
+async def run_benchmark(
+    stages: list[str] | None = None,
+    runs: int = 5,
+    concurrency: int = 1,
+    model_options: dict[str, Any] | None = None,
+    site_latency: float = 0.0,
+    audio_seconds: float = 120.0,
+    long_text_tokens: int = 60000,
+) -> list[StageReport]:
+    """ネットワークや API を使わずに、要約の各段階のレイテンシ・スループット・ピークメモリを測る
+
+    stages を省略するとすべての段階を測る。STAGES にない名前があれば ValueError
+    """
+    unknown = [name for name in stages or [] if name not in STAGES]
+    if unknown:
+        raise ValueError(
+            f"Unknown stages: {', '.join(unknown)} (choose from {', '.join(STAGES)})"
+        )
+    reports = []
+    with (
+        tempfile.TemporaryDirectory(prefix="summarizer-benchmark-") as workdir,
+        LocalSite(site_pages(), latency=site_latency) as site,
+    ):
+        audio_file = None
+        if (stages is None or "youtube" in stages) and shutil.which("ffmpeg"):
+            audio_file = synthetic_audio(
+                os.path.join(workdir, "audio.webm"), audio_seconds
+            )
+        elif stages is None or "youtube" in stages:
+            logger.warning("ffmpeg is not installed. Skip the youtube stage.")
+        functions = build_stages(site, model_options, audio_file, long_text_tokens)
+        for name in stages or list(functions):
+            if name not in functions:
+                # ffmpeg がなくて作れなかった段階
+                continue
+            reports.append(
+                await measure_stage(name, functions[name], runs, concurrency)
+            )
+    return reports
+
+
+if __name__ == "__main__":
+    # python pipeline_benchmark.py --runs 10 --concurrency 4
+    parser = argparse.ArgumentParser(
+        description="偽のモデルとローカルのサーバーで、要約の各段階の性能を測る"
+    )
+    parser.add_argument("--stage", action="append", choices=STAGES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--first-token-latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=None)
+    parser.add_argument("--site-latency", type=float, default=0.05)
+    parser.add_argument("--audio-seconds", type=float, default=120.0)
+    args = parser.parse_args()
+    reports = asyncio.run(
+        run_benchmark(
+            args.stage,
+            args.runs,
+            args.concurrency,
+            {
+                "first_token_latency": args.first_token_latency,
+                "tokens_per_second": args.tokens_per_second,
+                "prompt_tokens_per_second": args.prompt_tokens_per_second,
+            },
+            args.site_latency,
+            args.audio_seconds,
+        )
+    )
+    print(
+        f"{'stage':<18} {'runs':>5} {'p50 s':>8} {'p95 s':>8} {'runs/s':>8} {'peak MiB':>9}"
+    )
+    for report in reports:
+        print(
+            f"{report.stage:<18} {report.runs:>5} {report.p50:>8.3f} {report.p95:>8.3f} "
+            f"{report.throughput:>8.2f} {report.peak_mib:>9.1f}"
+        )
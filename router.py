@@ -1,42 +1,193 @@
 import logging
+import re
+import string
+import threading
+from urllib.parse import urlparse
 
+from langchain_core.language_models import BaseChatModel
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable, RunnablePassthrough
+
+from method_type import MethodType
+from url_normalizer import normalize_url
 
 logger = logging.getLogger(__name__)
 
 
+def _build_model() -> Runnable:
+    # langchain_openai は openai ごと読み込むので重い。LLM を使うときまで import しない
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(temperature=0, model="gpt-3.5-turbo-0125")
+
+
 PROMPT_URL_EXTRACTOR = """
-以下のコメントから、「人間が URL だと認識する文字列」を抽出して。
+以下のコメントから、「人間が URL だと認識する文字列」をすべて抽出して。
 例えば、不自然に URL 文字列が途切れているならば、それを修正して抽出すること。
 クエリパラメータが含まれている場合は、それを含めて抽出すること。
+複数ある場合は、1 行に 1 つずつ、コメントに出てくる順に返して。URL 以外の文字列は不要。
 そうしたものが存在しなければ ”NONE” と返して。
 ---
 {comment}
 """
 
 
+# 先頭の h が欠けた "ttps://" なども拾う
+_SCHEME_PATTERN = re.compile(r"(?<![A-Za-z])h?(ttps?)://")
+# スキームがなくても URL っぽく見えるもの。これがあれば判断を LLM に任せる
+_URL_LIKE_PATTERN = re.compile(
+    r"www\.|[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}(?![A-Za-z0-9])"
+)
+_URL_CHARS = frozenset(string.ascii_letters + string.digits + "-._~:/?#[]@!$&'()*+,;=%")
+# クエリ中では日本語も URL の一部として扱うが、句読点や括弧が来たらそこで切る
+_QUERY_STOP_CHARS = frozenset("、。，．「」『』（）【】　")
+_TRAILING_PUNCTUATION = ".,;:!?"
+# パスがこれらで終わっていたら、直後の日本語などもパスの一部 (エンコードされていない) かもしれない
+_PATH_CONTINUATION_CHARS = "/-_=%"
+
+
+class LocalURLExtractor:
+    """LLM を使わずにコメントから URL を抽出する
+
+    extract は URL のリストを返す。URL がなければ空リスト、
+    自信を持って判断できない場合は None を返すので、その場合は LLM に任せる。
+    """
+
+    def extract(self, comment: str) -> list[str] | None:
+        matches = list(_SCHEME_PATTERN.finditer(comment))
+        if not matches:
+            if _URL_LIKE_PATTERN.search(comment):
+                return None
+            return []
+
+        urls = []
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(comment)
+            url = self._scan(match.group(1), comment[match.end() : end])
+            if url is None:
+                return None
+            urls.append(url)
+        return urls
+
+    def _scan(self, scheme: str, rest: str) -> str | None:
+        """スキームの後ろの文字列から URL の残りを読み取る"""
+        url = ""
+        i = 0
+        while i < len(rest):
+            c = rest[i]
+            if c in _URL_CHARS or ("?" in url and self._is_query_char(c)):
+                url += c
+                i += 1
+                continue
+            if not c.isspace():
+                # 日本語などが URL に直接くっついている。パスが途中で切れているなら、
+                # 「/wiki/東京」のようにパスの続きなのか区別できない
+                if not c.isascii() and self._path_is_incomplete(url):
+                    return None
+                break
+
+            # 空白や改行を挟んだ続きが URL の一部かどうかを判断する
+            j = i
+            while j < len(rest) and rest[j].isspace():
+                j += 1
+            k = j
+            while k < len(rest) and rest[k] in _URL_CHARS:
+                k += 1
+            fragment = rest[j:k]
+            if not fragment:
+                break
+            if self._host_is_incomplete(url):
+                url += fragment
+                i = k
+                continue
+            glued = k < len(rest) and not rest[k].isspace()
+            if any(c.isalpha() for c in fragment) or glued:
+                # 英文の続きなのか、URL の途中で改行されたのか区別できない
+                return None
+            # 数字や記号だけの断片は、ID などが途中で切れたものとみなす
+            url += fragment
+            i = k
+
+        url = url.rstrip(_TRAILING_PUNCTUATION)
+        if url.endswith(")") and "(" not in url:
+            url = url[:-1]
+        if "." not in self._host(url):
+            return None
+        return f"h{scheme}://{url}"
+
+    def _is_query_char(self, c: str) -> bool:
+        return not c.isspace() and not c.isascii() and c not in _QUERY_STOP_CHARS
+
+    def _host(self, url: str) -> str:
+        return re.split(r"[/?#]", url, maxsplit=1)[0]
+
+    def _path_is_incomplete(self, url: str) -> bool:
+        return "/" in url and url.endswith(tuple(_PATH_CONTINUATION_CHARS))
+
+    def _host_is_incomplete(self, url: str) -> bool:
+        if re.search(r"[/?#]", url):
+            return False
+        # TLD は 2 文字以上のアルファベットのはず
+        return re.search(r"\.[A-Za-z]{2,}(:\d+)?$", url) is None
+
+
 class URLExtractor:
-    def __init__(self, system_prompt: str = PROMPT_URL_EXTRACTOR) -> None:
-        outputparser = StrOutputParser()
-        context = {
-            "comment": RunnablePassthrough(),
-        }
-        prompt = ChatPromptTemplate.from_messages([("user", system_prompt)])
-        model = ChatOpenAI(temperature=0, model="gpt-3.5-turbo-0125")
-        self.chain = context | prompt | model | outputparser
-
-    def extract(self, comment: str) -> str | None:
-        extracted_url = self.chain.invoke(comment)
-        # 抽出された URL が "NONE" であるか、"x.com" を含む場合は None を返す
-        # Twitter はコンテンツが読めないので、 URL を抽出する意味がない
-        if extracted_url == "NONE" or "x.com" in extracted_url:
+    def __init__(
+        self,
+        system_prompt: str = PROMPT_URL_EXTRACTOR,
+        local_extractor: LocalURLExtractor | None = None,
+        model: BaseChatModel | None = None,
+    ) -> None:
+        self.local_extractor = local_extractor or LocalURLExtractor()
+        self.system_prompt = system_prompt
+        # model を渡さなければ OpenAI のモデルを使う
+        self.model = model
+        # ほとんどのコメントは手元で抽出できるので、LLM のクライアントは必要になってから作る
+        self._chain: Runnable | None = None
+        self._chain_lock = threading.Lock()
+
+    @property
+    def chain(self) -> Runnable:
+        with self._chain_lock:
+            if self._chain is None:
+                context = {
+                    "comment": RunnablePassthrough(),
+                }
+                prompt = ChatPromptTemplate.from_messages(
+                    [("user", self.system_prompt)]
+                )
+                model = self.model or _build_model()
+                self._chain = context | prompt | model | StrOutputParser()
+            return self._chain
+
+    def extract(self, comment: str) -> list[str]:
+        """コメントに含まれる URL を出てくる順に返す。なければ空リスト"""
+        urls = self.local_extractor.extract(comment)
+        if urls is not None:
+            return self._filter(urls)
+        logger.info("Local URL extraction is ambiguous. Use LLM.")
+        return self._parse(self.chain.invoke(comment))
+
+    async def aextract(self, comment: str) -> list[str]:
+        urls = self.local_extractor.extract(comment)
+        if urls is not None:
+            return self._filter(urls)
+        logger.info("Local URL extraction is ambiguous. Use LLM.")
+        return self._parse(await self.chain.ainvoke(comment))
+
+    def _parse(self, answer: str) -> list[str]:
+        lines = [line.strip().lstrip("-*").strip() for line in answer.splitlines()]
+        return self._filter([line for line in lines if line and line != "NONE"])
+
+    def _filter(self, urls: list[str]) -> list[str]:
+        # "x.com" を含むものは除く。Twitter はコンテンツが読めないので、 URL を抽出する意味がない
+        urls = [url for url in dict.fromkeys(urls) if "x.com" not in url]
+        if urls:
+            logger.info(f"Extracted URLs: {urls}")
+        else:
             logger.info("No URL extracted")
-            return None
-        logger.info(f"Extracted URL: {extracted_url}")
-        return extracted_url
+        return urls
 
 
 PROMPT_DISPATCHER = """
@@ -51,14 +202,78 @@ PROMPT_DISPATCHER = """
 """
 
 
+def dispatch_by_rule(url: str) -> MethodType | None:
+    """URL が YouTube 動画・arXiv 論文・PDF などのファイルを指していれば MethodType を返す。そうでなければ None"""
+    return normalize_url(url).method
+
+
 class Dispatcher:
-    def __init__(self, system_prompt: str = PROMPT_DISPATCHER) -> None:
-        outputparser = StrOutputParser()
-        prompt = ChatPromptTemplate.from_messages([("user", system_prompt)])
-        model = ChatOpenAI(temperature=0, model="gpt-3.5-turbo-0125")
-        self.chain = prompt | model | outputparser
-
-    def dispatch(self, url: str) -> str:
-        method = self.chain.invoke(url)
+    def __init__(
+        self,
+        system_prompt: str = PROMPT_DISPATCHER,
+        max_memo_size: int = 1024,
+        model: BaseChatModel | None = None,
+    ) -> None:
+        self.system_prompt = system_prompt
+        # model を渡さなければ OpenAI のモデルを使う
+        self.model = model
+        # YouTube や arXiv はルールで判定できるので、LLM のクライアントは必要になってから作る
+        self._chain: Runnable | None = None
+        self._chain_lock = threading.Lock()
+        # LLM の判定結果はドメインごとに覚えておく
+        self.max_memo_size = max_memo_size
+        self._memo: dict[str, MethodType] = {}
+        self._memo_lock = threading.Lock()
+
+    @property
+    def chain(self) -> Runnable:
+        with self._chain_lock:
+            if self._chain is None:
+                prompt = ChatPromptTemplate.from_messages(
+                    [("user", self.system_prompt)]
+                )
+                model = self.model or _build_model()
+                self._chain = prompt | model | StrOutputParser()
+            return self._chain
+
+    def dispatch(self, url: str) -> MethodType:
+        method = self._lookup(url)
+        if method is None:
+            method = self._remember(url, self.chain.invoke(url))
         logger.info(f"Dispatched method: {method}")
         return method
+
+    async def adispatch(self, url: str) -> MethodType:
+        method = self._lookup(url)
+        if method is None:
+            method = self._remember(url, await self.chain.ainvoke(url))
+        logger.info(f"Dispatched method: {method}")
+        return method
+
+    def _lookup(self, url: str) -> MethodType | None:
+        method = dispatch_by_rule(url)
+        if method is not None:
+            return method
+        with self._memo_lock:
+            return self._memo.get(self._domain(url))
+
+    def _remember(self, url: str, answer: str) -> MethodType:
+        method = self._parse(answer)
+        with self._memo_lock:
+            if len(self._memo) >= self.max_memo_size:
+                # 一番古いものから捨てる
+                self._memo.pop(next(iter(self._memo)))
+            self._memo[self._domain(url)] = method
+        return method
+
+    def _parse(self, answer: str) -> MethodType:
+        # LLM の自由記述の回答を MethodType に寄せる。わからなければ Web とする
+        normalized = answer.strip().strip("\"'”“").lower()
+        for method in (MethodType.YOUTUBE, MethodType.ARXIV, MethodType.WEB):
+            if normalized == method.value.lower():
+                return method
+        logger.warning(f"Unexpected dispatcher answer: {answer}. Fallback to Web.")
+        return MethodType.WEB
+
+    def _domain(self, url: str) -> str:
+        return (urlparse(url).hostname or "").lower()
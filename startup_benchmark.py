@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import NamedTuple
+
+# 読み込みに時間がかかるライブラリ。どの処理でどれが読み込まれるかを見る
+HEAVY_BACKENDS = (
+    "langchain_core",
+    "langchain_anthropic",
+    "langchain_openai",
+    "anthropic",
+    "openai",
+    "yt_dlp",
+    "youtube_transcript_api",
+    "pydub",
+    "cloudscraper",
+    "bs4",
+    "lxml",
+    "pptx",
+    "pypdf",
+    "httpx",
+    "discord",
+)
+# 動画の要約にしか使わないライブラリ。メンションされた投稿の要約では読み込まない
+VIDEO_STACK = ("yt_dlp", "youtube_transcript_api", "pydub", "openai")
+
+DEFAULT_MODULES = (
+    "method_type",
+    "url_normalizer",
+    "text_processing",
+    "cache",
+    "content_extractor",
+    "document_extractor",
+    "arxiv_paper",
+    "http_transport",
+    "message_formatter",
+    "streaming_reply",
+    "job_runner",
+    "router",
+    "summarizer",
+    "executor",
+    "discord_launcher",
+)
+
+# 起動してから要約を始めるまでの処理
+SCENARIOS = {
+    "launcher": "import discord_launcher",
+    "simple mention": (
+        "import discord_launcher\ndiscord_launcher.get_simple_executor()"
+    ),
+    "url executor": "import discord_launcher\ndiscord_launcher.get_executor()",
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": list(sys.modules)}}))
+"""
+
+# discord_launcher を import できるように、ダミーの設定を入れる。キャッシュはファイルに書かない
+_PROBE_ENV = {
+    "DISCORD_ALLOWED_CHANNEL_ID_LIST": "0",
+    "DISCORD_BOT_TOKEN": "dummy",
+    "OPENAI_API_KEY": "dummy",
+    "ANTHROPIC_API_KEY": "dummy",
+    "SUMMARY_CACHE_PATH": ":memory:",
+    "CONTENT_CACHE_PATH": ":memory:",
+    "TRANSCRIPT_CACHE_PATH": ":memory:",
+    "PAPER_CACHE_PATH": ":memory:",
+}
+
+
+class StartupBenchmark(NamedTuple):
+    name: str
+    seconds: float
+    backends: list[str]
+
+
+def probe(code: str) -> tuple[float, list[str]]:
+    """新しい Python プロセスで code を実行し、かかった時間と読み込まれた重いライブラリを返す"""
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(code=code)],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, **_PROBE_ENV},
+    )
+    # import したモジュールがログを出力することがあるので、最後の行だけを読む
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = set(report["modules"])
+    return report["seconds"], [name for name in HEAVY_BACKENDS if name in modules]
+
+
+def benchmark(codes: dict[str, str], repeat: int = 3) -> list[StartupBenchmark]:
+    """それぞれの code を repeat 回ずつ新しいプロセスで実行し、時間の中央値を測る"""
+    results = []
+    for name, code in codes.items():
+        seconds = []
+        for _ in range(repeat):
+            elapsed, backends = probe(code)
+            seconds.append(elapsed)
+        results.append(StartupBenchmark(name, statistics.median(seconds), backends))
+    return results
+
+
+if __name__ == "__main__":
+    # python startup_benchmark.py
+    parser = argparse.ArgumentParser(
+        description="モジュールの import と起動にかかる時間、読み込まれるライブラリを測る"
+    )
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    codes = {module: f"import {module}" for module in args.modules}
+    codes.update(SCENARIOS)
+    print(f"{'name':<20} {'ms':>8}  backends")
+    for result in benchmark(codes, args.repeat):
+        print(
+            f"{result.name:<20} {result.seconds * 1000:>8.1f}  "
+            f"{', '.join(result.backends)}"
+        )
@@ -0,0 +1,93 @@
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+from message_formatter import MESSAGE_LIMIT, split_message
+
+logger = logging.getLogger(__name__)
+
+# 書いている途中であることを示すために、途中経過の末尾につける
+_IN_PROGRESS_MARK = " …"
+
+
+class StreamingReply:
+    """要約の途中経過を 1 つの返信に書き込んでいき、完成したら分割して送り直す
+
+    最初に placeholder で返信し、以降は min_interval 秒以上の間隔をあけて編集する。
+    Discord のメッセージ編集はチャンネルごとに 5 秒に 5 回程度に制限されているので、
+    それを超えないように間引く。途中経過は最初のメッセージに収まる分だけを表示し、
+    完成した要約が長い場合は split_message で分けた残りを返信としてつなげる。
+    """
+
+    def __init__(
+        self,
+        message: Any,
+        min_interval: float = 1.5,
+        placeholder: str = "要約しています…",
+        limit: int = MESSAGE_LIMIT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        # message は discord.Message を想定する。reply() と、その戻り値の edit() だけを使う
+        self.message = message
+        self.min_interval = min_interval
+        self.placeholder = placeholder
+        self.limit = limit
+        self.clock = clock
+        self.reply = None
+        self.edits = 0
+        self._shown: str | None = None
+        self._last_edit = 0.0
+
+    async def consume(self, stream: AsyncIterator[str]) -> str | None:
+        """stream が返す途中経過を表示し、最後に返したものを完成した要約として送る
+
+        stream が例外を送出した場合は、返信をエラーの内容に書き換えてから送出し直す。
+        """
+        text = None
+        try:
+            async for text in stream:
+                if self.reply is None:
+                    await self._start(text)
+                elif self.clock() - self._last_edit >= self.min_interval:
+                    await self._edit(self._preview(text))
+        except Exception as e:
+            # placeholder を出したままにしないで、エラーに置き換える
+            if self.reply is not None:
+                await self._edit(f"Error occurred. Details:\n{e.args}")
+            raise
+        if text:
+            await self._finish(text)
+        elif self.reply is not None:
+            await self._edit("要約を作成できませんでした。")
+        return text
+
+    async def _start(self, text: str) -> None:
+        self._shown = self._preview(text) or self.placeholder
+        self.reply = await self.message.reply(self._shown)
+        self._last_edit = self.clock()
+
+    async def _edit(self, content: str) -> None:
+        if not content or content == self._shown:
+            return
+        await self.reply.edit(content=content)
+        self._shown = content
+        self._last_edit = self.clock()
+        self.edits += 1
+
+    def _preview(self, text: str) -> str:
+        if not text.strip():
+            return ""
+        head = split_message(text, self.limit - len(_IN_PROGRESS_MARK))[0]
+        return head + _IN_PROGRESS_MARK
+
+    async def _finish(self, text: str) -> None:
+        pieces = split_message(text, self.limit)
+        if self.reply is None:
+            self.reply = await self.message.reply(pieces[0])
+        else:
+            await self._edit(pieces[0])
+        message = self.reply
+        for piece in pieces[1:]:
+            message = await message.reply(piece)
+        logger.info(f"Streamed reply: {self.edits} edits, {len(pieces)} messages")
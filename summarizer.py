@@ -1,34 +1,195 @@
+import asyncio
+import glob
 import logging
+import math
 import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
-import cloudscraper
-from bs4 import BeautifulSoup
-from langchain_anthropic import ChatAnthropic
 from langchain_core.language_models import BaseChatModel
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from openai import OpenAI
-from pydub import AudioSegment
-from pydub.utils import make_chunks
-from youtube_transcript_api import YouTubeTranscriptApi
-from yt_dlp import YoutubeDL
+from langchain_core.runnables import Runnable
 
+from arxiv_paper import paper_to_text, parse_ar5iv
+from cache import (
+    ArXivPaper,
+    CachedContent,
+    ContentCache,
+    PaperCache,
+    SummaryCache,
+    Transcript,
+    TranscriptCache,
+    normalize_language,
+)
+from content_extractor import ContentExtractor, build_extractor
+from document_extractor import DocumentExtractor, PDFExtractor, PPTXExtractor
+from http_transport import HTTPTransport
 from method_type import MethodType
+from text_processing import (
+    compress_markdown,
+    count_tokens,
+    normalize_input,
+    split_text,
+)
+from url_normalizer import normalize_url
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
 
 logger = logging.getLogger(__name__)
 
 
+# 直接取得できなかったページは、JavaScript の実行などを代行してくれるプロキシ経由で取得する
+CONTENT_PROXY_PREFIX = "https://r.jina.ai/"
+# メモリに読み込むファイルの大きさの上限。Discord の添付ファイルの上限より少し大きくしておく
+MAX_DOCUMENT_BYTES = 50 * 1024 * 1024
+
+
 class HTTPClient:
-    def __init__(self) -> None:
-        self.client = cloudscraper.create_scraper()
+    """ページやファイルを取得する。通信は HTTPTransport に任せ、キャッシュと本文の抽出をする"""
+
+    def __init__(
+        self,
+        content_cache: ContentCache | None = None,
+        extractor: ContentExtractor | None = None,
+        proxy_prefix: str = CONTENT_PROXY_PREFIX,
+        min_content_chars: int = 200,
+        transport: HTTPTransport | None = None,
+    ) -> None:
+        self.extractor = extractor or build_extractor()
+        # get_content で直接取得した本文がこれより短ければ、JavaScript で描画するページなどとみなしてプロキシを使う
+        self.proxy_prefix = proxy_prefix
+        self.min_content_chars = min_content_chars
+        # 接続はジョブをまたいで使い回す
+        self.transport = transport or HTTPTransport()
+        self.content_cache = content_cache
+
+    def get(self, url: str, raise_for_status: bool = False) -> str:
+        """url を取得し、抽出した本文のテキストを返す"""
+        return self._fetch(url, raise_for_status)[1]
+
+    def get_html(self, url: str, raise_for_status: bool = True) -> str:
+        """url を取得し、レスポンスの本文をそのまま返す。構造を見て自前で解析したいときに使う
+
+        本文の抽出はしない。抽出したテキストがないので、新しく取得したものはキャッシュに書き込まない
+        """
+        return self._fetch(url, raise_for_status, extract=False)[0]
+
+    def _fetch(
+        self, url: str, raise_for_status: bool, extract: bool = True
+    ) -> tuple[str, str | None]:
+        cached, headers = self._cached(url)
+        if cached is not None and headers is None:
+            return cached.body, cached.text
+        response = self.transport.get(url, headers=headers)
+        return self._handle_response(url, cached, response, raise_for_status, extract)
+
+    async def _afetch(self, url: str, raise_for_status: bool) -> tuple[str, str]:
+        cached, headers = self._cached(url)
+        if cached is not None and headers is None:
+            return cached.body, cached.text
+        response = await self.transport.aget(url, headers=headers)
+        # 本文の抽出とキャッシュへの書き込みはイベントループの外でする
+        return await asyncio.to_thread(
+            self._handle_response, url, cached, response, raise_for_status
+        )
+
+    def _cached(self, url: str) -> tuple[CachedContent | None, dict | None]:
+        """キャッシュと、条件付きリクエストのヘッダーを返す。キャッシュが新しければヘッダーは None"""
+        if self.content_cache is None:
+            return None, {}
+        cached = self.content_cache.get(url)
+        if cached is not None and self.content_cache.is_fresh(cached):
+            logger.info(f"Content cache hit: {url}")
+            return cached, None
+        headers = {}
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        return cached, headers
+
+    def _handle_response(
+        self,
+        url: str,
+        cached: CachedContent | None,
+        response,
+        raise_for_status: bool,
+        extract: bool = True,
+    ) -> tuple[str, str | None]:
+        if response.status_code == 304 and cached is not None:
+            logger.info(f"Content cache revalidated: {url}")
+            self.content_cache.revalidated(url)
+            return cached.body, cached.text
+
+        if raise_for_status:
+            response.raise_for_status()
+        if not extract:
+            return response.text, None
+        body_text = self._extract_text(response)
+        if self.content_cache is not None and response.status_code < 400:
+            self.content_cache.set(
+                url,
+                response.text,
+                body_text,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        return response.text, body_text
+
+    def _extract_text(self, response) -> str:
+        # プロキシは抽出済みのテキストを返すので、HTML のときだけ本文を抽出する
+        content_type = response.headers.get("Content-Type", "text/html")
+        if "html" not in content_type:
+            return response.text
+        return self.extractor.extract(response.text)
+
+    async def aget(self, url: str, raise_for_status: bool = False) -> str:
+        return (await self._afetch(url, raise_for_status))[1]
+
+    def get_content(self, url: str) -> str:
+        """まず直接取得し、失敗したり本文が取れなかったりしたらプロキシ経由で取得する"""
+        try:
+            text = self.get(url, raise_for_status=True)
+            if self._has_content(url, text):
+                return text
+        except Exception as e:
+            logger.info(f"Failed to fetch directly: {url} ({e})")
+        return self.get(f"{self.proxy_prefix}{url}")
+
+    async def aget_content(self, url: str) -> str:
+        try:
+            text = await self.aget(url, raise_for_status=True)
+            if self._has_content(url, text):
+                return text
+        except Exception as e:
+            logger.info(f"Failed to fetch directly: {url} ({e})")
+        return await self.aget(f"{self.proxy_prefix}{url}")
+
+    def _has_content(self, url: str, text: str) -> bool:
+        if len(text.strip()) >= self.min_content_chars:
+            return True
+        logger.info(f"Too little content fetched directly ({len(text)}): {url}")
+        return False
 
-    def get(self, url: str) -> str:
-        html_content = self.client.get(url).text
-        body_text = BeautifulSoup(html_content, "html.parser").get_text()
-        return body_text
+    def get_bytes(self, url: str, max_bytes: int = MAX_DOCUMENT_BYTES) -> bytes:
+        """url のファイルをディスクに書かずにメモリに読み込む。max_bytes を超えたら ValueError"""
+        response = self.transport.get(url, max_bytes=max_bytes)
+        response.raise_for_status()
+        return response.content
 
 
+# Discord の 1 メッセージの文字数上限
+MAX_SUMMARY_LENGTH = 2000
+
 PROMPT_WRITER_TEXT_SUMMARIER = """
 以下の文章の要点を抽出して、それぞれに対して、文意の正確性を損なわないように気をつけながら、
 可能な限り高校生でもわかるように詳細に説明をしてください。
@@ -38,7 +199,7 @@ PROMPT_WRITER_TEXT_SUMMARIER = """
 - 要約以外の情報は不要
 - bullet に数字は使わない
 - 可能な限り日本語で記述する
-- 2000 文字以内
+- {max_length} 文字以内。{target_length} 文字程度を目安にする
 
 品質を上げるヒント:
 - 本文の中に具体例がある場合はそれを含めると良い。必要に応じてそのまま引用する。
@@ -52,102 +213,201 @@ PROMPT_WRITER_TEXT_SUMMARIER = """
 PROMPT_REVISER_TEXT_SUMMARIER = """
 {target_text}
 ---
-【資料】
-{input}
----
 
-現在の要約は {current_length} 文字です。Discord の文字数制限は 2000 文字なので、{over_length} 文字超過しています。
+上の要約は {current_length} 文字です。Discord の文字数制限は {max_length} 文字なので、{over_length} 文字超過しています。
 
-以下の点に注意して、2000 文字以内に収まるように要約を修正してください：
+以下の点に注意して、{target_length} 文字程度に収まるように要約を修正してください：
 - 重要度の低い詳細説明を削除する
 - 冗長な表現を簡潔にする
 - 本質的な情報は維持する
 - 可能な限り日本語で記述する
+- 文字数制限を必ず守ること（これが最優先）
 
 出力は、修正した文章のみを Markdown 形式で記述してください。つまり "以下は改善した文章です" といった前文は不要です。
 """
 
+PROMPT_MAP_TEXT_SUMMARIER = """
+以下は長い資料を分割したうちの {index}/{total} 番目の部分です。
+この部分に書かれている要点を、文意の正確性を損なわないように箇条書きで抽出してください。
+
+制約条件:
+- 後で他の部分の要点と合わせて 1 つの要約にするので、前置きやまとめは不要
+- 具体例、数値、固有名詞は省略せずに残す
+- 可能な限り日本語で記述する
+
+---
+{input}
+"""
+
 
 class TextSummarizer:
-    def __init__(self):
+    def __init__(
+        self,
+        model: BaseChatModel | None = None,
+        chunk_threshold_tokens: int = 30000,
+        chunk_tokens: int = 8000,
+        max_concurrency: int = 4,
+        max_length: int = MAX_SUMMARY_LENGTH,
+        enforce_length: bool = True,
+        input_budget_tokens: int | None = 100000,
+    ):
+        # 要約は max_length 文字以内に収める。プロンプトではそれより少し短い target_length を目安にさせ、
+        # 超えた分は手元で重要度の低い bullet から削る。
+        # 削る量が多すぎる (max_length * revision_ratio を超える) 場合だけ、要約だけを見せて 1 回書き直させる
+        self.max_length = max_length
+        self.target_length = int(max_length * 0.85)
+        self.revision_ratio = 1.3
+        # 送信時に分割できる場合は False にする。プロンプトの文字数の目安だけが効き、書き直しや削除はしない
+        self.enforce_length = enforce_length
+        # 入力が chunk_threshold_tokens を超えたら chunk_tokens ごとに分割して要点を抽出し (map)、
+        # それらをまとめて最終的な要約を書く (reduce)
+        self.chunk_threshold_tokens = chunk_threshold_tokens
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        # 要点をまとめてもまだ長い場合は、もう一度 map する。その回数の上限
+        self.max_map_rounds = 3
+        # 入力は空白や繰り返しを取り除いてから、input_budget_tokens に収まるように後ろを切る。None なら切らない
+        self.input_budget_tokens = input_budget_tokens
+        # max_tokens_to_sample は、default の 1024 だと文章が切れることがあるみたいなので 4096 に設定する。
+        # writer と reviser で同じクライアントを共有する
+        if model is None:
+            # langchain_anthropic は読み込みが重いので、モデルを渡されなかったときだけ import する
+            from langchain_anthropic import ChatAnthropic
+
+            model = ChatAnthropic(
+                model="claude-sonnet-4-20250514",
+                temperature=0,
+                max_tokens_to_sample=4096,
+            )
+        self.model = model
+        self.output_parser = StrOutputParser()
         self.writer_chain = self.build_writer_chain()
         self.reviser_chain = self.build_reviser_chain()
+        self.map_chain = self.build_map_chain()
 
-    def build_writer_chain(self) -> BaseChatModel:
-        self.prompt = ChatPromptTemplate.from_template(PROMPT_WRITER_TEXT_SUMMARIER)
-        # max_tokens_to_sample は、default の 1024 だと文章が切れることがあるみたいなので 2000 に設定する。
-        # 2000 以下にしないと Discord のメッセージ上限に引っかかる。
-        self.model = ChatAnthropic(
-            model="claude-sonnet-4-20250514", temperature=0, max_tokens_to_sample=4096
+    def build_writer_chain(self) -> Runnable:
+        prompt = ChatPromptTemplate.from_template(PROMPT_WRITER_TEXT_SUMMARIER).partial(
+            max_length=str(self.max_length), target_length=str(self.target_length)
         )
+        return prompt | self.model | self.output_parser
 
-        self.output_parser = StrOutputParser()
-        return self.prompt | self.model | self.output_parser
-
-    def build_reviser_chain(self) -> BaseChatModel:
-        self.prompt = ChatPromptTemplate.from_template(PROMPT_REVISER_TEXT_SUMMARIER)
-        # max_tokens_to_sample は、default の 1024 だと文章が切れることがあるみたいなので 2000 に設定する。
-        # 2000 以下にしないと Discord のメッセージ上限に引っかかる。
-        self.model = ChatAnthropic(
-            model="claude-sonnet-4-20250514", temperature=0, max_tokens_to_sample=4096
+    def build_reviser_chain(self) -> Runnable:
+        prompt = ChatPromptTemplate.from_template(
+            PROMPT_REVISER_TEXT_SUMMARIER
+        ).partial(
+            max_length=str(self.max_length), target_length=str(self.target_length)
         )
-        self.output_parser = StrOutputParser()
-        return self.prompt | self.model | self.output_parser
+        return prompt | self.model | self.output_parser
+
+    def build_map_chain(self) -> Runnable:
+        prompt = ChatPromptTemplate.from_template(PROMPT_MAP_TEXT_SUMMARIER)
+        return prompt | self.model | self.output_parser
 
     def summarize(self, input):
+        input = self._normalize(input)
+        for _ in range(self.max_map_rounds):
+            if (chunks := self._chunks(input)) is None:
+                break
+            notes = self.map_chain.batch(
+                self._map_inputs(chunks),
+                config={"max_concurrency": self.max_concurrency},
+            )
+            input = self._join_notes(notes)
         target_text = self.writer_chain.invoke({"input": input})
+        if self._needs_revision(target_text):
+            target_text = self.reviser_chain.invoke(self._revision_input(target_text))
+        return self._fit(target_text)
 
-        # 文字数をチェック
-        current_length = len(target_text)
-        if current_length <= 2000:
-            # 2000文字以内の場合はそのまま返す
-            return target_text
-        
-        # 2000文字を超えている場合は最大3回まで文字数削減を試みる
-        max_retries = 3
-        for retry in range(max_retries):
-            logger.info(f"2000文字を超えているため文字数削減を試みる (試行 {retry + 1}/{max_retries})")
-            over_length = current_length - 2000
-            
-            prompt = ChatPromptTemplate.from_template("""
-{target_text}
----
-【資料】
-{input}
----
+    async def asummarize(self, input):
+        input = await self._amap(input)
+        target_text = await self.writer_chain.ainvoke({"input": input})
+        return await self._arevise(target_text)
 
-現在の要約は {current_length} 文字です。Discord の文字数制限は 2000 文字なので、{over_length} 文字超過しています。
+    async def astream(self, input) -> AsyncIterator[str]:
+        """要約を書きながら、その時点までの全文を順に返す
 
-以下の点に注意して、必ず2000文字以内に収まるように要約を修正してください：
-- 重要度の低い詳細説明を削除する
-- 冗長な表現を簡潔にする
-- 本質的な情報は維持する
-- 可能な限り日本語で記述する
-- 文字数制限を必ず守ること（これが最優先）
+        writer の出力はトークンが届くたびに返す。書き直しや削除をした場合は、最後にその結果を返す。
+        最後に返すものは asummarize の結果と同じになる。
+        """
+        input = await self._amap(input)
+        target_text = ""
+        async for token in self.writer_chain.astream({"input": input}):
+            target_text += token
+            yield target_text
+        if (revised := await self._arevise(target_text)) != target_text:
+            yield revised
 
-出力は、修正した文章のみを Markdown 形式で記述してください。つまり "以下は改善した文章です" といった前文は不要です。
-""")
-            reviser_chain = prompt | self.model | self.output_parser
-            target_text = reviser_chain.invoke(
-                {
-                    "target_text": target_text,
-                    "input": input,
-                    "current_length": current_length,
-                    "over_length": over_length,
-                }
+    async def _amap(self, input: str) -> str:
+        input = self._normalize(input)
+        for _ in range(self.max_map_rounds):
+            if (chunks := self._chunks(input)) is None:
+                break
+            notes = await self.map_chain.abatch(
+                self._map_inputs(chunks),
+                config={"max_concurrency": self.max_concurrency},
             )
-            
-            # 修正後の文字数をチェック
-            current_length = len(target_text)
-            if current_length <= 2000:
-                logger.info(f"文字数削減成功: {current_length}文字")
-                return target_text
-            else:
-                logger.warning(f"試行 {retry + 1} 後も文字数超過: {current_length}文字")
-        
-        # 3回試してもダメな場合は、強制的に2000文字で切る
-        logger.error("最大リトライ回数に達しました。強制的に2000文字で切断します。")
-        return target_text[:2000] + "\n\n[注意: 文字数制限により内容が切断されました]"
+            input = self._join_notes(notes)
+        return input
+
+    async def _arevise(self, target_text: str) -> str:
+        if self._needs_revision(target_text):
+            target_text = await self.reviser_chain.ainvoke(
+                self._revision_input(target_text)
+            )
+        return self._fit(target_text)
+
+    def _normalize(self, input: str) -> str:
+        normalized = normalize_input(input, self.input_budget_tokens)
+        logger.info(f"入力を整形: {normalized.report()}")
+        return normalized.text
+
+    def _chunks(self, input: str) -> list[str] | None:
+        """入力が長すぎる場合は分割したものを返す。そのまま 1 回で要約できるなら None"""
+        tokens = count_tokens(input)
+        if tokens <= self.chunk_threshold_tokens:
+            return None
+        chunks = split_text(input, self.chunk_tokens)
+        logger.info(
+            f"入力が長いので分割して要約する ({tokens} tokens, {len(chunks)} chunks)"
+        )
+        return chunks
+
+    def _map_inputs(self, chunks: list[str]) -> list[dict]:
+        return [
+            {"input": chunk, "index": i + 1, "total": len(chunks)}
+            for i, chunk in enumerate(chunks)
+        ]
+
+    def _join_notes(self, notes: list[str]) -> str:
+        return "\n\n".join(f"## パート {i + 1}\n{note}" for i, note in enumerate(notes))
+
+    def _needs_revision(self, target_text: str) -> bool:
+        current_length = len(target_text)
+        if (
+            not self.enforce_length
+            or current_length <= self.max_length * self.revision_ratio
+        ):
+            return False
+        logger.info(
+            f"{self.max_length}文字を大きく超えているため書き直す: {current_length}文字"
+        )
+        return True
+
+    def _revision_input(self, target_text: str) -> dict:
+        current_length = len(target_text)
+        return {
+            "target_text": target_text,
+            "current_length": current_length,
+            "over_length": current_length - self.max_length,
+        }
+
+    def _fit(self, target_text: str) -> str:
+        """max_length を超えていたら、Markdown の境界で重要度の低いところから削る"""
+        if not self.enforce_length or len(target_text) <= self.max_length:
+            return target_text
+        compressed = compress_markdown(target_text, self.max_length)
+        logger.info(f"文字数を削減: {len(target_text)}文字 -> {len(compressed)}文字")
+        return compressed
 
 
 class BaseSummarizer(ABC):
@@ -155,6 +415,14 @@ class BaseSummarizer(ABC):
     def summarize(self, url: str) -> str:
         pass
 
+    @abstractmethod
+    async def asummarize(self, url: str) -> str:
+        pass
+
+    async def astream(self, url: str) -> AsyncIterator[str]:
+        """要約をその時点までの全文として順に返す。ストリーミングに対応しないものは完成したものを 1 回だけ返す"""
+        yield await self.asummarize(url)
+
 
 class WebSummarizer(BaseSummarizer):
     def __init__(
@@ -164,116 +432,456 @@ class WebSummarizer(BaseSummarizer):
         self.http_client = http_client
 
     def summarize(self, url: str) -> str:
-        # https://r.jina.ai/ を先頭につける
-        modified_url = f"https://r.jina.ai/{url}"
-        body_text = self.http_client.get(modified_url)
+        body_text = self.http_client.get_content(url)
         return self.text_summrizer.summarize(body_text)
 
+    async def asummarize(self, url: str) -> str:
+        body_text = await self.http_client.aget_content(url)
+        return await self.text_summrizer.asummarize(body_text)
+
+    async def astream(self, url: str) -> AsyncIterator[str]:
+        body_text = await self.http_client.aget_content(url)
+        async for summary in self.text_summrizer.astream(body_text):
+            yield summary
+
+
+# Whisper に送る音声の形式。音声認識には 16 kHz のモノラルで十分なので、
+# 音声向けの Opus を低ビットレートで使ってアップロードを小さくする
+WHISPER_AUDIO_SAMPLE_RATE = 16000
+WHISPER_AUDIO_BITRATE_KBPS = 24
+# Whisper API のアップロード上限は 25 MB なので、余裕を持たせる
+WHISPER_MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+# 言語の判定結果も受け取るために verbose_json にする
+WHISPER_OPTIONS = {"model": "whisper-1", "response_format": "verbose_json"}
+
+
+def _whisper_retryable_errors() -> tuple[type[Exception], ...]:
+    """Whisper の呼び出しで、リトライすれば成功しうるエラー"""
+    import openai
+
+    return (
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )
+
 
 class YouTubeSummarizer(BaseSummarizer):
-    def __init__(self, text_summarizer: TextSummarizer) -> None:
+    """YouTube の動画を、字幕か Whisper による文字起こしから要約する
+
+    yt_dlp・youtube_transcript_api・openai は読み込みが重く、動画を要約するときにしか使わないので、
+    使う直前に import する。
+    """
+
+    def __init__(
+        self,
+        text_summarizer: TextSummarizer,
+        whisper_concurrency: int = 4,
+        whisper_max_attempts: int = 3,
+        whisper_retry_backoff: float = 1.0,
+        transcript_cache: TranscriptCache | None = None,
+    ) -> None:
         self.text_summrizer = text_summarizer
+        self.transcript_cache = transcript_cache
+        # 分割した音声は whisper_concurrency 個ずつ並列に文字起こしする。
+        # 失敗したチャンクは whisper_retry_backoff 秒から倍々に待ちつつ、whisper_max_attempts 回まで試す
+        self.whisper_concurrency = whisper_concurrency
+        self.whisper_max_attempts = whisper_max_attempts
+        self.whisper_retry_backoff = whisper_retry_backoff
+        # Whisper に送る 1 チャンクの長さの目安。無音の位置に合わせて最大 silence_window_seconds 短くなる
+        self.segment_seconds = 15 * 60
+        self.split_on_silence = True
+        self.silence_window_seconds = 60
+        # 1 チャンクのアップロードの上限。長さの目安もこれに収まるように短くする
+        self.max_upload_bytes = WHISPER_MAX_UPLOAD_BYTES
+        # これより短く分けても上限に収まらなければ、分割をあきらめてエラーにする
+        self.min_segment_seconds = 1.0
+        self._client: OpenAI | None = None
+        self._async_client: AsyncOpenAI | None = None
+        # チャンクはスレッドプールで並列に文字起こしするので、クライアントを 1 つだけ作るようにする
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> "OpenAI":
+        # リトライはこちらで制御するので、クライアント側のリトライは切っておく
+        with self._client_lock:
+            if self._client is None:
+                from openai import OpenAI
+
+                self._client = OpenAI(max_retries=0)
+            return self._client
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        with self._client_lock:
+            if self._async_client is None:
+                from openai import AsyncOpenAI
+
+                self._async_client = AsyncOpenAI(max_retries=0)
+            return self._async_client
 
     def _get_video_id(self, url: str) -> str:
+        canonical = normalize_url(url)
+        if canonical.method != MethodType.YOUTUBE:
+            logger.error(f"Invalid URL format: {url}")
+            raise ValueError(f"Invalid URL format: {url}")
+        return canonical.resource_id
+
+    def _get_youtube_content(self, video_id: str) -> Transcript:
         """deprecated"""
-        # いくつか異なる形式の URL に対応する
-        # まず https://www.youtube.com/watch?v=xxxxx 形式の URL から video_id を取得する
-        if "v=" in url:
-            return url.split("v=")[1]
-        # 次に https://youtu.be/xxxxx 形式の URL から video_id を取得する
-        if "youtu.be" in url:
-            return url.split("/")[-1]
-        # どちらの形式でもない場合は例外を発生させる
-        logger.error(f"Invalid URL format: {url}")
-        raise ValueError(f"Invalid URL format: {url}")
-
-    def _get_youtube_content(self, video_id: str) -> str:
-        """deprecated"""
-        transcript = YouTubeTranscriptApi.get_transcript(
-            video_id, languages=["ja", "en"]
+        from youtube_transcript_api import YouTubeTranscriptApi
+
+        transcript = YouTubeTranscriptApi.list_transcripts(video_id).find_transcript(
+            ["ja", "en"]
         )
         content = ""
-        for i in transcript:
+        for i in transcript.fetch():
             content += i["text"]
-        return content
+        return Transcript(
+            content, "captions", normalize_language(transcript.language_code)
+        )
 
-    def transcribe_with_youtube_transcript_api(self, url: str) -> str:
+    def transcribe_with_youtube_transcript_api(self, url: str) -> Transcript:
         video_id = self._get_video_id(url)
-        content = self._get_youtube_content(video_id)
-        return content
+        return self._get_youtube_content(video_id)
+
+    def _download_audio(self, url: str, workdir: str) -> str:
+        from yt_dlp import YoutubeDL
 
-    def _download_audio(self, url: str) -> str:
+        # 再エンコードは分割と同時に 1 回だけ行うので、ここではダウンロードしたものをそのまま使う
         ydl_opts = {
             "format": "bestaudio/best",
-            "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "192",
-                }
-            ],
-            "outtmpl": "audio",
+            "outtmpl": os.path.join(workdir, "source.%(ext)s"),
         }
 
         with YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+            info = ydl.extract_info(url, download=True)
+            return ydl.prepare_filename(info)
 
-        return "audio.mp3"
+    def transcribe_with_whisper(self, url: str) -> Transcript:
+        # ジョブごとに専用の一時ディレクトリを使うので、並行する他のジョブのファイルと衝突しない。
+        # ディレクトリは成功しても失敗しても削除される
+        with tempfile.TemporaryDirectory(prefix="summarizer-") as workdir:
+            audio_file = self._download_audio(url, workdir)
+            audio_files = self._split_audio(audio_file, workdir)
+            # map は結果を入力の順に返すので、並列に処理しても文字起こしの順番は崩れない
+            with ThreadPoolExecutor(max_workers=self.whisper_concurrency) as pool:
+                return self._join_transcriptions(
+                    list(pool.map(self._transcribe, audio_files))
+                )
 
-    def transcribe_with_whisper(self, url: str) -> str:
-        audio_file = self._download_audio(url)
-        # 10 分ごとに分割する
-        audio_files = self._split_audio(audio_file)
-        content = ""
-        for audio_file in audio_files:
-            content += self._transcribe(audio_file)
-        self._post_processing(audio_files)
-        return content
+    async def atranscribe_with_whisper(self, url: str) -> Transcript:
+        with tempfile.TemporaryDirectory(prefix="summarizer-") as workdir:
+            # ダウンロードと分割はブロッキングな処理なのでスレッドで実行する
+            audio_file = await asyncio.to_thread(self._download_audio, url, workdir)
+            audio_files = await asyncio.to_thread(
+                self._split_audio, audio_file, workdir
+            )
+            semaphore = asyncio.Semaphore(self.whisper_concurrency)
+
+            async def transcribe(audio_file: str):
+                async with semaphore:
+                    return await self._atranscribe(audio_file)
+
+            # gather も結果を入力の順に返す
+            transcriptions = await asyncio.gather(*map(transcribe, audio_files))
+            return self._join_transcriptions(transcriptions)
+
+    def _join_transcriptions(self, transcriptions: list) -> Transcript:
+        # 言語は最初のチャンクで判定されたものを使う。Whisper は "japanese" のような名前で返す
+        language = normalize_language(
+            getattr(transcriptions[0], "language", None) if transcriptions else None
+        )
+        return Transcript("".join(t.text for t in transcriptions), "whisper", language)
 
-    def _transcribe(self, audio_file: str) -> str:
+    def _transcribe(self, audio_file: str):
         # Whisper を使う理由は、文字起こしの性能が普通より高いことと、たまに日本語の subtitle に対応していない
         # 動画も存在するから。デメリットは遅くなること。
-        client = OpenAI()
-        audio_file = open(audio_file, "rb")
-        transcription = client.audio.transcriptions.create(
-            model="whisper-1", file=audio_file
+        retryable_errors = _whisper_retryable_errors()
+        for attempt in range(1, self.whisper_max_attempts + 1):
+            try:
+                with open(audio_file, "rb") as f:
+                    transcription = self.client.audio.transcriptions.create(
+                        file=f, **WHISPER_OPTIONS
+                    )
+                break
+            except retryable_errors as e:
+                time.sleep(self._retry_delay(audio_file, attempt, e))
+        logger.info(f"Transcripted {audio_file}.")
+        return transcription
+
+    async def _atranscribe(self, audio_file: str):
+        retryable_errors = _whisper_retryable_errors()
+        for attempt in range(1, self.whisper_max_attempts + 1):
+            try:
+                # ファイルを開くのもブロッキングな処理なので、イベントループを止めないようにスレッドで行う
+                f = await asyncio.to_thread(open, audio_file, "rb")
+                with f:
+                    transcription = await self.async_client.audio.transcriptions.create(
+                        file=f, **WHISPER_OPTIONS
+                    )
+                break
+            except retryable_errors as e:
+                await asyncio.sleep(self._retry_delay(audio_file, attempt, e))
+        logger.info(f"Transcripted {audio_file}.")
+        return transcription
+
+    def _retry_delay(self, audio_file: str, attempt: int, error: Exception) -> float:
+        """_transcribe と _atranscribe で共通のリトライの判断。もう試せなければ error を送出する"""
+        if attempt == self.whisper_max_attempts:
+            raise error
+        logger.warning(f"Failed to transcribe {audio_file} ({error}). Retry.")
+        return self.whisper_retry_backoff * 2 ** (attempt - 1)
+
+    def _split_audio(self, audio_file: str, workdir: str) -> list[str]:
+        """音声を Whisper 向けの形式に変換しながら、ffmpeg の segment muxer で分割する
+
+        ストリームとして処理するので、音声全体をメモリに載せることはない。
+        区切りは _segment_times で決める。
+        """
+        duration, silences = (
+            self._detect_silences(audio_file) if self.split_on_silence else (None, [])
         )
-        logger.info("Transcripted.")
-        return transcription.text
-
-    def _split_audio(self, audio_file: str) -> list[str]:
-        audio = AudioSegment.from_file(audio_file, format="mp3")
-        chunk_length_ms = 10 * 60 * 1000
-        chunks = make_chunks(audio, chunk_length_ms)
-        audio_files = []
-        for i, chunk in enumerate(chunks):
-            chunk.export(f"audio_{i}.mp3", format="mp3")
-            audio_files.append(f"audio_{i}.mp3")
-        return audio_files
-
-    def _post_processing(self, audio_files) -> None:
-        """ダウンロードした audio ファイルを削除する"""
-        os.remove("audio.mp3")
-        for audio_file in audio_files:
-            os.remove(audio_file)
-        logger.info("Removed audio files.")
+        segment_times = self._segment_times(duration, silences)
+        segment_pattern = os.path.join(workdir, "audio_%03d.ogg")
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-i",
+                audio_file,
+                "-vn",
+                "-ac",
+                "1",
+                "-ar",
+                str(WHISPER_AUDIO_SAMPLE_RATE),
+                "-c:a",
+                "libopus",
+                "-b:a",
+                f"{WHISPER_AUDIO_BITRATE_KBPS}k",
+                "-application",
+                "voip",
+                "-f",
+                "segment",
+                *self._segment_options(segment_times),
+                "-reset_timestamps",
+                "1",
+                segment_pattern,
+            ],
+            check=True,
+        )
+        audio_files = sorted(glob.glob(os.path.join(workdir, "audio_*.ogg")))
+        # VBR なので、見積もりより大きくなったチャンクは上限に収まるまで分け直す
+        return [
+            piece
+            for audio_file in audio_files
+            for piece in self._fit_upload_budget(audio_file)
+        ]
 
-    def summarize(self, url: str) -> str:
+    def _fit_upload_budget(self, audio_file: str) -> list[str]:
+        """max_upload_bytes を超えるチャンクを、再エンコードせずに等分して返す。収まっていればそのまま返す"""
+        size = os.path.getsize(audio_file)
+        if size <= self.max_upload_bytes:
+            return [audio_file]
+        duration, _ = self._detect_silences(audio_file)
+        # 等分しても多少ばらつくので、1 割の余裕を持たせる
+        pieces = math.ceil(size / (self.max_upload_bytes * 0.9))
+        piece_seconds = duration / pieces if duration else 0.0
+        if piece_seconds < self.min_segment_seconds:
+            raise ValueError(
+                f"Audio chunk exceeds the upload budget ({size} > "
+                f"{self.max_upload_bytes} bytes) and cannot be split further: {audio_file}"
+            )
+        logger.info(f"Re-split {audio_file} ({size} bytes) into {pieces} pieces.")
+        stem, ext = os.path.splitext(audio_file)
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-i",
+                audio_file,
+                "-c",
+                "copy",
+                "-f",
+                "segment",
+                "-segment_time",
+                str(piece_seconds),
+                "-reset_timestamps",
+                "1",
+                f"{stem}_%03d{ext}",
+            ],
+            check=True,
+        )
+        os.remove(audio_file)
+        split_files = sorted(glob.glob(f"{glob.escape(stem)}_*{ext}"))
+        if len(split_files) < 2:
+            raise ValueError(f"Failed to split an oversized audio chunk: {audio_file}")
+        return [
+            fitted for piece in split_files for fitted in self._fit_upload_budget(piece)
+        ]
+
+    @property
+    def max_segment_seconds(self) -> float:
+        """アップロードの上限サイズから決まる 1 チャンクの最大の長さ。VBR なので 2 割の余裕を持たせる"""
+        bytes_per_second = WHISPER_AUDIO_BITRATE_KBPS * 1000 / 8
+        return self.max_upload_bytes / bytes_per_second * 0.8
+
+    def _segment_times(
+        self, duration: float | None, silences: list[float]
+    ) -> list[float]:
+        """区切る時刻のリストを返す。
+
+        segment_seconds ごとを目安に、その手前 silence_window_seconds 以内に無音があればそこで区切る。
+        どの区切りも max_segment_seconds を超えない。長さがわからない場合は空リストを返す
+        """
+        if duration is None:
+            return []
+        target = min(self.segment_seconds, self.max_segment_seconds)
+        times: list[float] = []
+        start = 0.0
+        while duration - start > target:
+            boundary = start + target
+            candidates = [
+                t
+                for t in silences
+                if boundary - self.silence_window_seconds <= t <= boundary and t > start
+            ]
+            cut = max(candidates) if candidates else boundary
+            times.append(round(cut, 3))
+            start = cut
+        return times
+
+    def _segment_options(self, segment_times: list[float]) -> list[str]:
+        if segment_times:
+            return ["-segment_times", ",".join(str(t) for t in segment_times)]
+        return [
+            "-segment_time",
+            str(min(self.segment_seconds, self.max_segment_seconds)),
+        ]
+
+    def _detect_silences(self, audio_file: str) -> tuple[float | None, list[float]]:
+        """ffmpeg の silencedetect で、音声の長さと無音区間の中央の時刻を求める"""
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-nostats",
+                "-i",
+                audio_file,
+                "-vn",
+                "-ac",
+                "1",
+                "-ar",
+                str(WHISPER_AUDIO_SAMPLE_RATE),
+                "-af",
+                "silencedetect=noise=-35dB:d=0.5",
+                "-f",
+                "null",
+                "-",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        duration = None
+        if match := re.search(r"Duration: (\d+):(\d+):([\d.]+)", result.stderr):
+            hours, minutes, seconds = match.groups()
+            duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        starts = [
+            float(t) for t in re.findall(r"silence_start: ([\d.]+)", result.stderr)
+        ]
+        ends = [float(t) for t in re.findall(r"silence_end: ([\d.]+)", result.stderr)]
+        silences = [(start + end) / 2 for start, end in zip(starts, ends)]
+        return duration, silences
+
+    def _cache_key(self, url: str) -> str | None:
+        if self.transcript_cache is None:
+            return None
+        try:
+            return self._get_video_id(url)
+        except ValueError:
+            return None
+
+    def _cached_transcript(self, url: str) -> tuple[str | None, Transcript | None]:
+        """キャッシュのキーにする動画 ID と、キャッシュ済みの文字起こしを返す"""
+        video_id = self._cache_key(url)
+        if video_id is None:
+            return None, None
+        cached = self.transcript_cache.get(video_id)
+        if cached is not None:
+            logger.info(f"Transcript cache hit: {video_id} ({cached.source})")
+        return video_id, cached
+
+    def _store_transcript(self, video_id: str | None, transcript: Transcript) -> None:
+        if video_id is not None:
+            self.transcript_cache.set(video_id, transcript)
+
+    def transcribe(self, url: str) -> Transcript:
+        """字幕があればそれを、なければ Whisper で文字起こしする。結果は動画 ID ごとにキャッシュする"""
+        video_id, cached = self._cached_transcript(url)
+        if cached is not None:
+            return cached
+        try:
+            logger.info("Try to transcribe with YouTubeTranscriptAPI.")
+            transcript = self.transcribe_with_youtube_transcript_api(url)
+        except Exception:
+            logger.info("Failed to transcribe with YouTubeTranscriptAPI. Use Whisper.")
+            transcript = self.transcribe_with_whisper(url)
+        self._store_transcript(video_id, transcript)
+        return transcript
+
+    async def atranscribe(self, url: str) -> Transcript:
+        video_id, cached = self._cached_transcript(url)
+        if cached is not None:
+            return cached
         try:
             logger.info("Try to transcribe with YouTubeTranscriptAPI.")
-            content = self.transcribe_with_youtube_transcript_api(url)
+            transcript = await asyncio.to_thread(
+                self.transcribe_with_youtube_transcript_api, url
+            )
         except Exception:
             logger.info("Failed to transcribe with YouTubeTranscriptAPI. Use Whisper.")
-            content = self.transcribe_with_whisper(url)
-        return self.text_summrizer.summarize(content)
+            transcript = await self.atranscribe_with_whisper(url)
+        self._store_transcript(video_id, transcript)
+        return transcript
+
+    def summarize(self, url: str) -> str:
+        return self.text_summrizer.summarize(self.transcribe(url).text)
+
+    async def asummarize(self, url: str) -> str:
+        transcript = await self.atranscribe(url)
+        return await self.text_summrizer.asummarize(transcript.text)
+
+    async def astream(self, url: str) -> AsyncIterator[str]:
+        transcript = await self.atranscribe(url)
+        async for summary in self.text_summrizer.astream(transcript.text):
+            yield summary
 
 
 class ArXivSummarizer(BaseSummarizer):
+    """arXiv の論文を要約する
+
+    ar5iv の HTML をセクションごとに解析し、アブストラクト・序論・結論を優先して
+    section_budget_tokens に収まる分だけを要約に使う。参考文献や付録は読まない。
+    解析した論文は paper_cache に ID と版ごとに保存する。解析できなかった場合は、
+    ページ全体のテキストを要約する。
+    """
+
     def __init__(
-        self, text_summarizer: TextSummarizer, http_client: HTTPClient
+        self,
+        text_summarizer: TextSummarizer,
+        http_client: HTTPClient,
+        paper_cache: PaperCache | None = None,
+        section_budget_tokens: int = 20000,
     ) -> None:
         self.text_summrizer = text_summarizer
         self.http_client = http_client
+        self.paper_cache = paper_cache
+        self.section_budget_tokens = section_budget_tokens
 
     def _modify_arxiv_url(self, url: str) -> str:
         """
@@ -283,24 +891,256 @@ class ArXivSummarizer(BaseSummarizer):
            https://arxiv.org/abs/1910.06709
         -> https://ar5iv.org/abs/1910.06709
         """
-        replaced_url = url.replace("arxiv.org", "ar5iv.org")
-        # https://r.jina.ai/ を先頭につける
-        return f"https://r.jina.ai/{replaced_url}"
+        canonical = normalize_url(url)
+        if canonical.method == MethodType.ARXIV:
+            # abs / pdf / 版付きのどの形式でも、同じ論文の HTML ページを見る
+            version = canonical.version or ""
+            replaced_url = f"https://ar5iv.org/abs/{canonical.resource_id}{version}"
+        else:
+            replaced_url = url.replace("arxiv.org", "ar5iv.org")
+        return replaced_url
+
+    def load_paper(self, url: str) -> ArXivPaper | None:
+        """論文を取得して解析する。arXiv の論文でないか、セクションが取れなければ None"""
+        canonical = normalize_url(url)
+        if canonical.method != MethodType.ARXIV:
+            return None
+        arxiv_id, version = canonical.resource_id, canonical.version
+        if self.paper_cache is not None and (
+            cached := self.paper_cache.get(arxiv_id, version)
+        ):
+            logger.info(f"Paper cache hit: {arxiv_id}{version or ''}")
+            return cached
+
+        html = self.http_client.get_html(self._modify_arxiv_url(url))
+        paper = parse_ar5iv(html, arxiv_id, version)
+        if not paper.sections:
+            logger.info(f"No sections found in ar5iv: {arxiv_id}{version or ''}")
+            return None
+        if self.paper_cache is not None:
+            self.paper_cache.set(paper)
+        return paper
+
+    def _get_text(self, url: str) -> str:
+        try:
+            paper = self.load_paper(url)
+        except Exception as e:
+            logger.info(f"Failed to parse ar5iv: {url} ({e})")
+            paper = None
+        if paper is None:
+            return self.http_client.get_content(self._modify_arxiv_url(url))
+        return paper_to_text(paper, self.section_budget_tokens)
 
     def summarize(self, url: str) -> str:
-        modified_url = self._modify_arxiv_url(url)
-        body_text = self.http_client.get(modified_url)
-        return self.text_summrizer.summarize(body_text)
+        return self.text_summrizer.summarize(self._get_text(url))
+
+    async def asummarize(self, url: str) -> str:
+        body_text = await asyncio.to_thread(self._get_text, url)
+        return await self.text_summrizer.asummarize(body_text)
+
+    async def astream(self, url: str) -> AsyncIterator[str]:
+        body_text = await asyncio.to_thread(self._get_text, url)
+        async for summary in self.text_summrizer.astream(body_text):
+            yield summary
+
+
+class DocumentSummarizer(BaseSummarizer):
+    """PDF やスライドなどのファイルを、ページごとにテキストを取り出して要約する
+
+    source には URL (Discord の添付ファイルなど) を渡す。allow_local_files が True なら
+    ローカルのパスも読む。Discord の投稿からローカルのファイルを読ませないように、既定では False にする。
+    ファイルはメモリ上で読み、TextSummarizer の入力の上限に達したら残りのページは読まない。
+    """
+
+    def __init__(
+        self,
+        text_summarizer: TextSummarizer,
+        http_client: HTTPClient,
+        extractor: DocumentExtractor,
+        max_bytes: int = MAX_DOCUMENT_BYTES,
+        allow_local_files: bool = False,
+    ) -> None:
+        self.text_summrizer = text_summarizer
+        self.http_client = http_client
+        self.extractor = extractor
+        self.max_bytes = max_bytes
+        self.allow_local_files = allow_local_files
+
+    def _read(self, source: str) -> bytes:
+        if self.allow_local_files and os.path.isfile(source):
+            with open(source, "rb") as f:
+                return f.read()
+        return self.http_client.get_bytes(source, max_bytes=self.max_bytes)
+
+    def _get_text(self, source: str) -> str:
+        text = self.extractor.extract(
+            self._read(source), max_tokens=self.text_summrizer.input_budget_tokens
+        )
+        if not text:
+            raise ValueError(f"No text found in the file: {source}")
+        logger.info(f"Extracted {count_tokens(text)} tokens from {source}")
+        return text
+
+    def summarize(self, source: str) -> str:
+        return self.text_summrizer.summarize(self._get_text(source))
+
+    async def asummarize(self, source: str) -> str:
+        body_text = await asyncio.to_thread(self._get_text, source)
+        return await self.text_summrizer.asummarize(body_text)
+
+    async def astream(self, source: str) -> AsyncIterator[str]:
+        body_text = await asyncio.to_thread(self._get_text, source)
+        async for summary in self.text_summrizer.astream(body_text):
+            yield summary
+
+
+class PDFSummarizer(DocumentSummarizer):
+    def __init__(
+        self,
+        text_summarizer: TextSummarizer,
+        http_client: HTTPClient,
+        max_workers: int = 4,
+        **kwargs,
+    ) -> None:
+        super().__init__(
+            text_summarizer, http_client, PDFExtractor(max_workers), **kwargs
+        )
+
+
+class PPTXSummarizer(DocumentSummarizer):
+    def __init__(
+        self,
+        text_summarizer: TextSummarizer,
+        http_client: HTTPClient,
+        max_workers: int = 4,
+        **kwargs,
+    ) -> None:
+        super().__init__(
+            text_summarizer, http_client, PPTXExtractor(max_workers), **kwargs
+        )
+
+
+class CachedSummarizer(BaseSummarizer):
+    """SummaryCache に結果があればそれを返し、なければ中の Summarizer で要約して保存する"""
+
+    def __init__(
+        self,
+        summarizer: BaseSummarizer,
+        cache: SummaryCache,
+        text_summarizer: TextSummarizer,
+    ) -> None:
+        self.summarizer = summarizer
+        self.cache = cache
+        # プロンプトやモデルが変わったら別のキーになるようにする
+        self.prompt = PROMPT_WRITER_TEXT_SUMMARIER
+        self.model_name = str(
+            getattr(
+                text_summarizer.model, "model", type(text_summarizer.model).__name__
+            )
+        )
+
+    def _key(self, url: str) -> str:
+        return self.cache.make_key(url, self.prompt, self.model_name)
+
+    def summarize(self, url: str) -> str:
+        key = self._key(url)
+        if (cached := self._get(key, url)) is not None:
+            return cached
+        summary = self.summarizer.summarize(url)
+        self.cache.set(key, url, summary)
+        return summary
+
+    async def asummarize(self, url: str) -> str:
+        key = self._key(url)
+        if (cached := self._get(key, url)) is not None:
+            return cached
+        summary = await self.summarizer.asummarize(url)
+        self.cache.set(key, url, summary)
+        return summary
+
+    async def astream(self, url: str) -> AsyncIterator[str]:
+        key = self._key(url)
+        if (cached := self._get(key, url)) is not None:
+            yield cached
+            return
+        summary = None
+        async for summary in self.summarizer.astream(url):
+            yield summary
+        if summary is not None:
+            self.cache.set(key, url, summary)
+
+    def _get(self, key: str, url: str) -> str | None:
+        cached = self.cache.get(key)
+        status = "hit" if cached is not None else "miss"
+        logger.info(f"Summary cache {status}: {url} ({self.cache.stats()})")
+        return cached
 
 
 class SummarizerBuilder:
-    def build_summarizer(self, method: str) -> BaseSummarizer | None:
-        text_summarizer = TextSummarizer()
-        http_client = HTTPClient()
-        summerizer_map = {
-            MethodType.WEB.value: WebSummarizer(text_summarizer, http_client),
-            MethodType.YOUTUBE.value: YouTubeSummarizer(text_summarizer),
-            MethodType.ARXIV.value: ArXivSummarizer(text_summarizer, http_client),
-            MethodType.NONE.value: None,
+    """MethodType ごとの Summarizer を保持するレジストリ
+
+    Summarizer と、それが使う TextSummarizer / HTTPClient は最初に必要になったときに一度だけ作り、
+    以降は並行するジョブの間で共有する。summary_cache を渡すと、各 Summarizer の前に
+    CachedSummarizer を挟む。
+    """
+
+    def __init__(
+        self,
+        text_summarizer: TextSummarizer | None = None,
+        http_client: HTTPClient | None = None,
+        summary_cache: SummaryCache | None = None,
+        transcript_cache: TranscriptCache | None = None,
+        paper_cache: PaperCache | None = None,
+    ) -> None:
+        self._text_summarizer = text_summarizer
+        self._http_client = http_client
+        self.summary_cache = summary_cache
+        self.transcript_cache = transcript_cache
+        self.paper_cache = paper_cache
+        self._summarizers: dict[MethodType, BaseSummarizer] = {}
+        self._factories = {
+            MethodType.WEB: lambda: WebSummarizer(
+                self.text_summarizer, self.http_client
+            ),
+            MethodType.YOUTUBE: lambda: YouTubeSummarizer(
+                self.text_summarizer, transcript_cache=self.transcript_cache
+            ),
+            MethodType.ARXIV: lambda: ArXivSummarizer(
+                self.text_summarizer, self.http_client, paper_cache=self.paper_cache
+            ),
+            MethodType.PDF: lambda: PDFSummarizer(
+                self.text_summarizer, self.http_client
+            ),
+            MethodType.PPTX: lambda: PPTXSummarizer(
+                self.text_summarizer, self.http_client
+            ),
         }
-        return summerizer_map[method]
+        self._lock = threading.RLock()
+
+    @property
+    def text_summarizer(self) -> TextSummarizer:
+        with self._lock:
+            if self._text_summarizer is None:
+                self._text_summarizer = TextSummarizer()
+            return self._text_summarizer
+
+    @property
+    def http_client(self) -> HTTPClient:
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = HTTPClient()
+            return self._http_client
+
+    def build_summarizer(self, method: MethodType) -> BaseSummarizer | None:
+        if method == MethodType.NONE:
+            return None
+        with self._lock:
+            if method not in self._summarizers:
+                logger.info(f"Build summarizer for {method}")
+                summarizer = self._factories[method]()
+                if self.summary_cache is not None:
+                    summarizer = CachedSummarizer(
+                        summarizer, self.summary_cache, self.text_summarizer
+                    )
+                self._summarizers[method] = summarizer
+            return self._summarizers[method]
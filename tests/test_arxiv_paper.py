@@ -0,0 +1,93 @@
+import os
+
+from arxiv_paper import paper_to_text, parse_ar5iv
+from cache import ArXivPaper, PaperCache, PaperSection
+from text_processing import count_tokens
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), "fixtures", "html", "ar5iv_paper.html"
+)
+
+
+def _parse() -> ArXivPaper:
+    with open(FIXTURE, encoding="utf-8") as f:
+        return parse_ar5iv(f.read(), "2202.12493", "v2")
+
+
+def test_parse_ar5iv():
+    """タイトル・アブストラクト・セクションを取り出し、数式は LaTeX の表記にすること"""
+    paper = _parse()
+
+    assert paper.title == "Search for neutrino bursts with Super-Kamiokande"
+    assert paper.abstract.startswith("We search for bursts of neutrino events")
+    assert "N_{\\rm cl}" in paper.abstract
+    assert [(section.title, section.kind) for section in paper.sections] == [
+        ("1 Introduction", "section"),
+        ("2 Detector", "section"),
+        ("3 Conclusion", "section"),
+        ("Acknowledgments", "section"),
+        ("Appendix A Systematic uncertainties", "appendix"),
+        ("References", "bibliography"),
+    ]
+    assert "### 2.1 Event selection" in paper.sections[1].text
+
+
+def test_paper_to_text_skips_bibliography_and_appendix():
+    """参考文献・謝辞・付録は入れず、論文の順番で並べること"""
+    text = paper_to_text(_parse(), max_tokens=10000)
+
+    assert text.startswith(
+        "# Search for neutrino bursts with Super-Kamiokande\n\n## Abstract"
+    )
+    assert text.index("## 1 Introduction") < text.index("## 2 Detector")
+    assert text.index("## 2 Detector") < text.index("## 3 Conclusion")
+    for excluded in ("Teresa Montaruli", "Systematic uncertainties", "Hirata"):
+        assert excluded not in text
+
+
+def test_paper_to_text_prioritizes_introduction_and_conclusion():
+    """予算が足りなければ、序論と結論を優先して他の本文を削ること"""
+    body = "This sentence is filler. " * 400
+    paper = ArXivPaper(
+        "2202.12493",
+        None,
+        "Title",
+        "Abstract text.",
+        [
+            PaperSection("1 Introduction", "Intro text."),
+            PaperSection("2 Method", body),
+            PaperSection("3 Results", body),
+            PaperSection("4 Conclusion", "Conclusion text."),
+        ],
+    )
+
+    text = paper_to_text(paper, max_tokens=1500)
+
+    assert "Intro text." in text and "Conclusion text." in text
+    # 優先度が同じなら前のセクションから予算を使い、入りきらなかったものは途中で切るか省く
+    assert "## 2 Method\nThis sentence is filler." in text
+    assert "## 3 Results" not in text
+    assert count_tokens(text) <= 1500
+
+
+def test_paper_cache():
+    """ID と版ごとに保存し、同じ内容を取り出せること"""
+    cache = PaperCache(path=":memory:")
+    paper = _parse()
+
+    cache.set(paper)
+
+    assert cache.get("2202.12493", "v2") == paper
+    assert cache.get("2202.12493", None) is None
+
+
+def test_paper_cache_expires_unversioned_paper():
+    """版を指定しない論文は期限を過ぎたら読まず、版を指定した論文は期限なく残すこと"""
+    cache = PaperCache(path=":memory:", latest_ttl_seconds=-1)
+    paper = _parse()
+
+    cache.set(paper)
+    cache.set(paper._replace(version=None))
+
+    assert cache.get("2202.12493", None) is None
+    assert cache.get("2202.12493", "v2") == paper
@@ -0,0 +1,125 @@
+import pytest
+
+from cache import (
+    ContentCache,
+    SummaryCache,
+    Transcript,
+    TranscriptCache,
+    normalize_language,
+)
+
+
+@pytest.mark.parametrize(
+    "url, same_url",
+    [
+        (
+            "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",
+            "https://Qiita.com/kenji-kondo/items/91ae417ad858ec4652e7/#section",
+        ),
+        (
+            "https://example.com/a?b=2&a=1",
+            "https://example.com/a?a=1&b=2&utm_source=twitter",
+        ),
+    ],
+)
+def test_make_key_normalizes_url(url, same_url):
+    """表記ゆれのある URL は同じキーになること"""
+    assert SummaryCache.make_key(url, "prompt", "model") == SummaryCache.make_key(
+        same_url, "prompt", "model"
+    )
+
+
+def test_make_key_depends_on_prompt_and_model():
+    """プロンプトやモデルが変わったら別のキーになること"""
+    url = "https://example.com/a"
+    key = SummaryCache.make_key(url, "prompt", "model")
+    assert key != SummaryCache.make_key(url, "prompt v2", "model")
+    assert key != SummaryCache.make_key(url, "prompt", "another-model")
+
+
+def test_hit_and_miss():
+    """保存したものは取り出せて、ヒット数とミス数が数えられること"""
+    cache = SummaryCache(path=":memory:")
+    assert cache.get("key") is None
+    cache.set("key", "https://example.com", "要約")
+    assert cache.get("key") == "要約"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl():
+    """有効期限を過ぎたものは返さないこと"""
+    cache = SummaryCache(path=":memory:", ttl_seconds=-1)
+    cache.set("key", "https://example.com", "要約")
+    assert cache.get("key") is None
+
+
+def test_lru_eviction():
+    """上限を超えたら最も長く使われていないものから捨てること"""
+    cache = SummaryCache(path=":memory:", max_entries=2)
+    cache.set("a", "https://example.com/a", "A")
+    cache.set("b", "https://example.com/b", "B")
+    cache.get("a")
+    cache.set("c", "https://example.com/c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+
+def test_cache_persists_to_file(tmp_path):
+    """保存先のディレクトリがなければ作り、開き直しても保存したものを読めること"""
+    path = str(tmp_path / "nested" / "summary.sqlite3")
+    SummaryCache(path=path).set("key", "https://example.com", "要約")
+    assert SummaryCache(path=path).get("key") == "要約"
+
+
+def test_content_cache_size_bound():
+    """合計サイズが上限を超えたら最も長く使われていないものから捨てること"""
+    cache = ContentCache(path=":memory:", max_bytes=25)
+    cache.set("https://example.com/a", "a" * 5, "a" * 5)
+    cache.set("https://example.com/b", "b" * 5, "b" * 5)
+    cache.get("https://example.com/a")
+    cache.set("https://example.com/c", "c" * 5, "c" * 5)
+    assert cache.get("https://example.com/b") is None
+    assert cache.get("https://example.com/a").text == "aaaaa"
+    assert cache.get("https://example.com/c").text == "ccccc"
+
+
+def test_transcript_cache():
+    """文字起こしを、取得元と言語と一緒に保存できること"""
+    cache = TranscriptCache(path=":memory:", max_entries=1)
+    assert cache.get("video") is None
+    cache.set("video", Transcript("文字起こし", "whisper", "ja"))
+    assert cache.get("video") == Transcript("文字起こし", "whisper", "ja")
+    cache.set("another", Transcript("transcript", "captions", "en"))
+    assert cache.get("video") is None
+
+
+@pytest.mark.parametrize(
+    "language, expected",
+    [
+        ("ja", "ja"),
+        ("japanese", "ja"),
+        ("Japanese", "ja"),
+        ("en-US", "en"),
+        ("zh-Hans", "zh"),
+        ("haitian creole", "ht"),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_normalize_language(language, expected):
+    """字幕の言語コードも Whisper の言語名も ISO 639-1 のコードにそろえること"""
+    assert normalize_language(language) == expected
+
+
+def test_transcript_cache_normalizes_language():
+    """言語名で渡されても、言語名のまま保存されていた古い行も、言語コードにして返すこと"""
+    cache = TranscriptCache(path=":memory:")
+    cache.set("whisper", Transcript("文字起こし", "whisper", "japanese"))
+    with cache._conn:
+        cache._conn.execute(
+            "INSERT INTO transcripts VALUES ('legacy', '文字起こし', 'whisper', 'english', 0, 0)"
+        )
+
+    assert cache.get("whisper").language == "ja"
+    assert cache.get("legacy").language == "en"
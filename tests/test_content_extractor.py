@@ -0,0 +1,114 @@
+import glob
+import os
+
+import pytest
+
+from content_extractor import (
+    MainContentExtractor,
+    PlainTextExtractor,
+    benchmark,
+    build_extractor,
+)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+
+
+def _read(name: str) -> str:
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize(
+    "name, expected_included, expected_excluded",
+    [
+        (
+            "blog_article.html",
+            [
+                "# 回転対称性と保存則",
+                "## 角運動量の保存",
+                "- 中心力ポテンシャル (重力やクーロン力) は回転対称性を持つ",
+                "dL/dt = r × F = 0",
+            ],
+            ["ホーム", "Cookie", "人気の記事", "関連記事", "コメント", "dataLayer"],
+        ),
+        (
+            "docs_page.html",
+            ["# Connection pooling", "max_connections | 100", "client.get("],
+            ["Quickstart", "API Reference", "newsletter", "Copyright"],
+        ),
+    ],
+)
+def test_main_content_extractor(name, expected_included, expected_excluded):
+    """本文は残し、メニューや広告、スクリプトは捨てること"""
+    text = MainContentExtractor().extract(_read(name))
+
+    for expected in expected_included:
+        assert expected in text
+    for excluded in expected_excluded:
+        assert excluded not in text
+
+
+def test_main_content_is_smaller_than_plain_text():
+    """ページ全体のテキストより短くなること"""
+    html = _read("blog_article.html")
+
+    assert len(MainContentExtractor().extract(html)) < len(
+        PlainTextExtractor().extract(html)
+    )
+
+
+def test_main_content_extractor_without_main_element():
+    """article などがなければ、段落が最も多い要素を本文とすること"""
+    body = "".join(f"<p>{'本文の段落です。' * 10}</p>" for _ in range(3))
+    html = (
+        "<html><head><title>タイトル</title></head><body>"
+        "<div class='menu'><p><a href='/'>ホーム</a></p></div>"
+        f"<div>{body}</div></body></html>"
+    )
+
+    text = MainContentExtractor().extract(html)
+
+    assert text.startswith("# タイトル\n本文の段落です。")
+    assert "ホーム" not in text
+    assert MainContentExtractor().extract("") == ""
+
+
+@pytest.mark.parametrize(
+    "open_wrapper, close_wrapper",
+    [
+        ("<body class='has-sidebar'>", "</body>"),
+        ("<body><div class='post share-enabled'>", "</div></body>"),
+        ("<body><form id='aspnetForm' method='post'>", "</form></body>"),
+        ("<body><div class='layout-with-sidebar'><main>", "</main></div></body>"),
+    ],
+)
+def test_main_content_extractor_keeps_wrappers_of_content(open_wrapper, close_wrapper):
+    """class やタグが定型文らしくても、本文を包んでいる要素は捨てないこと"""
+    body = "".join(f"<p>{'本文の段落です。' * 10}</p>" for _ in range(3))
+    html = (
+        "<html><head><title>T</title></head>"
+        f"{open_wrapper}<div class='sidebar'><p>人気の記事</p></div>"
+        f"<div>{body}</div>{close_wrapper}</html>"
+    )
+
+    text = MainContentExtractor().extract(html)
+
+    assert text.startswith("# T\n本文の段落です。")
+    assert text.count("本文の段落です。") == 30
+    assert "人気の記事" not in text
+
+
+def test_build_extractor():
+    assert isinstance(build_extractor("plain"), PlainTextExtractor)
+    with pytest.raises(ValueError):
+        build_extractor("unknown")
+
+
+def test_benchmark():
+    """保存した HTML に対して extractor ごとの処理時間と出力量を測れること"""
+    paths = sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+
+    results = benchmark(paths, repeat=1)
+
+    assert len(results) == len(paths) * 2
+    assert all(result.seconds > 0 and result.chars > 0 for result in results)
@@ -0,0 +1,127 @@
+import io
+import threading
+
+import pytest
+from pptx import Presentation
+from pptx.util import Inches
+
+from document_extractor import DocumentExtractor, PDFExtractor, PPTXExtractor
+
+
+def make_pptx(slides: int = 3) -> bytes:
+    """タイトル・本文・表・ノートを持つスライドをメモリ上で作る"""
+    presentation = Presentation()
+    for i in range(1, slides + 1):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f"Slide title {i}"
+        slide.placeholders[1].text = f"First point {i}\nSecond point {i}"
+        table = slide.shapes.add_table(
+            2, 2, Inches(1), Inches(5), Inches(4), Inches(1)
+        ).table
+        table.cell(0, 0).text = "Metric"
+        table.cell(0, 1).text = "Value"
+        table.cell(1, 0).text = "Latency"
+        table.cell(1, 1).text = f"{i * 10} ms"
+        slide.notes_slide.notes_text_frame.text = f"Speaker note {i}"
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    return buffer.getvalue()
+
+
+def make_pdf(pages: list[str]) -> bytes:
+    """1 ページに 1 行ずつテキストを書いた PDF を組み立てる"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids ["
+        + b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(len(pages)))
+        + b"] /Count %d >>" % len(pages),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        stream = b"BT /F1 12 Tf 72 720 Td (%s) Tj ET" % text.encode("latin-1")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i)
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    body += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    body += b"trailer\n<< /Size %d /Root 1 0 R >>\n" % (len(objects) + 1)
+    return body + b"startxref\n%d\n%%%%EOF\n" % xref
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_pptx_extractor(max_workers):
+    """スライドの順番どおりに、本文・表・ノートを取り出すこと"""
+    text = PPTXExtractor(max_workers=max_workers).extract(make_pptx(12))
+
+    assert text.startswith(
+        "## Slide 1\nSlide title 1\nFirst point 1\nSecond point 1\n"
+        "Metric | Value\nLatency | 10 ms\nNotes: Speaker note 1"
+    )
+    positions = [text.index(f"## Slide {i}\n") for i in range(1, 13)]
+    assert positions == sorted(positions)
+
+
+def test_extract_stops_at_max_tokens():
+    """max_tokens に達したら残りのページは読まないこと"""
+    text = PPTXExtractor().extract(make_pptx(20), max_tokens=50)
+
+    assert "## Slide 1\n" in text
+    assert "## Slide 20\n" not in text
+
+
+class FakeExtractor(DocumentExtractor):
+    """ページごとに呼ばれた回数と、同時に開いたドキュメントの数を記録する"""
+
+    def __init__(self, pages: int, max_workers: int) -> None:
+        super().__init__(max_workers)
+        self.pages = pages
+        self.opened = 0
+        self.extracted: list[int] = []
+        self._lock = threading.Lock()
+
+    def open(self, data: bytes) -> object:
+        with self._lock:
+            self.opened += 1
+        return object()
+
+    def page_count(self, document: object) -> int:
+        return self.pages
+
+    def page_text(self, document: object, index: int) -> str:
+        with self._lock:
+            self.extracted.append(index)
+        return f"text {index}"
+
+
+def test_iter_pages_reads_ahead_only_a_bounded_window():
+    """並行して読むのは先読みの範囲だけで、途中でやめたら残りのページは読まないこと"""
+    extractor = FakeExtractor(pages=1000, max_workers=4)
+    pages = extractor.iter_pages(b"")
+
+    assert [next(pages) for _ in range(3)] == ["text 0", "text 1", "text 2"]
+    pages.close()
+
+    assert len(extractor.extracted) <= 3 + extractor.max_workers * 2
+    assert extractor.opened <= extractor.max_workers + 1
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_pdf_extractor(max_workers):
+    """PDF のページの順番どおりに、ページごとのテキストを取り出すこと"""
+    data = make_pdf([f"Page body {i}" for i in range(1, 9)])
+
+    text = PDFExtractor(max_workers=max_workers).extract(data)
+
+    assert text.startswith("## Page 1\nPage body 1")
+    positions = [text.index(f"## Page {i}\nPage body {i}") for i in range(1, 9)]
+    assert positions == sorted(positions)
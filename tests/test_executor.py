@@ -1,8 +1,15 @@
 """CAUTION: お金がしっかりかかるので注意。テストケースは最小限に。"""
 
+import asyncio
+from types import SimpleNamespace
+
 import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
 
-from executor import ExecutorBuilder
+from executor import Executor, ExecutorBuilder
+from method_type import MethodType
+from router import Dispatcher, URLExtractor
+from summarizer import BaseSummarizer
 
 
 @pytest.mark.parametrize(
@@ -23,3 +30,160 @@ def test_Excecutor(comment):
     """正常終了すること。あるいは出力を確かめたいときに使う。"""
     executor = ExecutorBuilder.build()
     print(executor.execute(comment))
+
+
+class FakeURLExtractor:
+    def extract(self, comment: str) -> list[str]:
+        return [word for word in comment.split() if word.startswith("http")]
+
+    async def aextract(self, comment: str) -> list[str]:
+        return self.extract(comment)
+
+
+class FakeDispatcher:
+    def dispatch(self, url: str) -> MethodType:
+        return MethodType.WEB
+
+    async def adispatch(self, url: str) -> MethodType:
+        return self.dispatch(url)
+
+
+class StreamingSummarizer(BaseSummarizer):
+    """途中経過を少しずつ返し、呼ばれた回数と同時に動いていた数の最大を数える Summarizer"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def summarize(self, url: str) -> str:
+        # 同期版の Executor からはスレッドプールで呼ばれるので、呼ぶたびにイベントループを作って非同期版に任せる
+        return asyncio.run(self.asummarize(url))
+
+    async def asummarize(self, url: str) -> str:
+        return [summary async for summary in self.astream(url)][-1]
+
+    async def astream(self, url: str):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            for i in range(1, 4):
+                await asyncio.sleep(0.01)
+                yield f"summary of {url} " + "." * i
+        finally:
+            self.in_flight -= 1
+
+
+def _build_fake_executor() -> tuple[Executor, StreamingSummarizer]:
+    summarizer = StreamingSummarizer()
+    builder = SimpleNamespace(build_summarizer=lambda method: summarizer)
+    return Executor(builder, FakeURLExtractor(), FakeDispatcher()), summarizer
+
+
+def test_Executor_astream_shares_in_flight_job():
+    """同じ URL の要約が実行中なら、後から来たものは実行せずに結果だけを受け取ること"""
+    executor, summarizer = _build_fake_executor()
+
+    async def collect(comment: str) -> list[str]:
+        streams = await executor.astreams(comment)
+        assert len(streams) <= 1
+        return [summary for stream in streams async for summary in stream]
+
+    async def main():
+        return await asyncio.gather(
+            collect("https://example.com/a?utm_source=x"),
+            collect("https://example.com/a"),
+            collect("こんにちは"),
+        )
+
+    leader, follower, no_url = asyncio.run(main())
+
+    assert summarizer.calls == 1
+    assert leader == [""] + [
+        "summary of https://example.com/a " + "." * i for i in range(1, 4)
+    ]
+    assert follower == ["", leader[-1]]
+    assert no_url == []
+
+
+def test_Executor_summarizes_urls_concurrently():
+    """複数の URL は並行に要約し、URL ごとの要約をつなげて返すこと"""
+    executor, summarizer = _build_fake_executor()
+    executor.max_concurrency_per_message = 2
+    comment = " ".join(f"https://example.com/{i}" for i in range(4))
+
+    result = asyncio.run(executor.aexecute(comment))
+
+    assert summarizer.calls == 4
+    # 同時に動くのは max_concurrency_per_message の 2 つまで
+    assert summarizer.peak_in_flight == 2
+    sections = result.split("\n\n")
+    assert [section.split("\n")[0] for section in sections] == [
+        f"https://example.com/{i}" for i in range(4)
+    ]
+
+
+def test_Executor_execute_matches_aexecute():
+    """同期版でも非同期版と同じ要約を返すこと"""
+    executor, summarizer = _build_fake_executor()
+    comment = "https://example.com/a https://example.com/b"
+
+    assert executor.execute(comment) == asyncio.run(executor.aexecute(comment))
+    assert summarizer.calls == 4
+
+
+def test_Executor_astreams_returns_stream_per_url():
+    """URL ごとにストリームを返すこと"""
+    executor, _ = _build_fake_executor()
+
+    async def collect(stream) -> list[str]:
+        return [summary async for summary in stream]
+
+    async def main():
+        streams = await executor.astreams("https://example.com/a https://example.com/b")
+        return await asyncio.gather(*(collect(stream) for stream in streams))
+
+    results = asyncio.run(main())
+
+    assert [result[-1] for result in results] == [
+        "summary of https://example.com/a ...",
+        "summary of https://example.com/b ...",
+    ]
+
+
+class EchoSummarizer(BaseSummarizer):
+    """URL をそのまま要約として返す。"fail" を含む URL では失敗する"""
+
+    def summarize(self, url: str) -> str:
+        if "fail" in url:
+            raise ValueError(f"Cannot summarize {url}")
+        return f"summary of {url}"
+
+    async def asummarize(self, url: str) -> str:
+        return self.summarize(url)
+
+
+@pytest.mark.parametrize(
+    "comment, answer",
+    [
+        # 手元で抽出できるコメント。失敗した URL はエラーの文言に置き換わる
+        ("https://example.com/a と https://example.com/fail を見て", "NONE"),
+        # 判断できないので LLM が URL を抽出するコメント
+        ("example.com/b を見て", "https://example.com/b"),
+        # URL がないコメント
+        ("URL はないコメント", "NONE"),
+    ],
+)
+def test_Executor_aexecute_agrees_with_execute(comment, answer):
+    """aexecute は execute と同じ結果を返すこと"""
+
+    def build() -> Executor:
+        builder = SimpleNamespace(build_summarizer=lambda method: EchoSummarizer())
+        return Executor(
+            builder,
+            URLExtractor(model=FakeListChatModel(responses=[answer])),
+            Dispatcher(model=FakeListChatModel(responses=["Web"])),
+        )
+
+    assert asyncio.run(build().aexecute(comment)) == build().execute(comment)
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+import time
+from collections.abc import Callable
+
+import httpx
+import pytest
+
+from http_transport import HTTPTransport
+
+
+def make_transport(handler, **kwargs) -> HTTPTransport:
+    """handler でレスポンスを返す HTTPTransport。バックオフは短くしておく"""
+
+    async def async_handler(request: httpx.Request) -> httpx.Response:
+        return handler(request)
+
+    kwargs.setdefault("backoff_base", 0.001)
+    return HTTPTransport(
+        transport=httpx.MockTransport(handler),
+        async_transport=httpx.MockTransport(async_handler),
+        **kwargs,
+    )
+
+
+def flaky(failures: list) -> tuple[list[str], Callable]:
+    """failures の順にステータスコードか例外を返し、その後は 200 を返す handler"""
+    requested: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        if len(requested) <= len(failures):
+            failure = failures[len(requested) - 1]
+            if isinstance(failure, Exception):
+                raise failure
+            return httpx.Response(failure, headers={"Retry-After": "0"})
+        return httpx.Response(200, text="<p>本文</p>")
+
+    return requested, handler
+
+
+@pytest.mark.parametrize(
+    "failures",
+    [
+        [503],
+        [429, 502],
+        [httpx.ConnectError("refused")],
+        [httpx.ReadTimeout("timed out")],
+    ],
+)
+def test_get_retries_transient_errors(failures):
+    """一時的なエラーはリトライして、成功したレスポンスを返すこと"""
+    requested, handler = flaky(failures)
+    transport = make_transport(handler)
+
+    response = transport.get("https://example.com")
+
+    assert response.status_code == 200
+    assert response.text == "<p>本文</p>"
+    assert len(requested) == len(failures) + 1
+
+
+def test_get_gives_up_after_max_retries():
+    """max_retries 回やり直しても失敗したら、最後のレスポンスか例外を返すこと"""
+    requested, handler = flaky([503] * 10)
+    assert (
+        make_transport(handler, max_retries=2).get("https://a.com").status_code == 503
+    )
+    assert len(requested) == 3
+
+    requested, handler = flaky([httpx.ConnectError("refused")] * 10)
+    with pytest.raises(httpx.ConnectError):
+        make_transport(handler, max_retries=1).get("https://a.com")
+    assert len(requested) == 2
+
+
+def test_get_does_not_retry_client_errors():
+    requested, handler = flaky([404])
+    assert make_transport(handler).get("https://example.com").status_code == 404
+    assert len(requested) == 1
+
+
+def test_get_stops_at_deadline():
+    """少しずつ送ってくるサーバーでも、deadline を過ぎたら諦めること"""
+
+    def trickle():
+        for _ in range(100):
+            time.sleep(0.01)
+            yield b"x"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=trickle())
+
+    transport = make_transport(handler, deadline=0.1, max_retries=5)
+
+    start = time.monotonic()
+    with pytest.raises(httpx.ReadTimeout):
+        transport.get("https://example.com")
+    assert time.monotonic() - start < 0.5
+
+
+def test_get_limits_body_size():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=b"x" * 1000)
+
+    with pytest.raises(ValueError, match="too large"):
+        make_transport(handler).get("https://example.com", max_bytes=100)
+
+
+def test_get_uses_cloudscraper_only_for_challenged_hosts():
+    """Cloudflare のチャレンジで止められたホストだけ、以降も cloudscraper で取得すること"""
+    requested: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        if request.url.host == "protected.example.com":
+            return httpx.Response(
+                403,
+                headers={"Server": "cloudflare"},
+                text="<title>Just a moment...</title>",
+            )
+        return httpx.Response(200, text="direct")
+
+    class FakeScraper:
+        def __init__(self) -> None:
+            self.requested: list[str] = []
+
+        def get(self, url: str, headers=None, timeout=None) -> httpx.Response:
+            self.requested.append(url)
+            return httpx.Response(200, text="scraped")
+
+    transport = make_transport(handler)
+    scraper = FakeScraper()
+    transport._local.scraper = scraper
+
+    assert transport.get("https://protected.example.com/a").text == "scraped"
+    assert transport.get("https://protected.example.com/b").text == "scraped"
+    assert transport.get("https://example.com/c").text == "direct"
+    assert requested == ["https://protected.example.com/a", "https://example.com/c"]
+    assert scraper.requested == [
+        "https://protected.example.com/a",
+        "https://protected.example.com/b",
+    ]
+
+
+def test_aget_retries_and_reuses_client():
+    """非同期でもリトライし、同じイベントループの中ではクライアントを使い回すこと"""
+    requested, handler = flaky([503])
+    transport = make_transport(handler)
+
+    async def run() -> tuple[list[httpx.Response], bool]:
+        client = transport.async_client
+        responses = await asyncio.gather(
+            transport.aget("https://example.com/a"),
+            transport.aget("https://example.com/b"),
+        )
+        return responses, transport.async_client is client
+
+    responses, reused = asyncio.run(run())
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert len(requested) == 3
+    assert reused
+    assert transport.client is transport.client
+
+
+def test_aclose_closes_clients_of_every_loop():
+    """aclose は同期のクライアントと、ループごとの AsyncClient をすべて閉じること"""
+    requested, handler = flaky([])
+    transport = make_transport(handler)
+    transport.get("https://example.com/sync")
+
+    async def open_client() -> httpx.AsyncClient:
+        await transport.aget("https://example.com/async")
+        return transport.async_client
+
+    # 別のスレッドで動き続けているループの AsyncClient
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever)
+    thread.start()
+    other_client = asyncio.run_coroutine_threadsafe(open_client(), other_loop).result()
+
+    async def main():
+        client = await open_client()
+        sync_client = transport.client
+        await transport.aclose()
+        return client, sync_client
+
+    try:
+        client, sync_client = asyncio.run(main())
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join()
+        other_loop.close()
+
+    assert client.is_closed
+    assert other_client.is_closed
+    assert sync_client.is_closed
+    assert not transport._async_clients
+    # 閉じた後に使うと、新しいクライアントを作ること
+    assert asyncio.run(transport.aget("https://example.com/again")).status_code == 200
+    assert len(requested) == 4
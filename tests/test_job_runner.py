@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from job_runner import JobQueueFullError, JobRunner, SingleFlight
+
+
+def test_sync_job_runs_off_the_event_loop():
+    """同期関数はイベントループとは別のスレッドで実行されること"""
+
+    async def main():
+        runner = JobRunner(max_workers=2)
+        loop_thread = threading.get_ident()
+        job_thread = await runner.submit(1, threading.get_ident)
+        runner.shutdown()
+        return loop_thread, job_thread
+
+    loop_thread, job_thread = asyncio.run(main())
+    assert loop_thread != job_thread
+
+
+def test_channel_jobs_keep_order_and_respect_global_cap():
+    """チャンネル内は投稿順に処理され、全体の同時実行数は上限を超えないこと"""
+    finished: list[str] = []
+    peak = 0
+    lock = threading.Lock()
+    active = 0
+
+    def job(name: str) -> str:
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+            finished.append(name)
+        return name
+
+    async def main():
+        runner = JobRunner(max_workers=4, max_concurrency=2)
+        results = await asyncio.gather(
+            runner.submit(1, job, "a1"),
+            runner.submit(1, job, "a2"),
+            runner.submit(2, job, "b1"),
+            runner.submit(3, job, "c1"),
+        )
+        runner.shutdown()
+        return results
+
+    results = asyncio.run(main())
+    assert results == ["a1", "a2", "b1", "c1"]
+    assert finished.index("a1") < finished.index("a2")
+    assert peak <= 2
+
+
+def test_channel_concurrency_lets_later_jobs_pass_a_long_one():
+    """channel_concurrency が 2 以上なら、同じチャンネルの長いジョブの後ろで待たされないこと"""
+    finished: list[str] = []
+
+    async def job(name: str, seconds: float) -> str:
+        await asyncio.sleep(seconds)
+        finished.append(name)
+        return name
+
+    async def main():
+        runner = JobRunner(max_concurrency=2, channel_concurrency=2)
+        results = await asyncio.gather(
+            runner.submit(1, job, "long", 0.2),
+            runner.submit(1, job, "short", 0.01),
+        )
+        runner.shutdown()
+        return results
+
+    assert asyncio.run(main()) == ["long", "short"]
+    assert finished == ["short", "long"]
+
+
+def test_queue_full():
+    """チャンネルのキューが溢れたら JobQueueFullError になること"""
+
+    async def main():
+        runner = JobRunner(max_workers=1, max_queue_size=1)
+        # 1 つ目は実行中、2 つ目はキューで待機中にする
+        first = asyncio.ensure_future(runner.submit(1, time.sleep, 0.05))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(runner.submit(1, time.sleep, 0.05))
+        await asyncio.sleep(0)
+        assert runner.queue_depth(1) == 1
+        with pytest.raises(JobQueueFullError):
+            await runner.submit(1, time.sleep, 0.05)
+        await asyncio.gather(first, second)
+        runner.shutdown()
+
+    asyncio.run(main())
+
+
+def test_job_submitted_as_worker_exits_still_runs():
+    """ワーカーがキューを空にして終わる直前に積まれたジョブも実行されること"""
+
+    async def job(name: str) -> str:
+        return name
+
+    async def main():
+        runner = JobRunner(max_workers=1)
+        # ジョブが実行されずに待ち続けたら、テストを止めずに失敗させる
+        asyncio.get_running_loop().call_later(1, asyncio.current_task().cancel)
+        # 1 つ目の結果を受け取った直後は、ワーカーがループを抜けて終了処理を待っている
+        first = await runner.submit(1, job, "a")
+        second = await runner.submit(1, job, "b")
+        runner.shutdown()
+        return first, second
+
+    assert asyncio.run(main()) == ("a", "b")
+
+
+def test_single_flight_shares_async_result():
+    """同じキーの非同期処理は 1 回だけ実行され、全員が同じ結果を受け取ること"""
+    calls = 0
+
+    async def job(value: str) -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return value
+
+    async def main():
+        single_flight = SingleFlight()
+        results = await asyncio.gather(
+            single_flight.ado("a", job, "first"),
+            single_flight.ado("a", job, "second"),
+            single_flight.ado("b", job, "other"),
+        )
+        return results, single_flight.in_flight()
+
+    results, in_flight = asyncio.run(main())
+    assert results == ["first", "first", "other"]
+    assert calls == 2
+    assert in_flight == 0
+
+
+def test_single_flight_survives_leader_cancellation():
+    """最初の呼び出し元がキャンセルされても、後から来た呼び出し元には結果が届くこと"""
+
+    async def job() -> str:
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        single_flight = SingleFlight()
+        leader = asyncio.create_task(single_flight.ado("a", job))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(single_flight.ado("a", job))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_single_flight_shares_sync_result_and_error():
+    """同期版でも実行中の処理に相乗りし、例外も共有すること"""
+    single_flight = SingleFlight()
+    calls = 0
+    started = threading.Event()
+
+    def job(value: str) -> str:
+        nonlocal calls
+        calls += 1
+        started.set()
+        time.sleep(0.1)
+        if value == "error":
+            raise ValueError(value)
+        return value
+
+    results: list[str] = []
+    leader = threading.Thread(
+        target=lambda: results.append(single_flight.do("a", job, "first"))
+    )
+    leader.start()
+    started.wait()
+    results.append(single_flight.do("a", job, "second"))
+    leader.join()
+    assert results == ["first", "first"]
+    assert calls == 1
+
+    with pytest.raises(ValueError):
+        single_flight.do("a", job, "error")
+    assert single_flight.in_flight() == 0
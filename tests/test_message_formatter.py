@@ -0,0 +1,52 @@
+import pytest
+
+from message_formatter import split_message
+
+LONG_SUMMARY = "# タイトル\n\n" + "\n\n".join(
+    f"## 節{i}\n" + "\n".join(f"- 項目{i}-{j} " + "あ" * 60 for j in range(8))
+    for i in range(6)
+)
+
+
+def test_short_text_is_not_split():
+    """上限以内ならそのまま 1 つのメッセージにすること"""
+    assert split_message("短い要約") == ["短い要約"]
+
+
+@pytest.mark.parametrize("limit", [1000, 2000])
+def test_split_at_headings(limit):
+    """どのメッセージも上限以内で、見出しの境界で区切られ、内容が失われないこと"""
+    messages = split_message(LONG_SUMMARY, limit)
+    assert len(messages) > 1
+    assert all(len(message) <= limit for message in messages)
+    assert all(message.startswith("#") for message in messages[1:])
+    assert "\n".join(messages).replace("\n", "") == LONG_SUMMARY.replace("\n", "")
+
+
+def test_split_at_bullets_when_section_is_too_long():
+    """1 つの節が上限を超える場合は bullet の境界で区切ること"""
+    messages = split_message(LONG_SUMMARY, 500)
+    assert all(len(message) <= 500 for message in messages)
+    assert all(message.startswith(("#", "- ")) for message in messages[1:])
+
+
+def test_split_inside_code_fence():
+    """コードブロックの途中で区切るときは、閉じてから次のメッセージで開き直すこと"""
+    text = (
+        "説明\n```python\n"
+        + "\n".join(f"print({i})  # " + "x" * 40 for i in range(100))
+        + "\n```\n後書き"
+    )
+    messages = split_message(text, 1000)
+    assert len(messages) > 1
+    for message in messages:
+        assert len(message) <= 1000
+        assert message.count("```") % 2 == 0
+    assert all(message.startswith("```python") for message in messages[1:])
+
+
+def test_split_single_long_line():
+    """区切りのない長い行も上限以内に分けること"""
+    messages = split_message("あ" * 4500, 2000)
+    assert all(len(message) <= 2000 for message in messages)
+    assert "".join(messages).replace("\n", "") == "あ" * 4500
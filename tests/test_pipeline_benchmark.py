@@ -0,0 +1,99 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+from http_transport import HTTPTransport
+from pipeline_benchmark import (
+    LatencyChatModel,
+    LocalSite,
+    RewriteTransport,
+    run_benchmark,
+    site_pages,
+)
+from summarizer import HTTPClient
+
+FAST_MODEL = {"first_token_latency": 0.01, "tokens_per_second": 100000}
+
+
+def test_latency_chat_model_waits_for_first_token_and_streams():
+    """最初のトークンまで待ち、応答を少しずつ返すこと"""
+    model = LatencyChatModel(
+        response="abcdefghij" * 4, first_token_latency=0.05, chunk_chars=8
+    )
+
+    start = time.perf_counter()
+    chunks = [chunk.content for chunk in model.stream("hi")]
+
+    assert time.perf_counter() - start >= 0.05
+    assert len(chunks) == 5
+    assert "".join(chunks) == "abcdefghij" * 4
+    assert asyncio.run(model.ainvoke("hi")).content == "abcdefghij" * 4
+    assert model.calls == 2
+
+
+def test_rewrite_transport_serves_any_host_from_local_site():
+    """どのホストの URL も、ローカルのサーバーの同じパスから取得すること"""
+    with LocalSite(site_pages(pptx_slides=1)) as site:
+        transport = RewriteTransport(site.base_url)
+        http_transport = HTTPTransport(transport=transport, async_transport=transport)
+
+        content = HTTPClient(transport=http_transport).get_content(
+            "https://example.com/blog_article"
+        )
+        response = asyncio.run(
+            http_transport.aget("https://arxiv.example.org/abs/2202.12493")
+        )
+
+    assert len(content) > 200
+    assert response.status_code == 200
+    assert site.requests == 2
+
+
+def test_run_benchmark_reports_each_stage():
+    """段階ごとに、設定した待ち時間以上のレイテンシとメモリを報告すること"""
+    stages = ["text", "web", "pptx", "executor"]
+    if shutil.which("ffmpeg"):
+        stages.append("youtube")
+
+    reports = asyncio.run(
+        run_benchmark(
+            stages,
+            runs=2,
+            concurrency=2,
+            model_options=FAST_MODEL,
+            audio_seconds=20,
+            long_text_tokens=1000,
+        )
+    )
+
+    assert [report.stage for report in reports] == stages
+    for report in reports:
+        assert report.runs == 2
+        assert FAST_MODEL["first_token_latency"] <= report.p50 <= report.p95
+        assert report.throughput > 0
+        assert report.peak_mib > 0
+
+
+def test_run_benchmark_rejects_unknown_stage():
+    """知らない段階の名前は、空の結果を返さずに、選べる段階をエラーで示すこと"""
+    with pytest.raises(ValueError, match="Unknown stages: unknown .*executor"):
+        asyncio.run(run_benchmark(["text", "unknown"], model_options=FAST_MODEL))
+
+
+def test_command_line_rejects_unknown_stage():
+    """コマンドラインで知らない段階を指定したら、選べる段階を表示して終了すること"""
+    result = subprocess.run(
+        [sys.executable, "pipeline_benchmark.py", "--stage", "unknown"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+    assert result.returncode == 2
+    assert "invalid choice: 'unknown'" in result.stderr
+    assert "'executor'" in result.stderr
@@ -1,82 +1,216 @@
+import asyncio
+
 import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
 
-from router import Dispatcher, URLExtractor
+from method_type import MethodType
+from router import Dispatcher, LocalURLExtractor, URLExtractor, dispatch_by_rule
 
+# FakeListChatModel の i は最後の応答の次に 0 に戻るので、呼ばれないはずの応答を足して呼び出し回数を数える
+UNEXPECTED_ANSWER = "unexpected second call"
 
-@pytest.mark.parametrize(
-    "description, comment, expected_output",
-    [
-        ("no_url", "エラー", None),  # URL が含まれていない
-        (
-            "no_url_long",
-            "URL の文字列も LLM に任せるのがいいな。空白をマージしてくれたり、改行を買ってに結合してくれたり。そういう「人間が意外と細かくやっているやつ」みたいなのは、まさに LLM のほうが正規表現よりも正確にやってくれる。",
-            None,
-        ),  # URL なしの長いコメント
-        (
-            "youtube",
-            "https://www.youtube.com/watch?v=123456",  # 正常系
-            "https://www.youtube.com/watch?v=123456",
-        ),
-        (
-            "included_newline",
-            "このプレゼン面白い\nhttps://speakerdeck.com/snoozer05/software-architecture-metrics-in-a-nutshell",  # 改行
-            "https://speakerdeck.com/snoozer05/software-architecture-metrics-in-a-nutshell",
-        ),
-        (
-            "no_space_before_url",
-            "記事書いたhttps://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",  # URLの前に空白なし
-            "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",
-        ),
-        (
-            "no_space_after_url",
-            "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7記事書いた",  # URLのあとに空白なし
-            "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",
-        ),
-        (
-            "query_parameter",
-            "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7?v=記事書いた",  # 上と似てるけど、クエリパラメータがある
-            "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7?v=記事書いた",
-        ),
-        (
-            "space_in_url",
-            "https://arxiv.o rg/abs/2202.12493",  # 空白が誤って入ってしまっている
+URL_EXTRACTOR_CASES = [
+    ("no_url", "エラー", None),  # URL が含まれていない
+    (
+        "no_url_long",
+        "URL の文字列も LLM に任せるのがいいな。空白をマージしてくれたり、改行を買ってに結合してくれたり。そういう「人間が意外と細かくやっているやつ」みたいなのは、まさに LLM のほうが正規表現よりも正確にやってくれる。",
+        None,
+    ),  # URL なしの長いコメント
+    (
+        "youtube",
+        "https://www.youtube.com/watch?v=123456",  # 正常系
+        "https://www.youtube.com/watch?v=123456",
+    ),
+    (
+        "included_newline",
+        "このプレゼン面白い\nhttps://speakerdeck.com/snoozer05/software-architecture-metrics-in-a-nutshell",  # 改行
+        "https://speakerdeck.com/snoozer05/software-architecture-metrics-in-a-nutshell",
+    ),
+    (
+        "no_space_before_url",
+        "記事書いたhttps://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",  # URLの前に空白なし
+        "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",
+    ),
+    (
+        "no_space_after_url",
+        "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7記事書いた",  # URLのあとに空白なし
+        "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",
+    ),
+    (
+        "query_parameter",
+        "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7?v=記事書いた",  # 上と似てるけど、クエリパラメータがある
+        "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7?v=記事書いた",
+    ),
+    (
+        "space_in_url",
+        "https://arxiv.o rg/abs/2202.12493",  # 空白が誤って入ってしまっている
+        "https://arxiv.org/abs/2202.12493",
+    ),
+    (
+        "newline_in_url",
+        "https://arxiv.org/abs/22\n02.12493",  # 改行が誤って入ってしまっている
+        "https://arxiv.org/abs/2202.12493",
+    ),
+    (
+        "ttps",
+        "ttps://arxiv.org/abs/2202.12493",
+        "https://arxiv.org/abs/2202.12493",
+    ),  # 先頭 h がない
+    (
+        "two_url",
+        "https://arxiv.org/abs/2202.12493 とか https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",
+        [
             "https://arxiv.org/abs/2202.12493",
-        ),
-        (
-            "newline_in_url",
-            "https://arxiv.org/abs/22\n02.12493",  # 改行が誤って入ってしまっている
-            "https://arxiv.org/abs/2202.12493",
-        ),
-        (
-            "ttps",
-            "ttps://arxiv.org/abs/2202.12493",
-            "https://arxiv.org/abs/2202.12493",
-        ),  # 先頭 h がない
-        # (
-        #     "two_url",
-        #     "https://arxiv.org/abs/2202.12493 とか https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",
-        #     "このケースどうしようかな。2つあるときは抽出しない、というのがいいかもしれない"
-        # ),
-    ],
-)
+            "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",
+        ],
+    ),  # 複数の URL は出てくる順にすべて抽出する
+]
+
+
+def _expected_urls(expected_output: str | list[str] | None) -> list[str]:
+    if expected_output is None:
+        return []
+    if isinstance(expected_output, str):
+        return [expected_output]
+    return expected_output
+
+
+@pytest.mark.parametrize("description, comment, expected_output", URL_EXTRACTOR_CASES)
 def test_URLExtractor(description, comment, expected_output):
     """URLExtractor が期待した通りになっているか"""
     extractor = URLExtractor()
-    assert extractor.extract(comment) == expected_output
+    assert extractor.extract(comment) == _expected_urls(expected_output)
+
+
+@pytest.mark.parametrize("description, comment, expected_output", URL_EXTRACTOR_CASES)
+def test_LocalURLExtractor(description, comment, expected_output):
+    """LLM を使わずに URLExtractor と同じ結果になるか"""
+    extractor = LocalURLExtractor()
+    assert extractor.extract(comment) == _expected_urls(expected_output)
+
+
+@pytest.mark.parametrize(
+    "comment",
+    [
+        "https://example.com/foo is interesting",  # 英文の続きか URL の続きか区別できない
+        "example.com を見て",  # スキームがない
+        # 日本語のパスが直接続いていて、どこまでが URL か区別できない
+        "https://ja.wikipedia.org/wiki/東京",
+        "(https://ja.wikipedia.org/wiki/東京)",
+        "これ https://ja.wikipedia.org/wiki/東京 を見て",
+        "https://example.com/search/tag-日本語",
+    ],
+)
+def test_LocalURLExtractor_ambiguous(comment):
+    """判断できないときは None を返して LLM に任せること"""
+    extractor = LocalURLExtractor()
+    assert extractor.extract(comment) is None
 
 
 @pytest.mark.parametrize(
     "url, expected_output",
     [
-        ("https://www.youtube.com/watch?v=123456", "YouTube"),  # YouTube
+        ("https://www.youtube.com/watch?v=123456", MethodType.YOUTUBE),  # YouTube
         (
             "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",  # 一般的な Web
-            "Web",
+            MethodType.WEB,
         ),
-        ("https://arxiv.org/abs/2202.12493", "arXiv"),  # arXiv の論文
+        ("https://arxiv.org/abs/2202.12493", MethodType.ARXIV),  # arXiv の論文
     ],
 )
 def test_Dispatcher(url, expected_output):
     """Dispatcher が期待した通りになっているか"""
     dispatcher = Dispatcher()
     assert dispatcher.dispatch(url) == expected_output
+
+
+@pytest.mark.parametrize(
+    "url, expected_output",
+    [
+        ("https://www.youtube.com/watch?v=123456", MethodType.YOUTUBE),
+        ("https://m.youtube.com/watch?v=sal78ACtGTc", MethodType.YOUTUBE),
+        ("https://youtu.be/6zTVb_PiHuQ?si=o_sahEQGcr_aRJhp", MethodType.YOUTUBE),
+        ("https://www.youtube.com/shorts/abcdef", MethodType.YOUTUBE),
+        ("https://arxiv.org/abs/2202.12493", MethodType.ARXIV),
+        ("http://arxiv.org/pdf/2202.12493v2", MethodType.ARXIV),
+        ("https://ar5iv.org/abs/2202.12493", MethodType.ARXIV),
+        ("https://ar5iv.labs.arxiv.org/html/2202.12493", MethodType.ARXIV),
+        (
+            "https://cdn.discordapp.com/attachments/1/2/slides.pdf?ex=66&hm=ab",
+            MethodType.PDF,
+        ),
+        ("https://example.com/files/Deck.PPTX", MethodType.PPTX),
+        # ルールにないものは LLM に任せる
+        ("https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7", None),
+        ("https://notyoutube.com/watch?v=123456", None),
+    ],
+)
+def test_dispatch_by_rule(url, expected_output):
+    """ホスト名とパスだけで MethodType が決まるか"""
+    assert dispatch_by_rule(url) == expected_output
+
+
+def test_URLExtractor_parses_multiple_urls_from_llm(monkeypatch):
+    """LLM が 1 行に 1 つずつ返した URL をリストにすること"""
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    extractor = URLExtractor()
+    answer = (
+        "https://arxiv.org/abs/2202.12493\n- https://example.com/a\nhttps://x.com/foo"
+    )
+
+    assert extractor._parse(answer) == [
+        "https://arxiv.org/abs/2202.12493",
+        "https://example.com/a",
+    ]
+    assert extractor._parse("NONE") == []
+
+
+@pytest.mark.parametrize(
+    "comment, answer, expected, llm_calls",
+    [
+        # 手元で抽出できるものは LLM を呼ばない
+        (
+            "これ https://example.com/a と https://x.com/foo",
+            "NONE",
+            ["https://example.com/a"],
+            0,
+        ),
+        ("URL はないコメント", "NONE", [], 0),
+        # 判断できないものは LLM に任せる
+        ("example.com を見て", "https://example.com", ["https://example.com"], 1),
+    ],
+)
+def test_URLExtractor_async_agrees_with_sync(comment, answer, expected, llm_calls):
+    """aextract は extract と同じ URL を返し、LLM を呼ぶ条件も同じであること"""
+    sync_model = FakeListChatModel(responses=[answer, UNEXPECTED_ANSWER])
+    async_model = FakeListChatModel(responses=[answer, UNEXPECTED_ANSWER])
+
+    assert URLExtractor(model=sync_model).extract(comment) == expected
+    assert asyncio.run(URLExtractor(model=async_model).aextract(comment)) == expected
+    assert sync_model.i == async_model.i == llm_calls
+
+
+@pytest.mark.parametrize(
+    "url, answer, expected, llm_calls",
+    [
+        # ルールで決まるものは LLM を呼ばない
+        ("https://www.youtube.com/watch?v=123456", "Web", MethodType.YOUTUBE, 0),
+        ("https://example.com/files/deck.pptx", "Web", MethodType.PPTX, 0),
+        # ルールにないものは LLM の答えを使う
+        ("https://qiita.com/kenji-kondo/items/91ae", "Web", MethodType.WEB, 1),
+        ("https://papers.example.org/1234", "arXiv", MethodType.ARXIV, 1),
+    ],
+)
+def test_Dispatcher_async_agrees_with_sync(url, answer, expected, llm_calls):
+    """adispatch は dispatch と同じ MethodType を返し、LLM の答えはどちらも覚えておくこと"""
+    sync_model = FakeListChatModel(responses=[answer, UNEXPECTED_ANSWER])
+    async_model = FakeListChatModel(responses=[answer, UNEXPECTED_ANSWER])
+    sync_dispatcher = Dispatcher(model=sync_model)
+    async_dispatcher = Dispatcher(model=async_model)
+
+    async def adispatch_twice():
+        return [await async_dispatcher.adispatch(url) for _ in range(2)]
+
+    assert [sync_dispatcher.dispatch(url) for _ in range(2)] == [expected] * 2
+    assert asyncio.run(adispatch_twice()) == [expected] * 2
+    assert sync_model.i == async_model.i == llm_calls
@@ -0,0 +1,55 @@
+from startup_benchmark import SCENARIOS, VIDEO_STACK, probe
+
+
+def test_launcher_import_does_not_load_model_backends():
+    """discord_launcher の import では LLM や動画、HTTP のライブラリを読み込まないこと"""
+    _, backends = probe(SCENARIOS["launcher"])
+
+    for name in (
+        "langchain_core",
+        "langchain_anthropic",
+        "openai",
+        "httpx",
+        *VIDEO_STACK,
+    ):
+        assert name not in backends
+
+
+def test_launcher_import_does_not_open_caches(tmp_path):
+    """キャッシュのファイルや HTTP の接続は、import 時には作らずに最初に要約するときに作ること"""
+    path = str(tmp_path / "summary.sqlite3")
+    code = f"""
+import os
+os.environ["SUMMARY_CACHE_PATH"] = {path!r}
+import discord_launcher
+assert discord_launcher._http_transport is None
+assert not os.path.exists({path!r})
+discord_launcher.get_summarizer_builder()
+assert discord_launcher._http_transport is not None
+assert os.path.exists({path!r})
+"""
+    probe(code)
+
+
+def test_simple_mention_path_never_imports_video_stack():
+    """メンションされた投稿を要約する Executor を作っても、動画のライブラリは読み込まないこと"""
+    _, backends = probe(SCENARIOS["simple mention"])
+
+    assert "langchain_anthropic" in backends
+    assert not set(VIDEO_STACK) & set(backends)
+
+
+def test_summarizer_loads_video_stack_on_first_use():
+    """YouTube の Summarizer を作っただけでは読み込まず、使うときに読み込むこと"""
+    code = """
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from method_type import MethodType
+from summarizer import SummarizerBuilder, TextSummarizer
+builder = SummarizerBuilder(TextSummarizer(FakeListChatModel(responses=["a"])))
+summarizer = builder.build_summarizer(MethodType.YOUTUBE)
+"""
+    _, backends = probe(code)
+    assert not set(VIDEO_STACK) & set(backends)
+
+    _, backends = probe(code + "summarizer.client\n")
+    assert "openai" in backends
@@ -0,0 +1,93 @@
+import asyncio
+
+from streaming_reply import StreamingReply
+
+
+class FakeMessage:
+    """reply() と edit() の呼び出しを記録する discord.Message の代わり"""
+
+    def __init__(self, log: list, name: str = "message") -> None:
+        self.log = log
+        self.name = name
+        self.content = ""
+        self.replies: list[FakeMessage] = []
+
+    async def reply(self, content: str) -> "FakeMessage":
+        message = FakeMessage(self.log, f"{self.name}.reply{len(self.replies)}")
+        message.content = content
+        self.replies.append(message)
+        self.log.append(("reply", message.name, content))
+        return message
+
+    async def edit(self, content: str) -> None:
+        self.content = content
+        self.log.append(("edit", self.name, content))
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def _stream(snapshots: list[str], clock: FakeClock, step: float):
+    for snapshot in snapshots:
+        yield snapshot
+        clock.now += step
+
+
+def test_streaming_reply_posts_placeholder_and_throttles_edits():
+    """最初に placeholder を返信し、編集は min_interval ごとに間引くこと"""
+    log: list = []
+    message = FakeMessage(log)
+    clock = FakeClock()
+    reply = StreamingReply(message, min_interval=1.0, clock=clock)
+    snapshots = [""] + ["あ" * i for i in range(1, 21)]
+
+    result = asyncio.run(reply.consume(_stream(snapshots, clock, step=0.25)))
+
+    assert result == "あ" * 20
+    assert log[0] == ("reply", "message.reply0", "要約しています…")
+    edits = [entry for entry in log if entry[0] == "edit"]
+    # 5 秒間に 20 回更新があっても、編集は 1 秒に 1 回程度に抑えられる
+    assert len(edits) <= 6
+    assert message.replies[0].content == "あ" * 20
+    assert len(message.replies) == 1
+
+
+def test_streaming_reply_splits_long_summary():
+    """完成した要約が長い場合は、残りを返信としてつなげること"""
+    log: list = []
+    message = FakeMessage(log)
+    clock = FakeClock()
+    reply = StreamingReply(message, clock=clock)
+    summary = "# タイトル\n" + "\n\n".join(
+        f"## 見出し {i}\n" + "あ" * 600 for i in range(5)
+    )
+
+    asyncio.run(reply.consume(_stream(["", summary[:1000], summary], clock, 0.1)))
+
+    first = message.replies[0]
+    assert len(first.content) <= 2000
+    assert first.replies, "残りは最初の返信への返信として送られる"
+    pieces = [first.content]
+    while first.replies:
+        first = first.replies[0]
+        pieces.append(first.content)
+    assert all(len(piece) <= 2000 for piece in pieces)
+    assert "".join(pieces).replace("\n", "") == summary.replace("\n", "")
+
+
+def test_streaming_reply_without_content():
+    """何も返さない stream では返信しないこと"""
+    log: list = []
+    message = FakeMessage(log)
+
+    async def empty():
+        return
+        yield
+
+    assert asyncio.run(StreamingReply(message).consume(empty())) is None
+    assert log == []
@@ -1,7 +1,110 @@
+import asyncio
+import glob
+import os
+import random
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import httpx
+import openai
 import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
 
-from summarizer import HTTPClient, TextSummarizer, WebSummarizer, YouTubeSummarizer
+from cache import (
+    ContentCache,
+    PaperCache,
+    SummaryCache,
+    Transcript,
+    TranscriptCache,
+)
+from http_transport import HTTPTransport
+from method_type import MethodType
+from summarizer import (
+    ArXivSummarizer,
+    BaseSummarizer,
+    CachedSummarizer,
+    HTTPClient,
+    PDFSummarizer,
+    PPTXSummarizer,
+    SummarizerBuilder,
+    TextSummarizer,
+    WebSummarizer,
+    YouTubeSummarizer,
+)
 from tests.data import long_long_text
+from tests.test_document_extractor import make_pdf, make_pptx
+
+
+class RecordingChatModel(FakeListChatModel):
+    """受け取ったプロンプトを記録する FakeListChatModel"""
+
+    prompts: list[str] = []
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs) -> str:
+        self.prompts.append(messages[-1].content)
+        return super()._call(messages, stop, run_manager, **kwargs)
+
+
+class FakeResponse:
+    """HTTPTransport が返すレスポンスの代わり"""
+
+    def __init__(self, status_code: int, text: str = "", headers=None) -> None:
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise RuntimeError(self.status_code)
+
+
+class FakeScraper:
+    """HTTPTransport の代わりに handler(url, headers) の返すレスポンスを返し、リクエストを記録する"""
+
+    def __init__(self, handler) -> None:
+        self.handler = handler
+        self.requests: list[tuple[str, dict | None]] = []
+
+    def get(self, url: str, headers=None) -> FakeResponse:
+        self.requests.append((url, headers))
+        return self.handler(url, headers)
+
+
+class FakeHTTPClient:
+    """HTTPClient の代わりに決まった HTML・本文・ファイルを返し、取得した URL を記録する
+
+    error を渡すと、ファイルの取得はその例外で失敗する。
+    """
+
+    def __init__(
+        self, html: str = "", data: bytes = b"", error: Exception | None = None
+    ) -> None:
+        self.html = html
+        self.data = data
+        self.error = error
+        self.requested: list[str] = []
+
+    def get_html(self, url: str) -> str:
+        self.requested.append(url)
+        return self.html
+
+    def get_content(self, url: str) -> str:
+        self.requested.append(url)
+        return f"{url} の本文です。"
+
+    async def aget_content(self, url: str) -> str:
+        return self.get_content(url)
+
+    def get_bytes(self, url: str, max_bytes: int) -> bytes:
+        self.requested.append(url)
+        if self.error is not None:
+            raise self.error
+        return self.data
 
 
 @pytest.mark.parametrize(
@@ -50,6 +153,142 @@ def test_request_get(url, expected_included_str):
     assert expected_included_str in result
 
 
+def test_request_get_revalidates_content_cache():
+    """キャッシュが古くなったら条件付きリクエストを送り、304 ならキャッシュを使うこと"""
+
+    # Arrange
+    def handler(url: str, headers: dict) -> FakeResponse:
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(200, "<p>本文</p>", {"ETag": '"v1"'})
+
+    cache = ContentCache(path=":memory:", fresh_seconds=-1)
+    scraper = FakeScraper(handler)
+    http_client = HTTPClient(content_cache=cache, transport=scraper)
+
+    # Act
+    first = http_client.get("https://example.com")
+    second = http_client.get("https://example.com")
+
+    # Assert
+    assert first == second == "本文"
+    assert [headers for _, headers in scraper.requests] == [
+        {},
+        {"If-None-Match": '"v1"'},
+    ]
+
+
+def test_get_content_falls_back_to_proxy():
+    """直接取得に失敗したり本文が短すぎたりしたら、プロキシ経由で取得すること"""
+
+    html = {"Content-Type": "text/html"}
+    pages = {
+        "https://example.com/article": FakeResponse(
+            200, f"<article><p>{'本文' * 200}</p></article>", html
+        ),
+        "https://example.com/spa": FakeResponse(200, "<div id='app'></div>", html),
+        "https://example.com/blocked": FakeResponse(403, "Forbidden", html),
+    }
+
+    def handler(url: str, headers: dict) -> FakeResponse:
+        if url.startswith("https://r.jina.ai/"):
+            return FakeResponse(200, "プロキシの本文", {"Content-Type": "text/plain"})
+        return pages[url]
+
+    scraper = FakeScraper(handler)
+    http_client = HTTPClient(transport=scraper)
+
+    assert http_client.get_content("https://example.com/article") == "本文" * 200
+    assert http_client.get_content("https://example.com/spa") == "プロキシの本文"
+    assert http_client.get_content("https://example.com/blocked") == "プロキシの本文"
+    assert [url for url, _ in scraper.requests] == [
+        "https://example.com/article",
+        "https://example.com/spa",
+        "https://r.jina.ai/https://example.com/spa",
+        "https://example.com/blocked",
+        "https://r.jina.ai/https://example.com/blocked",
+    ]
+
+
+def test_aget_content_uses_cache_and_proxy():
+    """非同期でもキャッシュを使い、本文が短すぎればプロキシ経由で取得すること"""
+    requested: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        if request.url.host == "r.jina.ai":
+            return httpx.Response(200, text="プロキシの本文")
+        return httpx.Response(200, html="<div id='app'></div>")
+
+    http_client = HTTPClient(
+        content_cache=ContentCache(path=":memory:"),
+        transport=HTTPTransport(async_transport=httpx.MockTransport(handler)),
+    )
+
+    async def run() -> list[str]:
+        return [
+            await http_client.aget_content("https://example.com/spa"),
+            await http_client.aget_content("https://example.com/spa"),
+        ]
+
+    assert asyncio.run(run()) == ["プロキシの本文", "プロキシの本文"]
+    assert requested == [
+        "https://example.com/spa",
+        "https://r.jina.ai/https://example.com/spa",
+    ]
+
+
+def test_get_html_skips_content_extraction():
+    """get_html は本文を抽出せずに HTML を返し、抽出していないテキストをキャッシュに残さないこと"""
+
+    class CountingExtractor:
+        def __init__(self) -> None:
+            self.calls = 0
+
+        def extract(self, html: str) -> str:
+            self.calls += 1
+            return "本文"
+
+    html = "<article><p>本文</p></article>"
+    extractor = CountingExtractor()
+    http_client = HTTPClient(
+        content_cache=ContentCache(path=":memory:"),
+        extractor=extractor,
+        transport=HTTPTransport(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, html=html)
+            )
+        ),
+    )
+
+    assert http_client.get_html("https://example.com") == html
+    assert extractor.calls == 0
+    assert http_client.get("https://example.com") == "本文"
+    assert extractor.calls == 1
+
+
+def test_arxiv_summarizer_uses_sections_and_paper_cache():
+    """ar5iv の HTML をセクションごとに解析して要約し、解析結果を再利用すること"""
+    with open(
+        os.path.join(os.path.dirname(__file__), "fixtures", "html", "ar5iv_paper.html"),
+        encoding="utf-8",
+    ) as f:
+        html = f.read()
+
+    model = RecordingChatModel(responses=["要約"])
+    http_client = FakeHTTPClient(html=html)
+    summarizer = ArXivSummarizer(
+        TextSummarizer(model), http_client, paper_cache=PaperCache(path=":memory:")
+    )
+
+    summarizer.summarize("https://arxiv.org/pdf/2202.12493v2.pdf")
+    asyncio.run(summarizer.asummarize("http://arxiv.org/abs/2202.12493v2"))
+
+    assert http_client.requested == ["https://ar5iv.org/abs/2202.12493v2"]
+    assert "## 1 Introduction" in model.prompts[-1]
+    assert "Hirata" not in model.prompts[-1]
+
+
 def test_arxiv_summarizer():
     """ArXivSummarizer の summarize が正常終了するか"""
     # Arrange
@@ -98,3 +337,578 @@ def test_summarize_at_the_end():
     # Assert。とりあえず今は 1024 であるかどうか。
     # ここは LLM を用いて「文章が途中で切れてないか」を確かめさせるのがいいだろうな。
     assert len(result) > 1024
+
+
+def test_summarizer_builder_reuses_instances():
+    """SummarizerBuilder は同じ MethodType に対して同じインスタンスを返すこと"""
+    # Arrange
+    text_summarizer = TextSummarizer(FakeListChatModel(responses=["要約"]))
+    builder = SummarizerBuilder(text_summarizer=text_summarizer)
+
+    # Act
+    web = builder.build_summarizer(MethodType.WEB)
+    arxiv = builder.build_summarizer(MethodType.ARXIV)
+
+    # Assert
+    assert builder.build_summarizer(MethodType.WEB) is web
+    assert arxiv.text_summrizer is web.text_summrizer is text_summarizer
+    assert arxiv.http_client is web.http_client
+    assert builder.build_summarizer(MethodType.NONE) is None
+
+
+def test_cached_summarizer():
+    """同じ URL の 2 回目はキャッシュから返し、中の Summarizer を呼ばないこと"""
+
+    # Arrange
+    class CountingSummarizer(BaseSummarizer):
+        calls = 0
+
+        def summarize(self, url: str) -> str:
+            self.calls += 1
+            return f"summary of {url}"
+
+        async def asummarize(self, url: str) -> str:
+            return self.summarize(url)
+
+    inner = CountingSummarizer()
+    cache = SummaryCache(path=":memory:")
+    text_summarizer = TextSummarizer(FakeListChatModel(responses=["要約"]))
+    summarizer = CachedSummarizer(inner, cache, text_summarizer)
+
+    # Act
+    first = summarizer.summarize("https://example.com/a?utm_source=x")
+    second = summarizer.summarize("https://example.com/a")
+
+    # Assert
+    assert first == second
+    assert inner.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_summarize_long_input_with_map_reduce():
+    """長い入力は分割して要点を抽出してから、まとめて要約すること"""
+    # Arrange
+    model = RecordingChatModel(responses=["要点"])
+    summarizer = TextSummarizer(model, chunk_threshold_tokens=1000, chunk_tokens=500)
+    chunks = summarizer._chunks(long_long_text)
+
+    # Act
+    result = summarizer.summarize(long_long_text)
+
+    # Assert: map で分割数分、reduce で 1 回呼ばれ、reduce には要点だけが渡される
+    assert result == "要点"
+    assert len(chunks) > 1
+    assert len(model.prompts) == len(chunks) + 1
+    assert f"## パート {len(chunks)}\n要点" in model.prompts[-1]
+    assert long_long_text.strip()[:100] not in model.prompts[-1]
+
+
+def test_summarize_short_input_in_one_shot():
+    """短い入力は分割せずに 1 回で要約すること"""
+    model = RecordingChatModel(responses=["要約"])
+    summarizer = TextSummarizer(model)
+
+    assert summarizer.summarize("短い文章") == "要約"
+    assert len(model.prompts) == 1
+
+
+def test_summarize_normalizes_input_before_prompting():
+    """繰り返しや空白を取り除き、入力の上限に収めてからプロンプトに渡すこと"""
+    model = RecordingChatModel(responses=["要約"])
+    summarizer = TextSummarizer(model, input_budget_tokens=50)
+    paragraph = "とても大事な本文の段落です。" * 2
+    text = "\n\n\n\n".join([paragraph] * 5 + ["最後の段落" * 20])
+
+    summarizer.summarize(text)
+
+    prompt = model.prompts[-1]
+    assert prompt.count(paragraph) == 1
+    assert "最後の段落" not in prompt
+    assert "\n\n\n" not in prompt
+
+
+def test_asummarize_long_input_with_map_reduce():
+    """非同期版でも長い入力は分割して要約すること"""
+    model = RecordingChatModel(responses=["要点"])
+    summarizer = TextSummarizer(model, chunk_threshold_tokens=1000, chunk_tokens=500)
+    chunks = summarizer._chunks(long_long_text)
+
+    assert asyncio.run(summarizer.asummarize(long_long_text)) == "要点"
+    assert len(model.prompts) == len(chunks) + 1
+
+
+def test_summarize_compresses_slightly_long_summary_locally():
+    """少しだけ長い要約は LLM で書き直さずに手元で削ること"""
+    draft = "# タイトル\n" + "".join(f"- {i} " + "あ" * 90 + "\n" for i in range(22))
+    model = RecordingChatModel(responses=[draft])
+    summarizer = TextSummarizer(model)
+
+    result = summarizer.summarize("資料")
+
+    assert len(draft) > 2000
+    assert len(result) <= 2000
+    assert result.startswith("# タイトル\n- 0 ")
+    assert len(model.prompts) == 1
+
+
+def test_summarize_revises_once_with_draft_only():
+    """大きく超えた場合は要約だけを見せて 1 回だけ書き直させること"""
+    draft = "# タイトル\n" + "- " + "あ" * 3000
+    model = RecordingChatModel(responses=[draft, "# タイトル\n- " + "い" * 2500])
+    summarizer = TextSummarizer(model)
+
+    result = summarizer.summarize("資料の本文")
+
+    assert len(result) <= 2000
+    assert len(model.prompts) == 2
+    assert "資料の本文" not in model.prompts[1]
+
+
+def test_astream_yields_growing_summary():
+    """astream は書いている途中の全文を順に返し、最後は asummarize と同じ結果になること"""
+    summarizer = TextSummarizer(FakeListChatModel(responses=["# 要約\n- 本文"]))
+
+    async def collect():
+        return [summary async for summary in summarizer.astream("資料")]
+
+    snapshots = asyncio.run(collect())
+
+    assert len(snapshots) > 1
+    assert all(b.startswith(a) for a, b in zip(snapshots, snapshots[1:]))
+    assert snapshots[-1] == "# 要約\n- 本文"
+
+
+def test_astream_ends_with_fitted_summary():
+    """長すぎる要約は、途中経過のあとに削ったものを最後に返すこと"""
+    draft = "# タイトル\n" + "".join(f"- {i} " + "あ" * 90 + "\n" for i in range(22))
+    summarizer = TextSummarizer(FakeListChatModel(responses=[draft]))
+
+    async def collect():
+        return [summary async for summary in summarizer.astream("資料")]
+
+    snapshots = asyncio.run(collect())
+
+    assert snapshots[-2] == draft
+    assert snapshots[-1] == summarizer.summarize("資料")
+    assert len(snapshots[-1]) <= 2000
+
+
+class FakeTranscriptions:
+    """チャンクごとにランダムな時間待ってから、ファイルの中身を文字起こし結果として返す"""
+
+    def __init__(self, fail_once: set[str]) -> None:
+        self.fail_once = set(fail_once)
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _maybe_fail(self, name: str) -> None:
+        with self.lock:
+            if name in self.fail_once:
+                self.fail_once.discard(name)
+                request = httpx.Request("POST", "https://api.openai.com")
+                raise openai.APIConnectionError(request=request)
+
+    def create(self, model: str, file, **kwargs) -> SimpleNamespace:
+        self._maybe_fail(file.name)
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(random.uniform(0, 0.02))
+        with self.lock:
+            self.active -= 1
+        return SimpleNamespace(text=file.read().decode(), language="japanese")
+
+    async def acreate(self, model: str, file, **kwargs) -> SimpleNamespace:
+        self._maybe_fail(file.name)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(random.uniform(0, 0.02))
+        self.active -= 1
+        return SimpleNamespace(text=file.read().decode(), language="japanese")
+
+
+@pytest.fixture
+def whisper_summarizer(tmp_path):
+    """音声のダウンロードと分割を、テキストファイルの chunk で置き換えた YouTubeSummarizer"""
+    audio_files = []
+    for i in range(6):
+        path = tmp_path / f"audio_{i}.mp3"
+        path.write_text(f"[{i}]")
+        audio_files.append(str(path))
+
+    summarizer = YouTubeSummarizer(
+        TextSummarizer(FakeListChatModel(responses=["要約"])),
+        whisper_concurrency=2,
+        whisper_retry_backoff=0,
+    )
+    summarizer._download_audio = lambda url, workdir: "audio.mp3"
+    summarizer._split_audio = lambda audio_file, workdir: audio_files
+    return summarizer, audio_files
+
+
+def test_atranscribe_with_whisper_in_parallel(whisper_summarizer):
+    """チャンクは並列に文字起こしされ、失敗したものはリトライされ、順番通りに結合されること"""
+    # Arrange
+    summarizer, audio_files = whisper_summarizer
+    transcriptions = FakeTranscriptions(fail_once={audio_files[1]})
+    summarizer._async_client = SimpleNamespace(
+        audio=SimpleNamespace(
+            transcriptions=SimpleNamespace(create=transcriptions.acreate)
+        )
+    )
+
+    # Act
+    content = asyncio.run(summarizer.atranscribe_with_whisper("https://youtu.be/x"))
+
+    # Assert: 言語は字幕と同じ形式の言語コードにそろえる
+    assert content.text == "[0][1][2][3][4][5]"
+    assert content.source == "whisper"
+    assert content.language == "ja"
+    assert transcriptions.peak == 2
+
+
+def test_transcribe_with_whisper_in_parallel(whisper_summarizer):
+    """同期版でも並列に文字起こしされ、順番通りに結合されること"""
+    # Arrange
+    summarizer, audio_files = whisper_summarizer
+    transcriptions = FakeTranscriptions(fail_once={audio_files[4]})
+    summarizer._client = SimpleNamespace(
+        audio=SimpleNamespace(
+            transcriptions=SimpleNamespace(create=transcriptions.create)
+        )
+    )
+
+    # Act
+    content = summarizer.transcribe_with_whisper("https://youtu.be/x")
+
+    # Assert
+    assert content.text == "[0][1][2][3][4][5]"
+    assert content.source == "whisper"
+    assert content.language == "ja"
+    assert transcriptions.peak <= 2
+
+
+@pytest.mark.parametrize("has_captions", [True, False])
+def test_youtube_summarizer_async_agrees_with_sync(whisper_summarizer, has_captions):
+    """asummarize は summarize と同じ文字起こしを要約すること。字幕がなければどちらも Whisper を使う"""
+    summarizer, _ = whisper_summarizer
+    model = RecordingChatModel(responses=["要約"])
+    summarizer.text_summrizer = TextSummarizer(model)
+    transcriptions = FakeTranscriptions(fail_once=set())
+    summarizer._client = SimpleNamespace(
+        audio=SimpleNamespace(
+            transcriptions=SimpleNamespace(create=transcriptions.create)
+        )
+    )
+    summarizer._async_client = SimpleNamespace(
+        audio=SimpleNamespace(
+            transcriptions=SimpleNamespace(create=transcriptions.acreate)
+        )
+    )
+
+    def transcribe_with_youtube_transcript_api(url: str) -> Transcript:
+        if not has_captions:
+            raise RuntimeError("No captions")
+        return Transcript("字幕の本文", "captions", "ja")
+
+    summarizer.transcribe_with_youtube_transcript_api = (
+        transcribe_with_youtube_transcript_api
+    )
+    url = "https://www.youtube.com/watch?v=TMO4NH8HAHQ"
+
+    transcripts = [summarizer.transcribe(url), asyncio.run(summarizer.atranscribe(url))]
+    summaries = [summarizer.summarize(url), asyncio.run(summarizer.asummarize(url))]
+
+    assert transcripts[0] == transcripts[1]
+    assert transcripts[0].source == ("captions" if has_captions else "whisper")
+    assert summaries == ["要約", "要約"]
+    assert model.prompts[0] == model.prompts[1]
+
+
+def test_whisper_client_is_created_once_across_threads(monkeypatch):
+    """並列に文字起こしするスレッドから同時に使っても、クライアントは 1 つだけ作ること"""
+    created = []
+
+    class SlowOpenAI:
+        def __init__(self, **kwargs) -> None:
+            time.sleep(0.02)
+            created.append(self)
+
+    monkeypatch.setattr(openai, "OpenAI", SlowOpenAI)
+    summarizer = YouTubeSummarizer(
+        TextSummarizer(FakeListChatModel(responses=["要約"]))
+    )
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        clients = list(pool.map(lambda _: summarizer.client, range(8)))
+
+    assert len(created) == 1
+    assert all(client is created[0] for client in clients)
+
+
+def test_whisper_uses_isolated_workdir(whisper_summarizer):
+    """ジョブごとに別の一時ディレクトリを使い、終わったら削除すること"""
+    # Arrange
+    summarizer, _ = whisper_summarizer
+    workdirs = []
+
+    def download_audio(url: str, workdir: str) -> str:
+        workdirs.append(workdir)
+        assert os.path.isdir(workdir)
+        return os.path.join(workdir, "audio.mp3")
+
+    summarizer._download_audio = download_audio
+    transcriptions = FakeTranscriptions(fail_once=set())
+    summarizer._client = SimpleNamespace(
+        audio=SimpleNamespace(
+            transcriptions=SimpleNamespace(create=transcriptions.create)
+        )
+    )
+
+    # Act
+    summarizer.transcribe_with_whisper("https://youtu.be/x")
+    summarizer.transcribe_with_whisper("https://youtu.be/y")
+
+    # Assert
+    assert workdirs[0] != workdirs[1]
+    assert not any(os.path.exists(workdir) for workdir in workdirs)
+
+
+@pytest.mark.parametrize(
+    "duration, silences, expected",
+    [
+        (None, [], []),  # 長さがわからなければ segment_time に任せる
+        (25, [], [10, 20]),  # 無音がなければ目安の長さで区切る
+        (25, [6.5, 16.5], [6.5, 16.5]),  # 目安の手前の無音で区切る
+        (
+            25,
+            [3, 9, 19.5],
+            [9, 19],
+        ),  # 手前の無音のうち目安に近いもの。なければ目安の長さ
+        (25, [15], [10, 20]),  # 目安の手前から離れた無音では区切らない
+    ],
+)
+def test_segment_times(duration, silences, expected):
+    """区切りは目安の長さを超えず、できるだけ無音の位置になること"""
+    summarizer = YouTubeSummarizer(
+        TextSummarizer(FakeListChatModel(responses=["要約"]))
+    )
+    summarizer.segment_seconds = 10
+    summarizer.silence_window_seconds = 4
+
+    assert summarizer._segment_times(duration, silences) == expected
+
+
+def test_segment_times_respect_upload_budget():
+    """目安の長さが長すぎても、アップロードの上限サイズに収まる長さで区切ること"""
+    summarizer = YouTubeSummarizer(
+        TextSummarizer(FakeListChatModel(responses=["要約"]))
+    )
+    summarizer.segment_seconds = 24 * 60 * 60
+
+    times = summarizer._segment_times(3 * 24 * 60 * 60, [])
+
+    assert times[0] == pytest.approx(summarizer.max_segment_seconds, abs=0.01)
+
+
+def generate_audio(audio_file: str) -> None:
+    """10 秒ごとに 6〜7 秒の間が無音になっている 25 秒の音声を作る"""
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "aevalsrc='if(between(mod(t,10),6,7),0,sin(2*PI*440*t))':d=25:s=44100",
+            "-ac",
+            "2",
+            audio_file,
+        ],
+        check=True,
+    )
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_split_audio(tmp_path):
+    """音声向けの形式に変換しながら、無音の位置で分割されること"""
+    # Arrange: 10 秒ごとに 6〜7 秒の間が無音になっている 25 秒の音声を、10 秒を目安に分割する
+    audio_file = str(tmp_path / "source.webm")
+    generate_audio(audio_file)
+    summarizer = YouTubeSummarizer(
+        TextSummarizer(FakeListChatModel(responses=["要約"]))
+    )
+    summarizer.segment_seconds = 10
+    summarizer.silence_window_seconds = 4
+
+    # Act
+    duration, silences = summarizer._detect_silences(audio_file)
+    audio_files = summarizer._split_audio(audio_file, str(tmp_path))
+
+    # Assert
+    assert duration == pytest.approx(25, abs=0.1)
+    assert summarizer._segment_times(duration, silences) == pytest.approx(
+        [6.5, 16.5], abs=0.1
+    )
+    assert [os.path.basename(f) for f in audio_files] == [
+        "audio_000.ogg",
+        "audio_001.ogg",
+        "audio_002.ogg",
+    ]
+    assert sum(os.path.getsize(f) for f in audio_files) < os.path.getsize(audio_file)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_split_audio_respects_upload_budget(tmp_path):
+    """アップロードの上限が小さいときは、目安の長さより短く分割されること"""
+    # Arrange: 上限から決まる長さは 8 秒で、目安の 15 分より短い
+    audio_file = str(tmp_path / "source.webm")
+    generate_audio(audio_file)
+    summarizer = YouTubeSummarizer(
+        TextSummarizer(FakeListChatModel(responses=["要約"]))
+    )
+    summarizer.max_upload_bytes = 30_000
+    summarizer.silence_window_seconds = 4
+
+    # Act
+    audio_files = summarizer._split_audio(audio_file, str(tmp_path))
+
+    # Assert: 目安の 15 分なら 1 つにまとまる音声が、上限に収まるように分かれる
+    assert summarizer.max_segment_seconds == pytest.approx(8)
+    assert len(audio_files) >= 4
+    assert all(os.path.getsize(f) <= 30_000 for f in audio_files)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_split_audio_resplits_oversized_chunk(tmp_path, monkeypatch):
+    """見積もりより大きくなったチャンクは、上限に収まるように分け直されること"""
+    # Arrange: 区切りを無視して 1 つのチャンクにまとめさせ、上限を超えさせる
+    audio_file = str(tmp_path / "source.webm")
+    generate_audio(audio_file)
+    summarizer = YouTubeSummarizer(
+        TextSummarizer(FakeListChatModel(responses=["要約"]))
+    )
+    summarizer.max_upload_bytes = 30_000
+    monkeypatch.setattr(
+        summarizer, "_segment_options", lambda segment_times: ["-segment_time", "60"]
+    )
+
+    # Act
+    audio_files = summarizer._split_audio(audio_file, str(tmp_path))
+
+    # Assert: 分け直したチャンクだけが、元の順に残る
+    assert len(audio_files) > 1
+    assert all(os.path.getsize(f) <= 30_000 for f in audio_files)
+    assert audio_files == sorted(glob.glob(str(tmp_path / "audio_*.ogg")))
+    assert all(os.path.basename(f).startswith("audio_000_") for f in audio_files)
+    assert sum(summarizer._detect_silences(f)[0] for f in audio_files) == pytest.approx(
+        25, abs=0.5
+    )
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_split_audio_raises_when_chunk_cannot_fit(tmp_path):
+    """1 秒未満に分けても上限に収まらなければ、Whisper に送らずにエラーにすること"""
+    audio_file = str(tmp_path / "source.webm")
+    generate_audio(audio_file)
+    summarizer = YouTubeSummarizer(
+        TextSummarizer(FakeListChatModel(responses=["要約"]))
+    )
+    summarizer.max_upload_bytes = 1_000
+
+    with pytest.raises(ValueError, match="cannot be split further"):
+        summarizer._split_audio(audio_file, str(tmp_path))
+
+
+def test_youtube_summarizer_uses_transcript_cache():
+    """一度文字起こしした動画は、ダウンロードも文字起こしもせずにキャッシュを使うこと"""
+    # Arrange
+    cache = TranscriptCache(path=":memory:")
+    summarizer = YouTubeSummarizer(
+        TextSummarizer(FakeListChatModel(responses=["要約"])), transcript_cache=cache
+    )
+    calls = []
+
+    def transcribe_with_youtube_transcript_api(url: str) -> Transcript:
+        calls.append(url)
+        return Transcript("字幕", "captions", "ja")
+
+    summarizer.transcribe_with_youtube_transcript_api = (
+        transcribe_with_youtube_transcript_api
+    )
+
+    # Act
+    first = summarizer.transcribe("https://www.youtube.com/watch?v=TMO4NH8HAHQ")
+    second = asyncio.run(
+        summarizer.atranscribe("https://www.youtube.com/watch?v=TMO4NH8HAHQ")
+    )
+
+    # Assert
+    assert first == second == Transcript("字幕", "captions", "ja")
+    assert len(calls) == 1
+    assert cache.get("TMO4NH8HAHQ") == first
+
+
+def test_web_summarizer_async_agrees_with_sync():
+    """asummarize は summarize と同じ本文を同じプロンプトで要約すること"""
+    model = RecordingChatModel(responses=["要約"])
+    summarizer = WebSummarizer(TextSummarizer(model), FakeHTTPClient())
+
+    assert summarizer.summarize("https://example.com/a") == "要約"
+    assert asyncio.run(summarizer.asummarize("https://example.com/a")) == "要約"
+    assert len(model.prompts) == 2
+    assert model.prompts[0] == model.prompts[1]
+    assert "https://example.com/a の本文です。" in model.prompts[0]
+
+
+def test_pptx_summarizer_reads_attachment_in_memory(tmp_path, monkeypatch):
+    """添付ファイルはダウンロードしてメモリ上で読み、作業ディレクトリには何も書かないこと"""
+    monkeypatch.chdir(tmp_path)
+    model = RecordingChatModel(responses=["要約"])
+    summarizer = SummarizerBuilder(
+        text_summarizer=TextSummarizer(model),
+        http_client=FakeHTTPClient(data=make_pptx(3)),
+    ).build_summarizer(MethodType.PPTX)
+
+    assert isinstance(summarizer, PPTXSummarizer)
+    assert (
+        asyncio.run(
+            summarizer.asummarize("https://cdn.discordapp.com/attachments/1/2/a.pptx")
+        )
+        == "要約"
+    )
+    assert "## Slide 3\nSlide title 3" in model.prompts[-1]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_pdf_summarizer_summarizes_pages():
+    """PDF の URL は PDFSummarizer で、ページごとのテキストを要約すること"""
+    model = RecordingChatModel(responses=["要約"])
+    summarizer = SummarizerBuilder(
+        text_summarizer=TextSummarizer(model),
+        http_client=FakeHTTPClient(
+            data=make_pdf(["Introduction", "Method", "Results"])
+        ),
+    ).build_summarizer(MethodType.PDF)
+
+    assert isinstance(summarizer, PDFSummarizer)
+    assert summarizer.summarize("https://example.com/paper.pdf") == "要約"
+    assert "## Page 3\nResults" in model.prompts[-1]
+
+
+def test_document_summarizer_does_not_read_local_files_by_default(tmp_path):
+    """Discord の投稿からローカルのファイルを読ませないこと"""
+    path = tmp_path / "secret.pptx"
+    path.write_bytes(make_pptx(1))
+    http_client = FakeHTTPClient(error=ValueError("Invalid URL"))
+
+    model = RecordingChatModel(responses=["要約"])
+    with pytest.raises(ValueError, match="Invalid URL"):
+        PPTXSummarizer(TextSummarizer(model), http_client).summarize(str(path))
+
+    summarizer = PPTXSummarizer(
+        TextSummarizer(model), http_client, allow_local_files=True
+    )
+    assert summarizer.summarize(str(path)) == "要約"
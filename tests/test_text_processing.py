@@ -0,0 +1,182 @@
+import pytest
+
+from tests.data import long_long_text
+from text_processing import (
+    compress_markdown,
+    count_tokens,
+    normalize_input,
+    split_text,
+)
+
+
+@pytest.mark.parametrize(
+    "text, expected_tokens",
+    [
+        ("", 0),
+        ("abcd", 1),
+        ("abcde", 2),
+        ("日本語", 3),
+        ("日本語 abcd", 5),
+    ],
+)
+def test_count_tokens(text, expected_tokens):
+    """ASCII は 4 文字で 1 トークン、それ以外は 1 文字 1 トークンとして数えること"""
+    assert count_tokens(text) == expected_tokens
+
+
+def test_split_text_respects_budget():
+    """すべての断片が上限以内に収まり、内容が失われないこと"""
+    chunks = split_text(long_long_text, 500)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 500 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == (
+        long_long_text.replace("\n", "").replace(" ", "")
+    )
+
+
+def test_split_text_prefers_paragraph_boundaries():
+    """段落の途中では切らないこと"""
+    paragraphs = ["あ" * 40, "い" * 40, "う" * 40]
+    assert split_text("\n\n".join(paragraphs), 50) == paragraphs
+
+
+def test_split_text_falls_back_to_sentences():
+    """段落が長すぎる場合は文の境界で切ること"""
+    text = "あ" * 30 + "。" + "い" * 30 + "。"
+    assert split_text(text, 40) == ["あ" * 30 + "。", "い" * 30 + "。"]
+
+
+SUMMARY_MARKDOWN = """# タイトル
+
+## セクション1
+- a1 aaaaaaaaaa
+  - a1-1 bbbbbbbbbb
+  - a1-2 cccccccccc
+- a2 dddddddddd
+
+## セクション2
+- b1 eeeeeeeeee
+- b2 ffffffffff
+"""
+
+
+def test_compress_markdown_keeps_short_text():
+    """上限以内ならそのまま返すこと"""
+    assert compress_markdown(SUMMARY_MARKDOWN, 2000) == SUMMARY_MARKDOWN
+
+
+@pytest.mark.parametrize(
+    "max_length, expected",
+    [
+        (
+            # 深い階層の bullet から削る
+            100,
+            "# タイトル\n\n## セクション1\n- a1 aaaaaaaaaa\n- a2 dddddddddd\n\n"
+            "## セクション2\n- b1 eeeeeeeeee\n- b2 ffffffffff",
+        ),
+        (
+            # 各セクションの先頭の bullet は残す
+            60,
+            "# タイトル\n\n## セクション1\n- a1 aaaaaaaaaa\n\n## セクション2\n- b1 eeeeeeeeee",
+        ),
+        (
+            # 後ろのセクションから丸ごと削る
+            40,
+            "# タイトル\n\n## セクション1\n- a1 aaaaaaaaaa",
+        ),
+    ],
+)
+def test_compress_markdown(max_length, expected):
+    """重要度の低いところから Markdown の境界で削ること"""
+    compressed = compress_markdown(SUMMARY_MARKDOWN, max_length)
+    assert compressed == expected
+    assert len(compressed) <= max_length
+
+
+def test_compress_markdown_keeps_code_fence():
+    """コードブロックは途中で切らずに丸ごと扱うこと"""
+    text = "# タイトル\n- a\n```\n- not a bullet\n```\n- " + "b" * 50
+    compressed = compress_markdown(text, 40)
+    assert compressed.count("```") in (0, 2)
+    assert len(compressed) <= 40
+
+
+def test_normalize_input_removes_noise():
+    """空白の連続、リンクだけの行、定型文、長い行の繰り返しを取り除くこと"""
+    text = "\n".join(
+        [
+            "[ホーム](https://example.com/) [ブログ](https://example.com/blog)",
+            "Skip to content",
+            "",
+            "",
+            "",
+            "  # タイトル  ",
+            "本文の   最初の段落です。これは十分に長い段落です。",
+            "- 項目",
+            "  - 入れ子の   項目",
+            "【質問】",
+            "本文の   最初の段落です。これは十分に長い段落です。",
+            "【質問】",
+            "```",
+            "    code   block",
+            "```",
+            "© 2024 Example Inc.",
+        ]
+    )
+
+    result = normalize_input(text)
+
+    assert result.text == "\n".join(
+        [
+            "# タイトル",
+            "本文の 最初の段落です。これは十分に長い段落です。",
+            "- 項目",
+            "  - 入れ子の 項目",
+            "【質問】",
+            "【質問】",
+            "```",
+            "    code   block",
+            "```",
+        ]
+    )
+    assert result.removed_duplicate_lines == 1
+    assert result.removed_boilerplate_lines == 3
+    assert not result.truncated
+    assert result.tokens < result.original_tokens
+
+
+def test_normalize_input_keeps_content_about_cookies_and_copyright():
+    """Cookie や著作権を話題にした本文は残し、サイトの案内や著作権表示だけを捨てること"""
+    content = [
+        "# HTTP Cookie の仕組み",
+        "Cookies are small pieces of data stored by the browser.",
+        "サーバーは Set-Cookie ヘッダーでクッキーを送る。",
+        "Third-party cookies are blocked by default in Safari.",
+        "## Copyright and licensing",
+        "Copyright law protects original works of authorship.",
+        "(c) の表記は著作権表示として使われることがある。",
+    ]
+    notices = [
+        "This site uses cookies to improve your experience.",
+        "We use cookies to personalise content and ads.",
+        "Accept all cookies",
+        "Cookie settings",
+        "当サイトではクッキーを使用しています。",
+        "© 2024 Foo. All rights reserved.",
+        "Copyright © 2020-2024 Foo Inc.",
+    ]
+
+    result = normalize_input("\n".join(content + notices))
+
+    assert result.text == "\n".join(content)
+    assert result.removed_boilerplate_lines == len(notices)
+
+
+def test_normalize_input_trims_to_budget():
+    """max_tokens を超えたら行の境界で切り、切ったことを報告すること"""
+    result = normalize_input(long_long_text, max_tokens=1000)
+
+    assert result.truncated
+    assert result.tokens <= 1000
+    assert long_long_text.strip().startswith(result.text.splitlines()[0])
+    assert "truncated: True" in result.report()
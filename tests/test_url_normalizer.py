@@ -0,0 +1,107 @@
+import pytest
+
+from method_type import MethodType
+from url_normalizer import normalize_url
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.youtube.com/watch?v=6zTVb_PiHuQ",
+        "https://www.youtube.com/watch?v=6zTVb_PiHuQ&t=609s",
+        "https://youtube.com/watch?feature=shared&v=6zTVb_PiHuQ",
+        "https://m.youtube.com/watch?v=6zTVb_PiHuQ",
+        "https://youtu.be/6zTVb_PiHuQ?si=o_sahEQGcr_aRJhp",
+        "https://youtu.be/6zTVb_PiHuQ?t=10",
+        "https://www.youtube.com/shorts/6zTVb_PiHuQ",
+        "https://www.youtube.com/live/6zTVb_PiHuQ?si=abc",
+        "https://www.youtube.com/embed/6zTVb_PiHuQ",
+    ],
+)
+def test_normalize_youtube(url):
+    """YouTube の URL は形式によらず同じ動画 ID と URL になること"""
+    canonical = normalize_url(url)
+    assert canonical.method == MethodType.YOUTUBE
+    assert canonical.resource_id == "6zTVb_PiHuQ"
+    assert canonical.url == "https://www.youtube.com/watch?v=6zTVb_PiHuQ"
+    assert canonical.key == "YouTube:6zTVb_PiHuQ"
+
+
+@pytest.mark.parametrize(
+    "url, version",
+    [
+        ("https://arxiv.org/abs/2202.12493", None),
+        ("http://arxiv.org/pdf/2202.12493v2", "v2"),
+        ("https://arxiv.org/pdf/2202.12493v2.pdf", "v2"),
+        ("https://www.arxiv.org/abs/2202.12493/", None),
+        ("https://ar5iv.org/abs/2202.12493", None),
+        ("https://ar5iv.labs.arxiv.org/html/2202.12493", None),
+    ],
+)
+def test_normalize_arxiv(url, version):
+    """arXiv の URL は abs / pdf / 版付きでも同じ arXiv ID になること"""
+    canonical = normalize_url(url)
+    assert canonical.method == MethodType.ARXIV
+    assert canonical.resource_id == "2202.12493"
+    assert canonical.version == version
+    assert canonical.url == f"https://arxiv.org/abs/2202.12493{version or ''}"
+    assert canonical.key == "arXiv:2202.12493"
+
+
+def test_normalize_arxiv_old_style_id():
+    canonical = normalize_url("https://arxiv.org/abs/hep-th/9901001v1")
+    assert canonical.resource_id == "hep-th/9901001"
+    assert canonical.version == "v1"
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        (
+            "https://Qiita.com/kenji-kondo/items/91ae417ad858ec4652e7#section",
+            "https://qiita.com/kenji-kondo/items/91ae417ad858ec4652e7",
+        ),
+        (
+            "https://example.com/a?b=2&utm_source=twitter&a=1&fbclid=xyz",
+            "https://example.com/a?a=1&b=2",
+        ),
+        ("https://example.com", "https://example.com/"),
+    ],
+)
+def test_normalize_web(url, expected):
+    """一般の Web ページはトラッキング用のパラメータやフラグメントを落とすこと"""
+    canonical = normalize_url(url)
+    assert canonical.method is None
+    assert canonical.resource_id is None
+    assert canonical.url == expected
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.youtube.com/@channel",
+        "https://www.youtube.com/watch",
+        "https://notyoutube.com/watch?v=123456",
+        "https://arxiv.org/list/cs.CL/recent",
+    ],
+)
+def test_normalize_unknown_resource(url):
+    """動画や論文を指していない URL には resource_id がつかないこと"""
+    assert normalize_url(url).method is None
+
+
+def test_normalize_document():
+    """PDF や PPTX を指す URL は、添付ファイルの署名などのパラメータを残したまま method がつくこと"""
+    canonical = normalize_url(
+        "https://cdn.discordapp.com/attachments/1/2/slides.pptx?ex=66&is=65&hm=ab"
+    )
+    assert canonical.method == MethodType.PPTX
+    assert canonical.resource_id is None
+    assert canonical.url.endswith("slides.pptx?ex=66&hm=ab&is=65")
+
+
+def test_key_ignores_trailing_slash():
+    assert (
+        normalize_url("https://example.com/a/").key
+        == normalize_url("https://example.com/a").key
+    )
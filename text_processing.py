@@ -0,0 +1,279 @@
+import re
+from typing import NamedTuple
+
+# 文の区切り。日本語の句点と、英語のピリオドなどの後ろの空白で切る
+_SENTENCE_PATTERN = re.compile(r"(?<=[。！？!?])|(?<=[.])(?=\s)")
+
+
+def count_tokens(text: str) -> int:
+    """トークン数を見積もる
+
+    モデルごとのトークナイザーを使うと API 呼び出しやダウンロードが必要になるので、
+    ASCII はおよそ 4 文字で 1 トークン、それ以外 (日本語など) は 1 文字 1 トークンとして数える。
+    """
+    ascii_chars = sum(1 for c in text if c.isascii())
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def split_text(text: str, max_tokens: int) -> list[str]:
+    """max_tokens を超えないように、段落・行・文の境界で text を分割する"""
+    chunks: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for piece in _split_pieces(text, max_tokens):
+        piece_tokens = count_tokens(piece)
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append("".join(current).strip())
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append("".join(current).strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def _split_pieces(text: str, max_tokens: int) -> list[str]:
+    """それぞれが max_tokens 以下になるまで、段落 → 行 → 文 → 文字数の順に細かくする"""
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    for splitter in (
+        lambda t: re.split(r"(?<=\n\n)", t),
+        lambda t: t.splitlines(keepends=True),
+        _SENTENCE_PATTERN.split,
+    ):
+        parts = [part for part in splitter(text) if part]
+        if len(parts) > 1:
+            return [
+                piece for part in parts for piece in _split_pieces(part, max_tokens)
+            ]
+    # どこにも区切りがない場合は文字数で切る。1 文字は最大 1 トークン
+    return [text[i : i + max_tokens] for i in range(0, len(text), max_tokens)]
+
+
+_BULLET_PATTERN = re.compile(r"^(\s*)([-*+]|\d+\.)\s")
+_HEADING_PATTERN = re.compile(r"^#{1,6}\s")
+
+
+class _Block:
+    """compress_markdown で削除の単位になる Markdown のかたまり"""
+
+    def __init__(self, kind: str, depth: int, section: int, lines: list[str]) -> None:
+        self.kind = kind
+        self.depth = depth
+        self.section = section
+        self.lines = lines
+
+
+def _parse_blocks(text: str) -> list[_Block]:
+    blocks: list[_Block] = []
+    section = 0
+    in_code = False
+    for line in text.splitlines():
+        if in_code:
+            blocks[-1].lines.append(line)
+            in_code = not line.lstrip().startswith("```")
+            continue
+        if line.lstrip().startswith("```"):
+            blocks.append(_Block("code", 0, section, [line]))
+            in_code = True
+        elif _HEADING_PATTERN.match(line):
+            section += 1
+            kind = "title" if not blocks else "heading"
+            blocks.append(_Block(kind, 0, section, [line]))
+        elif match := _BULLET_PATTERN.match(line):
+            depth = len(match.group(1).expandtabs(4)) // 2
+            blocks.append(_Block("bullet", depth, section, [line]))
+        elif not line.strip() or (
+            blocks and blocks[-1].kind == "bullet" and line[:1].isspace()
+        ):
+            # 空行や bullet の折り返しは直前のかたまりにくっつける
+            if blocks:
+                blocks[-1].lines.append(line)
+            else:
+                blocks.append(_Block("paragraph", 0, section, [line]))
+        elif not blocks:
+            # 見出しがなくても先頭行はタイトルとみなして残す
+            blocks.append(_Block("title", 0, section, [line]))
+        else:
+            blocks.append(_Block("paragraph", 0, section, [line]))
+    return blocks
+
+
+def _join_blocks(blocks: list[_Block]) -> str:
+    lines: list[str] = []
+    for block in blocks:
+        # 間のかたまりを削ったときに、見出しが直前の行にくっつかないようにする
+        if block.kind == "heading" and lines and lines[-1].strip():
+            lines.append("")
+        lines.extend(block.lines)
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def compress_markdown(text: str, max_length: int) -> str:
+    """Markdown の構造を保ったまま、重要度の低いところから削って max_length 文字以内にする
+
+    1. 深い階層の bullet から、各セクションの後ろのものから順に削る (各セクションの先頭は残す)
+    2. それでも長ければ、後ろのセクションから丸ごと削る (タイトルは残す)
+    3. それでも長ければ、行か文の境界で切る
+    """
+    if len(text) <= max_length:
+        return text
+    blocks = _parse_blocks(text)
+
+    first_in_section: set[int] = set()
+    seen_sections: set[int] = set()
+    for i, block in enumerate(blocks):
+        if block.kind in ("title", "heading"):
+            continue
+        if block.section not in seen_sections:
+            seen_sections.add(block.section)
+            first_in_section.add(i)
+    candidates = sorted(
+        (
+            i
+            for i, block in enumerate(blocks)
+            if block.kind not in ("title", "heading") and i not in first_in_section
+        ),
+        key=lambda i: (blocks[i].depth, i),
+    )
+    removed: set[int] = set()
+    while candidates and len(_join_blocks(_kept(blocks, removed))) > max_length:
+        removed.add(candidates.pop())
+    kept = _kept(blocks, removed)
+
+    sections = sorted({block.section for block in kept if block.kind != "title"})
+    while len(sections) > 1 and len(_join_blocks(kept)) > max_length:
+        last = sections.pop()
+        kept = [
+            block for block in kept if block.section != last or block.kind == "title"
+        ]
+
+    compressed = _join_blocks(kept)
+    if len(compressed) <= max_length:
+        return compressed
+    head = compressed[:max_length]
+    boundary = max(head.rfind("\n"), head.rfind("。"))
+    return head[: boundary + 1].rstrip() if boundary > 0 else head
+
+
+def _kept(blocks: list[_Block], removed: set[int]) -> list[_Block]:
+    return [block for i, block in enumerate(blocks) if i not in removed]
+
+
+# Markdown のリンクや画像だけの行。ナビゲーションやアイコンのことが多い
+_LINK_ONLY_PATTERN = re.compile(r"^(\s*(!?\[[^\]]*\]\([^)]*\)|<[^>]+>)\s*[|/・]?)+$")
+# ページの本文ではない定型文。短い行だけを対象にする。
+# Cookie や著作権は本文の話題にもなるので、サイトの案内や著作権表示の形の行だけを捨てる
+_BOILERPLATE_LINE_PATTERN = re.compile(
+    r"^(skip to (main )?content|share( this( (post|article))?)?|tweet|sign ?in|log ?in|"
+    r"sign ?up|subscribe|menu|back to top|メニュー|ログイン|新規登録|"
+    r"シェア(する)?|ツイート|トップへ戻る|ページの先頭へ|"
+    # © 2024 Foo. / Copyright © 2020-2024 Foo Inc. / ... All rights reserved.
+    r"(©|\(c\)|copyright)\s*(©\s*)?\d{4}\b.*|.*all rights reserved\.?|"
+    # This site uses cookies... / We use cookies to ... / Accept all cookies
+    r"(this (web)?site|we) uses? cookies\b.*|"
+    r".*\b(accept|agree to)( (our|the))?( use of)? (all )?cookies\b.*|"
+    r"(cookie (settings|policy|preferences)|manage cookies)|"
+    r"(当|この)(ウェブ)?サイト(で|では|は).*(cookie|クッキー).*|"
+    r".*(cookie|クッキー)(の(使用|利用))?に同意.*)$",
+    re.IGNORECASE,
+)
+_BOILERPLATE_MAX_CHARS = 80
+_FENCE_PREFIX = ("```", "~~~")
+
+
+class NormalizedInput(NamedTuple):
+    text: str
+    original_tokens: int
+    tokens: int
+    removed_duplicate_lines: int
+    removed_boilerplate_lines: int
+    truncated: bool
+
+    def report(self) -> str:
+        removed = self.original_tokens - self.tokens
+        ratio = removed / self.original_tokens if self.original_tokens else 0
+        return (
+            f"{self.original_tokens} -> {self.tokens} tokens ({ratio:.0%} removed, "
+            f"duplicates: {self.removed_duplicate_lines}, "
+            f"boilerplate: {self.removed_boilerplate_lines}, "
+            f"truncated: {self.truncated})"
+        )
+
+
+def normalize_input(
+    text: str, max_tokens: int | None = None, min_duplicate_chars: int = 20
+) -> NormalizedInput:
+    """LLM に渡す前に、要約に関係のない空白や繰り返し、定型文を取り除く
+
+    1. 行内の連続する空白をまとめ、空行の連続は 1 行にする (コードブロックの中はそのまま)
+    2. リンクや画像だけの行、Cookie の案内などの定型文の行を捨てる
+    3. min_duplicate_chars 文字以上の行が繰り返されたら 2 回目以降を捨てる
+       (短い行は 【質問】 のような見出しのことがあるので残す)
+    4. max_tokens を超えていたら、行の境界で後ろを切る
+    """
+    lines: list[str] = []
+    seen: set[str] = set()
+    duplicates = boilerplate = 0
+    in_code = False
+    for line in text.splitlines():
+        if line.lstrip().startswith(_FENCE_PREFIX):
+            in_code = not in_code
+            lines.append(line.rstrip())
+            continue
+        if in_code:
+            lines.append(line.rstrip())
+            continue
+
+        stripped = " ".join(line.split())
+        if not stripped:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        if len(stripped) <= _BOILERPLATE_MAX_CHARS and (
+            _LINK_ONLY_PATTERN.match(stripped)
+            or _BOILERPLATE_LINE_PATTERN.match(stripped)
+        ):
+            boilerplate += 1
+            continue
+        if len(stripped) >= min_duplicate_chars:
+            if stripped in seen:
+                duplicates += 1
+                continue
+            seen.add(stripped)
+        # 入れ子の bullet はインデントで階層を表すので残す
+        if _BULLET_PATTERN.match(line):
+            indent = line[: len(line) - len(line.lstrip())]
+            stripped = indent + stripped
+        lines.append(stripped)
+
+    normalized = "\n".join(lines).strip()
+    truncated = False
+    if max_tokens is not None and count_tokens(normalized) > max_tokens:
+        normalized = _truncate(normalized, max_tokens)
+        truncated = True
+    return NormalizedInput(
+        normalized,
+        count_tokens(text),
+        count_tokens(normalized),
+        duplicates,
+        boilerplate,
+        truncated,
+    )
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """max_tokens に収まるように、行の境界で後ろを切る"""
+    kept: list[str] = []
+    tokens = 0
+    for line in text.splitlines(keepends=True):
+        line_tokens = count_tokens(line)
+        if tokens + line_tokens > max_tokens:
+            if not kept:
+                # 1 行目から収まらない場合は文字数で切る。1 文字は最大 1 トークン
+                kept.append(line[:max_tokens])
+            break
+        kept.append(line)
+        tokens += line_tokens
+    return "".join(kept).rstrip()
@@ -0,0 +1,130 @@
+import re
+from dataclasses import dataclass
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from method_type import MethodType
+
+# 中身に影響しないトラッキング用のクエリパラメータ
+_TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "ref",
+    "ref_src",
+    "si",
+}
+
+_YOUTUBE_HOSTS = {
+    "youtube.com",
+    "www.youtube.com",
+    "m.youtube.com",
+    "music.youtube.com",
+    "youtube-nocookie.com",
+    "www.youtube-nocookie.com",
+}
+_YOUTUBE_SHORT_HOSTS = {"youtu.be", "www.youtu.be"}
+_YOUTUBE_PATH_PATTERN = re.compile(r"^/(?:shorts|embed|live|v)/([A-Za-z0-9_-]+)")
+_YOUTUBE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+_ARXIV_HOSTS = {
+    "arxiv.org",
+    "www.arxiv.org",
+    "export.arxiv.org",
+    "ar5iv.org",
+    "www.ar5iv.org",
+    "ar5iv.labs.arxiv.org",
+}
+# 新形式 (2202.12493v2) と旧形式 (hep-th/9901001v1) の両方の ID に対応する
+_ARXIV_PATH_PATTERN = re.compile(
+    r"^/(?:abs|pdf|html)/"
+    r"(?P<id>\d{4}\.\d{4,5}|[a-z-]+(?:\.[A-Z]{2})?/\d{7})"
+    r"(?P<version>v\d+)?(?:\.pdf)?/?$"
+)
+# ファイルとして要約する URL の拡張子。Discord の添付ファイルなど
+_DOCUMENT_EXTENSIONS = {
+    ".pdf": MethodType.PDF,
+    ".pptx": MethodType.PPTX,
+}
+
+
+@dataclass(frozen=True)
+class CanonicalURL:
+    """正規化した URL と、それが指すリソースの種類・ID
+
+    resource_id は YouTube 動画 (動画 ID) と arXiv 論文 (arXiv ID) のときだけ入る。
+    method はそれに加えて、PDF や PPTX のファイルを指す URL のときにも入る。
+    同じリソースを指す URL は同じ key になる。
+    """
+
+    url: str
+    method: MethodType | None = None
+    resource_id: str | None = None
+    # arXiv の版 (v2 など)。指定がなければ None
+    version: str | None = None
+
+    @property
+    def key(self) -> str:
+        """キャッシュや重複判定に使うキー。末尾のスラッシュの有無は区別しない"""
+        if self.method is not None and self.resource_id is not None:
+            return f"{self.method.value}:{self.resource_id}"
+        parts = urlsplit(self.url)
+        return urlunsplit(parts._replace(path=parts.path.rstrip("/") or "/"))
+
+
+def normalize_url(url: str) -> CanonicalURL:
+    """URL の表記ゆれを揃えて CanonicalURL にする"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+
+    if (video_id := _youtube_video_id(host, parts.path, parts.query)) is not None:
+        return CanonicalURL(
+            f"https://www.youtube.com/watch?v={video_id}",
+            MethodType.YOUTUBE,
+            video_id,
+        )
+
+    if host in _ARXIV_HOSTS and (match := _ARXIV_PATH_PATTERN.match(parts.path)):
+        arxiv_id, version = match.group("id"), match.group("version")
+        return CanonicalURL(
+            f"https://arxiv.org/abs/{arxiv_id}{version or ''}",
+            MethodType.ARXIV,
+            arxiv_id,
+            version,
+        )
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.startswith("utm_") and key not in _TRACKING_PARAMS
+    )
+    netloc = parts.netloc.lower()
+    return CanonicalURL(
+        urlunsplit(
+            (parts.scheme.lower(), netloc, parts.path or "/", urlencode(query), "")
+        ),
+        _document_method(parts.path),
+    )
+
+
+def _document_method(path: str) -> MethodType | None:
+    for extension, method in _DOCUMENT_EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return method
+    return None
+
+
+def _youtube_video_id(host: str, path: str, query: str) -> str | None:
+    if host in _YOUTUBE_SHORT_HOSTS:
+        video_id = path.strip("/").split("/")[0]
+    elif host in _YOUTUBE_HOSTS:
+        if path == "/watch":
+            video_id = dict(parse_qsl(query)).get("v", "")
+        elif match := _YOUTUBE_PATH_PATTERN.match(path):
+            video_id = match.group(1)
+        else:
+            return None
+    else:
+        return None
+    return video_id if _YOUTUBE_ID_PATTERN.match(video_id) else None